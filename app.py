@@ -1,14 +1,32 @@
 import streamlit as st
+from auramed.startup import LazyResource, startup_report
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import datetime
 import time
 import logging
-from groq import Groq
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+import os
+import io
+import zipfile
+from auramed.search import PatientSearchIndex
+from auramed.storage import ClinicStore
+from auramed.llm_cache import CompletionCache
+from auramed.soap_stream import SoapStream
+from auramed.batch import parse_batch_file, run_batch
+from auramed.figures import data_version, downsample, figure_cache
+from auramed.timeline import TIMELINE_PAGE_SIZE, render_events_html
+from auramed.vitals import HYPERTENSION_SYSTOLIC, VitalsStore, parse_legacy_dates
+from auramed.scheduler import STATUSES, Scheduler, SlotConflict
+from auramed.ledger import DESPESA, RECEITA, Ledger, pct_delta
+from auramed.interactions import InteractionEngine
+from auramed.auth import Authenticator
+from auramed.tracing import tracer
+from auramed.retrieval import ALLERGY_RE, PatientContextIndex, build_context, estimate_tokens
+from auramed.documents import PrescriptionDoc, render_batch, render_html, render_pdf
+from auramed.bulk import FORMATS, SCHEMAS, detect_format, export_records, import_records
+
+# Dependências pesadas (sentence_transformers/torch, groq, plotly) são importadas
+# sob demanda, pela função que as usa.
+startup_report.mark("imports")
 
 # --- 1. CONFIGURAÇÃO E CSS "NEXT-GEN" ---
 st.set_page_config(page_title="AuraMed OS", page_icon="⚡", layout="wide", initial_sidebar_state="expanded")
@@ -120,268 +138,868 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 2. SETUP DE DADOS E IA ---
-api_key = st.secrets.get("GROQ_API_KEY")
-if "groq_client" not in st.session_state and api_key:
-    st.session_state.groq_client = Groq(api_key=api_key)
+def get_groq_client():
+    """Cliente Groq da sessão, criado (e importado) só quando a IA é usada"""
+    if "groq_client" not in st.session_state:
+        api_key = st.secrets.get("GROQ_API_KEY")
+        if not api_key:
+            return None
+        groq = startup_report.import_module("groq")
+        st.session_state.groq_client = groq.Groq(api_key=api_key)
+    return st.session_state.groq_client
 
 @st.cache_resource
+def embedding_model_loader():
+    """Carregador único do MiniLM; pré-aquecido em segundo plano após o login"""
+    def load():
+        sentence_transformers = startup_report.import_module("sentence_transformers")
+        return sentence_transformers.SentenceTransformer('all-MiniLM-L6-v2')
+    return LazyResource(load, name="all-MiniLM-L6-v2")
+
 def load_embedding_model():
-    return SentenceTransformer('all-MiniLM-L6-v2')
-
-if "embedding_model" not in st.session_state:
-    st.session_state.embedding_model = load_embedding_model()
-
-# --- INIT SESSION STATE COM DADOS ROBUSTOS (MOCK) ---
-if "data" not in st.session_state:
-    st.session_state.data = {
-        "credentials": {
-            "admin": {"senha": "admin", "role": "doctor", "nome": "Dr. Gênesis", "especialidade": "Clínica Geral", "crm": "12345-SP"},
-            "ana": {"senha": "123", "role": "patient", "nome": "Ana Silva"},
-            "carlos": {"senha": "123", "role": "patient", "nome": "Carlos Souza"}
+    return embedding_model_loader().get()
+
+# --- DADOS DE DEMONSTRAÇÃO (SEED DO BANCO COMPARTILHADO) ---
+SEED_DATA = {
+    "credentials": {
+        "admin": {"senha": "admin", "role": "doctor", "nome": "Dr. Gênesis", "especialidade": "Clínica Geral", "crm": "12345-SP"},
+        "ana": {"senha": "123", "role": "patient", "nome": "Ana Silva"},
+        "carlos": {"senha": "123", "role": "patient", "nome": "Carlos Souza"}
+    },
+    "pacientes": [
+        {
+            "id": 1, "nome": "Ana Silva", "idade": 32, "sexo": "F", 
+            "historico": "Enxaqueca crônica (CID G43). Alergia a Dipirona.",
+            "vitals": {"pressao": [120, 122, 118, 130, 120], "datas": ["2023-01-15", "2023-02-10", "2023-03-14", "2023-04-12", "2023-05-20"]},
+            "timeline": [
+                {"data": "2023-01-15", "evento": "Consulta Inicial", "detalhe": "Queixa de dor de cabeça."},
+                {"data": "2023-02-10", "evento": "Exame Laboratorial", "detalhe": "Hemograma completo - Normal."},
+                {"data": "2023-05-20", "evento": "Retorno", "detalhe": "Ajuste de medicação."}
+            ]
         },
-        "pacientes": [
-            {
-                "id": 1, "nome": "Ana Silva", "idade": 32, "sexo": "F", 
-                "historico": "Enxaqueca crônica (CID G43). Alergia a Dipirona.",
-                "vitals": {"pressao": [120, 122, 118, 130, 120], "datas": ["Jan", "Fev", "Mar", "Abr", "Mai"]},
-                "timeline": [
-                    {"data": "2023-01-15", "evento": "Consulta Inicial", "detalhe": "Queixa de dor de cabeça."},
-                    {"data": "2023-02-10", "evento": "Exame Laboratorial", "detalhe": "Hemograma completo - Normal."},
-                    {"data": "2023-05-20", "evento": "Retorno", "detalhe": "Ajuste de medicação."}
-                ]
-            },
-            {
-                "id": 2, "nome": "Carlos Souza", "idade": 45, "sexo": "M", 
-                "historico": "Hipertensão (CID I10). Uso contínuo de Losartana.",
-                "vitals": {"pressao": [140, 138, 135, 142, 130], "datas": ["Jan", "Fev", "Mar", "Abr", "Mai"]},
-                "timeline": [
-                    {"data": "2023-03-01", "evento": "Consulta Cardíaca", "detalhe": "PA elevada."},
-                    {"data": "2023-03-05", "evento": "MAPA 24h", "detalhe": "Solicitado."}
-                ]
-            },
-        ],
-        "appointments": [
-            {"id": 101, "paciente": "Ana Silva", "data": "2023-11-20", "hora": "14:00", "tipo": "Retorno", "status": "Confirmado", "valor": 350.00},
-            {"id": 102, "paciente": "Carlos Souza", "data": "2023-11-20", "hora": "15:00", "tipo": "Primeira Vez", "status": "Pendente", "valor": 500.00},
-            {"id": 103, "paciente": "Mariana Lima", "data": "2023-11-20", "hora": "16:00", "tipo": "Retorno", "status": "Em Atendimento", "valor": 350.00}
-        ],
-        "financeiro": {
-            "meses": ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun"],
-            "receita": [12500, 15000, 13200, 18000, 16500, 19200],
-            "despesas": [5000, 5200, 4800, 6000, 5500, 5800]
+        {
+            "id": 2, "nome": "Carlos Souza", "idade": 45, "sexo": "M", 
+            "historico": "Hipertensão (CID I10). Uso contínuo de Losartana.",
+            "vitals": {"pressao": [140, 138, 135, 142, 130], "datas": ["2023-01-09", "2023-02-06", "2023-03-01", "2023-04-03", "2023-05-08"]},
+            "timeline": [
+                {"data": "2023-03-01", "evento": "Consulta Cardíaca", "detalhe": "PA elevada."},
+                {"data": "2023-03-05", "evento": "MAPA 24h", "detalhe": "Solicitado."}
+            ]
         },
-        "medicamentos": ["Amoxicilina 500mg", "Dipirona 1g", "Losartana 50mg", "Omeprazol 20mg", "Ibuprofeno 600mg", "Rivotril 0.5mg"]
-    }
-elif "credentials" not in st.session_state.data:
-    st.session_state.data["credentials"] = {
-        "admin": {"senha": "admin", "role": "doctor", "nome": "Dr. Gênesis", "especialidade": "Clínica Geral", "crm": "12345-SP"},
-        "ana": {"senha": "123", "role": "patient", "nome": "Ana Silva"}
-    }
+    ],
+    "appointments": [
+        {"id": 101, "paciente": "Ana Silva", "data": "2023-11-20", "hora": "14:00", "tipo": "Retorno", "status": "Confirmado", "valor": 350.00, "medico": "admin", "sala": "Sala 01", "duracao": 45},
+        {"id": 102, "paciente": "Carlos Souza", "data": "2023-11-20", "hora": "15:00", "tipo": "Primeira Vez", "status": "Pendente", "valor": 500.00, "medico": "admin", "sala": "Sala 02", "duracao": 60},
+        {"id": 103, "paciente": "Mariana Lima", "data": "2023-11-20", "hora": "16:00", "tipo": "Retorno", "status": "Em Atendimento", "valor": 350.00, "medico": "admin", "sala": "Sala 01", "duracao": 45}
+    ],
+    "financeiro": {
+        "meses": ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun"],
+        "receita": [12500, 15000, 13200, 18000, 16500, 19200],
+        "despesas": [5000, 5200, 4800, 6000, 5500, 5800]
+    },
+    "medicamentos": ["Amoxicilina 500mg", "Dipirona 1g", "Losartana 50mg", "Omeprazol 20mg", "Ibuprofeno 600mg", "Rivotril 0.5mg"]
+}
+
+@st.cache_resource
+def get_store():
+    """Banco SQLite único por processo, compartilhado entre sessões"""
+    store = ClinicStore(os.environ.get("AURAMED_DB_PATH", "auramed.db"))
+    store.seed(SEED_DATA)
+    return store
+
+store = get_store()
+
+@st.cache_resource
+def get_authenticator():
+    """Senhas com scrypt e tokens de sessão (segredo em AURAMED_SESSION_SECRET)"""
+    auth = Authenticator(store, secret=os.environ.get("AURAMED_SESSION_SECRET"))
+    auth.upgrade_plaintext()
+    return auth
+
+authenticator = get_authenticator()
+
+@st.cache_resource
+def get_vitals_store():
+    """Séries de sinais vitais em colunas (Parquet por coorte de pacientes)"""
+    vitals = VitalsStore(os.environ.get("AURAMED_VITALS_DIR", "vitals_data"))
+    if len(vitals) == 0:
+        # Primeira execução: migra as listas antigas (pressao/datas) dos pacientes
+        for p in store.iter_patients(with_timeline=False):
+            legado = p.get('vitals') or {}
+            if legado.get('pressao'):
+                vitals.append_many([p['id']] * len(legado['pressao']), parse_legacy_dates(legado['datas']), legado['pressao'], flush=False)
+        vitals.flush()
+    return vitals
+
+vitals_store = get_vitals_store()
+
+SALAS = ["Sala 01", "Sala 02", "Sala 03"]
+
+@st.cache_resource
+def get_ledger():
+    """Livro-caixa com totais por período em O(log n)"""
+    if store.ledger_is_empty():
+        # Migra os totais mensais antigos (financeiro) para lançamentos no dia 1º
+        fin = store.financeiro()
+        dias = parse_legacy_dates(fin['meses'])
+        entradas = []
+        for dia, receita, despesa in zip(dias, fin['receita'], fin['despesas']):
+            data = str(dia)[:10]
+            entradas.append((data, RECEITA, receita, "Saldo migrado"))
+            entradas.append((data, DESPESA, despesa, "Saldo migrado"))
+        store.add_ledger_entries(entradas)
+    return Ledger(store)
+
+ledger = get_ledger()
+
+@st.cache_resource
+def get_scheduler():
+    """Agenda com índices de intervalo por médico/sala e KPIs incrementais"""
+    # Consultas finalizadas viram receita no livro-caixa
+    return Scheduler(store, on_finalized=ledger.record_appointment)
+
+scheduler = get_scheduler()
+
+RULES_PATH = os.environ.get("AURAMED_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "auramed", "data", "interacoes.json"))
+
+@st.cache_resource
+def load_interaction_engine(path, mtime):
+    """Regras compiladas; a data de modificação na chave recarrega ao editar o arquivo"""
+    return InteractionEngine.from_file(path)
+
+def get_interaction_engine():
+    return load_interaction_engine(RULES_PATH, os.path.getmtime(RULES_PATH))
 
 # --- 3. CORE INTELLIGENCE & UTILS ---
 
+SEARCH_TOP_K = 20
+# Atraso (em ids) que o índice de busca recupera na própria leitura; acima disso, em segundo plano
+SEARCH_SYNC_INLINE = 200
+PICKER_LIMIT = 1000
+
+# Exportação periódica das métricas para o coletor textfile do Prometheus (opcional)
+METRICS_PATH = os.environ.get("AURAMED_METRICS_PATH")
+
+PAGE_SIZE = 20
+
+@tracer.trace
+def embed_texts(texts):
+    """Embeddings normalizados (MiniLM) para o índice de busca"""
+    return load_embedding_model().encode(list(texts), batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+
+def build_search_index():
+    index = PatientSearchIndex(encode=embed_texts)
+    index.sync(store)
+    return index
+
+@st.cache_resource
+def search_index_loader():
+    """Índice semântico de pacientes, compartilhado por todas as sessões e montado em segundo plano"""
+    return LazyResource(build_search_index, name="índice de busca")
+
+def get_search_index():
+    """Índice em dia com o banco, ou None enquanto ainda é montado (use a busca por nome no banco)"""
+    loader = search_index_loader()
+    if not loader.ready:
+        loader.warm()
+        return None
+    index = loader.get()
+    if index.lag(store) <= SEARCH_SYNC_INLINE:
+        index.sync(store)
+    else:
+        index.sync_in_background(store)
+    return index
+
+def add_timeline_event(patient_id, event):
+    """Registra evento na timeline; o índice de busca o recebe na próxima sincronização"""
+    store.add_event(patient_id, event)
+
+SOAP_MODEL = "llama-3.3-70b-versatile"
+SOAP_TEMPERATURE = 0.3
+SOAP_WAIT_TIMEOUT = 120
+SOAP_SYSTEM_PROMPT = "Você é um assistente médico. Converta as notas em formato SOAP (Subjetivo, Objetivo, Avaliação, Plano) profissional. Use um título Markdown (###) para cada seção."
+
+RAG_TOP_K = 8
+RAG_TOKEN_BUDGET = 600
+
+@st.cache_resource
+def get_context_index():
+    """Índices vetoriais por paciente (float16 em disco) para o contexto do SOAP"""
+    return PatientContextIndex(os.environ.get("AURAMED_RAG_DIR", "rag_index"), encode=embed_texts, fingerprint=store.db_uuid)
+
+@tracer.trace
+def soap_context(patient_id, notas, token_budget=RAG_TOKEN_BUDGET, k=RAG_TOP_K):
+    """Histórico, alergias e os registros anteriores mais relevantes para as notas"""
+    p_data = store.get_patient(patient_id)
+    if not p_data:
+        return "", {}
+    if embedding_model_loader().ready:
+        index = get_context_index()
+        index.sync(patient_id, store.events_after(patient_id, index.last_event_id(patient_id)))
+        ranked = index.search(patient_id, notas, k=k)
+        todos = index.all_snippets(patient_id)
+    else:
+        # Modelo ainda carregando: registros mais recentes, sem ranqueamento
+        todos = [{"data": e['data'], "evento": e['evento'], "texto": e.get('detalhe') or ""} for e in store.timeline(patient_id, limit=200)]
+        ranked = [(0.0, t) for t in todos[:k]]
+    pinned = [t for t in todos if ALLERGY_RE.search(t['texto'])]
+    texto, stats = build_context(p_data.get('historico') or "", ranked, token_budget, pinned=pinned)
+    stats["tokens_prontuario"] = estimate_tokens(p_data.get('historico') or "") + sum(estimate_tokens(f"{t['evento']}: {t['texto']}") for t in todos)
+    return texto, stats
+
+def soap_prompt(patient_id, nome, notas, usar_contexto=True):
+    """Mensagem do usuário para o SOAP, com o contexto recuperado do prontuário"""
+    contexto, stats = soap_context(patient_id, notas) if usar_contexto and patient_id else ("", {})
+    pedido = f"Paciente: {nome}. Notas: {notas}"
+    return (f"{contexto}\n\n{pedido}" if contexto else pedido), stats
+
+@st.cache_resource
+def get_soap_cache():
+    """Cache de respostas do LLM compartilhado (memória + disco opcional)"""
+    return CompletionCache(max_entries=512, disk_path=os.environ.get("AURAMED_LLM_CACHE_PATH", "llm_cache.db") or None)
+
+@tracer.trace
+def soap_completion(client, raw_notes):
+    """Chamada SOAP com cache; levanta exceção em falha (usada também em lote)"""
+    messages = [{"role": "system", "content": SOAP_SYSTEM_PROMPT}, {"role": "user", "content": raw_notes}]
+    cache = get_soap_cache()
+    key = cache.make_key(SOAP_MODEL, messages, SOAP_TEMPERATURE)
+
+    def call_llm():
+        completion = client.chat.completions.create(model=SOAP_MODEL, messages=messages, temperature=SOAP_TEMPERATURE)
+        return completion.choices[0].message.content
+
+    return cache.get_or_create(key, call_llm)
+
+@tracer.trace
 def ai_structure_soap(raw_notes):
     """IA para estruturar Prontuário"""
-    if not st.session_state.get("groq_client"): return "⚠️ Erro: IA Offline"
-    sys_prompt = "Você é um assistente médico. Converta as notas em formato SOAP (Subjetivo, Objetivo, Avaliação, Plano) profissional."
+    client = get_groq_client()
+    if not client: return "⚠️ Erro: IA Offline"
     try:
-        completion = st.session_state.groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "system", "content": sys_prompt}, {"role": "user", "content": raw_notes}],
-            temperature=0.3
-        )
-        return completion.choices[0].message.content
+        return soap_completion(client, raw_notes)
     except Exception as e:
         return f"Erro ao processar: {e}"
 
-def plot_finance_chart():
-    """Gera gráfico financeiro avançado"""
-    fin = st.session_state.data['financeiro']
+@tracer.trace
+def ai_stream_soap(raw_notes):
+    """Versão streaming do ai_structure_soap (token a token, com cache)"""
+    client = get_groq_client()
+    if not client: return SoapStream.from_text("⚠️ Erro: IA Offline")
+    messages = [{"role": "system", "content": SOAP_SYSTEM_PROMPT}, {"role": "user", "content": raw_notes}]
+    cache = get_soap_cache()
+    key = cache.make_key(SOAP_MODEL, messages, SOAP_TEMPERATURE)
+    cached, inflight, leader = cache.begin(key)
+    if cached is not None:
+        return SoapStream.from_text(cached)
+    if not leader:
+        # Mesma nota já em geração em outra sessão: espera o texto do líder
+        def wait():
+            yield inflight.result(timeout=SOAP_WAIT_TIMEOUT)
+        return SoapStream(wait())
+
+    def chunks():
+        stream = client.chat.completions.create(model=SOAP_MODEL, messages=messages, temperature=SOAP_TEMPERATURE, stream=True)
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+
+    return SoapStream(chunks(), on_complete=lambda text: cache.finish(key, text),
+                      on_abort=lambda error: cache.finish(key, error=error))
+
+def trace_soap_stream(stream):
+    """Spans do stream já encerrado: até o primeiro token e do primeiro token ao fechamento"""
+    if stream.started is None:
+        return
+    fechado = time.perf_counter()
+    if stream.first_token_at is not None:
+        tracer.record("soap_stream_ttft", stream.first_token_at - stream.started)
+    tracer.record("soap_stream", fechado - (stream.first_token_at or stream.started), failed=stream.error is not None)
+
+VITALS_MAX_POINTS = 500
+
+@tracer.trace
+@figure_cache.memoize
+def build_finance_figure(version, _fin=None):
+    go = startup_report.import_module("plotly.graph_objects")
+    fin = _fin
     fig = go.Figure()
     fig.add_trace(go.Bar(x=fin['meses'], y=fin['receita'], name='Receita', marker_color='#0d9488'))
     fig.add_trace(go.Bar(x=fin['meses'], y=fin['despesas'], name='Despesas', marker_color='#ef4444'))
-    fig.update_layout(barmode='group', title="Fluxo de Caixa Semestral", plot_bgcolor='rgba(0,0,0,0)', font=dict(color='#1e293b'))
+    fig.update_layout(barmode='group', title="Fluxo de Caixa", plot_bgcolor='rgba(0,0,0,0)', font=dict(color='#1e293b'))
     return fig
 
+def plot_finance_chart(inicio, fim):
+    """Gera gráfico financeiro avançado a partir dos acumulados mensais do livro-caixa"""
+    serie = ledger.monthly(inicio, fim)
+    fin = {"meses": [m for m, _, _ in serie], "receita": [r for _, r, _ in serie], "despesas": [d for _, _, d in serie]}
+    return build_finance_figure((ledger.version, str(inicio), str(fim)), _fin=fin)
+
+@tracer.trace
+@figure_cache.memoize
+def build_vitals_figure(version, compact, max_points, _datas=(), _pressao=()):
+    """Gráfico de pressão arterial; séries longas passam pelo LTTB"""
+    px = startup_report.import_module("plotly.express")
+    datas, pressao = downsample(list(_datas), list(_pressao), max_points)
+    fig = px.line(pd.DataFrame({"data": datas, "pressao": pressao}), x="data", y="pressao", markers=len(pressao) <= 60, title=None if compact else "Evolução Pressão Arterial")
+    if compact:
+        fig.update_layout(plot_bgcolor='white', height=300, margin=dict(l=20, r=20, t=20, b=20))
+    else:
+        fig.update_layout(plot_bgcolor='white')
+    return fig
+
+def plot_vitals_chart(patient_id, compact=False, max_points=VITALS_MAX_POINTS):
+    datas, pressao = vitals_store.series(patient_id)
+    return build_vitals_figure(data_version(datas, pressao), compact, max_points, _datas=datas, _pressao=pressao)
+
 # --- 4. INTERFACE E MÓDULOS ---
 
+def render_timeline(patient_id, variant="doctor", key_prefix="tl"):
+    """Timeline paginada: um bloco HTML por página e 'Carregar mais' sob demanda"""
+    limit_key = f"{key_prefix}_limit_{patient_id}"
+    limit = st.session_state.get(limit_key, TIMELINE_PAGE_SIZE)
+    periodo = st.date_input("Período", value=[], key=f"{key_prefix}_range_{patient_id}", format="DD/MM/YYYY")
+    start = periodo[0] if len(periodo) > 0 else None
+    end = periodo[1] if len(periodo) > 1 else None
+    total = store.count_events(patient_id, start, end)
+    events = store.timeline(patient_id, limit=limit, start=start, end=end)
+    if not events:
+        st.caption("Nenhum evento no período.")
+        return
+    for i in range(0, len(events), TIMELINE_PAGE_SIZE):
+        st.markdown(render_events_html(events[i:i + TIMELINE_PAGE_SIZE], variant), unsafe_allow_html=True)
+    st.caption(f"Exibindo {len(events)} de {total} eventos")
+    if len(events) < total:
+        def load_more():
+            st.session_state[limit_key] = limit + TIMELINE_PAGE_SIZE
+        st.button("Carregar mais", key=f"{key_prefix}_more_{patient_id}", on_click=load_more)
+
 def sidebar_nav():
     with st.sidebar:
         st.markdown("<h2 style='text-align: center; color: #0d9488 !important;'>AuraMed OS <span style='font-size:0.5em'>ENT</span></h2>", unsafe_allow_html=True)
         st.markdown("---")
-        menu = st.radio("Módulos", ["Dashboard", "Prontuário IA", "Receituário", "Pacientes", "Financeiro"], label_visibility="collapsed")
+        menu = st.radio("Módulos", ["Dashboard", "Prontuário IA", "Receituário", "Pacientes", "Financeiro", "Importar/Exportar", "Diagnóstico"], label_visibility="collapsed")
         st.markdown("---")
-        st.markdown(f"**{st.session_state.user_name}**<br><span style='font-size:0.8em; color:gray'>CRM: {st.session_state.data['credentials']['admin'].get('crm', 'N/A')}</span>", unsafe_allow_html=True)
+        st.markdown(f"**{st.session_state.user_name}**<br><span style='font-size:0.8em; color:gray'>CRM: {(store.get_credential('admin') or {}).get('crm') or 'N/A'}</span>", unsafe_allow_html=True)
         if st.button("Sair (Logout)", use_container_width=True):
-            st.session_state.logged_in = False
+            st.session_state.pop("auth_token", None)
             st.rerun()
+        with st.expander("⏱️ Inicialização"):
+            loader = embedding_model_loader()
+            st.caption(f"Modelo de embeddings: {f'pronto em {loader.load_seconds:.1f}s' if loader.ready else 'carregando...'}")
+            st.dataframe(pd.DataFrame(startup_report.rows(), columns=["etapa", "segundos"]), hide_index=True, use_container_width=True,
+                         column_config={"segundos": st.column_config.NumberColumn("Segundos", format="%.3f")})
         return menu
 
+@tracer.trace
 def page_doctor_dashboard():
     st.markdown("### ⚡ Command Center")
     
     # Notificações
-    st.info("🔔 **Notificação:** Exames de Carlos Souza disponíveis para análise. (Há 2 horas)")
+    fora = vitals_store.out_of_range()
+    if len(fora):
+        nomes = [p['nome'] for p in store.get_patients(fora['paciente_id'].head(5).tolist())]
+        st.warning(f"🔔 **Alerta:** {len(fora)} paciente(s) com média recente de PA ≥ {HYPERTENSION_SYSTOLIC:.0f} mmHg: {', '.join(nomes)}{'...' if len(fora) > 5 else ''}")
+
+    dia = st.date_input("Dia da agenda", value=scheduler.busiest_day_near(datetime.date.today()), format="DD/MM/YYYY", key="agenda_dia")
 
     # KPIs
     k1, k2, k3, k4 = st.columns(4)
-    total_dia = sum([a['valor'] for a in st.session_state.data['appointments']])
-    k1.markdown(f"<div class='glass-card'><h4>{len(st.session_state.data['appointments'])}</h4><span class='status-badge status-ok'>Agendamentos</span></div>", unsafe_allow_html=True)
-    k2.markdown("<div class='glass-card'><h4>3</h4><span class='status-badge status-warning'>Em Espera</span></div>", unsafe_allow_html=True)
+    kpis = scheduler.kpis(dia)
+    n_agend, total_dia, em_espera = kpis['agendamentos'], kpis['faturamento'], kpis['em_espera']
+    k1.markdown(f"<div class='glass-card'><h4>{n_agend}</h4><span class='status-badge status-ok'>Agendamentos</span></div>", unsafe_allow_html=True)
+    k2.markdown(f"<div class='glass-card'><h4>{em_espera}</h4><span class='status-badge status-warning'>Em Espera</span></div>", unsafe_allow_html=True)
     k3.markdown(f"<div class='glass-card'><h4>R$ {total_dia:.2f}</h4><span class='status-badge status-ok'>Faturamento Dia</span></div>", unsafe_allow_html=True)
-    k4.markdown("<div class='glass-card'><h4>4.9/5</h4><span class='status-badge status-ok'>NPS Clínica</span></div>", unsafe_allow_html=True)
+    k4.markdown(f"<div class='glass-card'><h4>{len(fora)}</h4><span class='status-badge {'status-danger' if len(fora) else 'status-ok'}'>Fora da Faixa (PA)</span></div>", unsafe_allow_html=True)
 
     c1, c2 = st.columns([2, 1])
     with c1:
         st.markdown("<div class='glass-card'>", unsafe_allow_html=True)
-        st.subheader("Fluxo de Pacientes Hoje")
-        df = pd.DataFrame(st.session_state.data['appointments'])
-        st.dataframe(
-            df[['hora', 'paciente', 'tipo', 'status', 'valor']], 
-            use_container_width=True, 
-            hide_index=True,
-            column_config={
-                "status": st.column_config.SelectboxColumn("Status", options=["Confirmado", "Pendente", "Em Atendimento", "Finalizado"]),
-                "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f")
-            }
-        )
+        st.subheader("Fluxo de Pacientes")
+        # Só a janela visível (dia ou semana) é consultada no banco
+        v_dia, v_semana = st.tabs(["Dia", "Semana"], key="agenda_view", on_change="rerun")
+        if v_dia.open:
+            with v_dia:
+                df = pd.DataFrame(scheduler.day_view(dia), columns=['hora', 'paciente', 'medico', 'sala', 'tipo', 'status', 'valor'])
+                st.dataframe(
+                    df,
+                    use_container_width=True, 
+                    hide_index=True,
+                    column_config={
+                        "status": st.column_config.SelectboxColumn("Status", options=list(STATUSES)),
+                        "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f")
+                    }
+                )
+        if v_semana.open:
+            with v_semana:
+                semana = pd.DataFrame(scheduler.week_view(dia), columns=['data', 'hora', 'paciente'])
+                if semana.empty:
+                    st.caption("Nenhum agendamento nesta semana.")
+                else:
+                    grade = semana.assign(item=semana['hora'] + " " + semana['paciente']).groupby('data')['item'].apply(lambda s: "\n".join(s))
+                    st.dataframe(grade.to_frame("Agendamentos").T, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
     with c2:
         st.markdown("<div class='glass-card'>", unsafe_allow_html=True)
         st.subheader("Ações Rápidas")
-        if st.button("➕ Novo Agendamento", use_container_width=True):
-            st.toast("Módulo de Agendamento Aberto")
+        with st.popover("➕ Novo Agendamento", use_container_width=True):
+            form_agendamento(dia)
+        if st.button("✅ Finalizar Atendimento", use_container_width=True):
+            finalizados = scheduler.finish_current(dia)
+            if finalizados:
+                st.success("Finalizado: " + ", ".join(a['paciente'] for a in finalizados))
+            else:
+                st.info("Nenhum atendimento em andamento.")
         if st.button("📞 Chamar Próximo", use_container_width=True):
-            st.success("Chamando: Carlos Souza - Sala 02")
+            proximo = scheduler.call_next(dia)
+            if proximo:
+                st.success(f"Chamando: {proximo['paciente']} - {proximo.get('sala') or 'Consultório'}")
+            else:
+                st.info("Nenhum paciente em espera neste dia.")
         st.markdown("</div>", unsafe_allow_html=True)
 
+def patient_picker(label, key):
+    """Seletor de paciente por id com campo de busca (nome, CID ou sintomas).
+
+    Sem busca, lista os primeiros PICKER_LIMIT em ordem alfabética e avisa
+    quando a lista está truncada.
+    """
+    busca = st.text_input("Buscar paciente", key=f"{key}_busca", placeholder="Nome, CID (ex: I10) ou sintomas")
+    total = store.count_patients()
+    if busca.strip():
+        indice = get_search_index()
+        if indice is not None:
+            encontrados = store.get_patients(indice.search(busca, k=SEARCH_TOP_K))
+            pacientes = {p['id']: p['nome'] for p in encontrados}
+        else:
+            # Índice ainda sendo montado: busca só pelo nome, no banco
+            pacientes = store.find_patient_choices(busca.strip(), limit=SEARCH_TOP_K)
+        if not pacientes:
+            st.caption("Nenhum paciente encontrado para a busca.")
+    else:
+        pacientes = store.patient_choices(limit=PICKER_LIMIT)
+        if total > len(pacientes):
+            st.caption(f"Exibindo os primeiros {len(pacientes)} de {total} pacientes em ordem alfabética; use a busca para encontrar os demais.")
+    pat_id = st.selectbox(label, list(pacientes), format_func=pacientes.get, key=key)
+    return pat_id, pacientes.get(pat_id)
+
+def form_agendamento(dia):
+    medicos = {m['username']: m['nome'] for m in store.list_doctors()}
+    # A busca fica fora do formulário para atualizar a lista ao digitar
+    _, paciente = patient_picker("Paciente", key="ag_pat")
+    with st.form("novo_agendamento", clear_on_submit=False, border=False):
+        medico = st.selectbox("Médico(a)", list(medicos), format_func=lambda u: medicos[u])
+        sala = st.selectbox("Sala", SALAS)
+        a1, a2, a3 = st.columns(3)
+        data = a1.date_input("Data", value=dia, format="DD/MM/YYYY")
+        hora = a2.time_input("Hora", value=datetime.time(9, 0), step=900)
+        duracao = a3.number_input("Duração (min)", min_value=15, max_value=240, value=30, step=15)
+        tipo = st.selectbox("Tipo", ["Primeira Vez", "Retorno", "Exame"])
+        valor = st.number_input("Valor (R$)", min_value=0.0, value=350.0, step=50.0)
+        if not st.form_submit_button("Agendar", use_container_width=True):
+            return
+    if not paciente:
+        st.error("Selecione um paciente.")
+        return
+    try:
+        scheduler.book({"paciente": paciente, "medico": medico, "sala": sala, "data": data.isoformat(), "hora": hora.strftime("%H:%M"),
+                        "duracao": int(duracao), "tipo": tipo, "valor": float(valor), "status": "Pendente"})
+        st.success(f"Agendado: {paciente} em {data.strftime('%d/%m/%Y')} às {hora.strftime('%H:%M')}.")
+    except SlotConflict as e:
+        st.error(str(e))
+        livres = scheduler.free_slots(data, data + datetime.timedelta(days=6), duracao, medico=medico, sala=sala, limit=5)
+        if livres:
+            st.caption("Horários livres: " + " · ".join(f"{datetime.date.fromisoformat(d).strftime('%d/%m')} {h}" for d, h in livres))
+
+@tracer.trace
 def page_magic_prontuario():
     st.markdown("### ✨ Prontuário Inteligente (IA)")
     c1, c2 = st.columns([1, 1])
     with c1:
         st.markdown("<div class='glass-card'>", unsafe_allow_html=True)
-        pat = st.selectbox("Paciente", [p['nome'] for p in st.session_state.data['pacientes']])
+        pat_id, pat = patient_picker("Paciente", key="soap_pat")
         raw = st.text_area("Notas Clínicas (Dite ou digite)", height=250, placeholder="Paciente relata cefaleia frontal há 3 dias...")
-        if st.button("Processar Prontuário"):
-            if raw:
-                with st.spinner("Estruturando dados..."):
-                    st.session_state.generated_soap = ai_structure_soap(f"Paciente: {pat}. Notas: {raw}")
+        streaming = st.toggle("Exibir em tempo real (streaming)", value=True)
+        usar_contexto = st.toggle("Incluir contexto do prontuário (histórico, alergias e registros relevantes)", value=True)
+        processar = st.button("Processar Prontuário") and bool(raw)
+        if processar:
+            prompt, st.session_state.soap_context_stats = soap_prompt(pat_id, pat, raw, usar_contexto)
+        if processar and not streaming:
+            with st.spinner("Estruturando dados..."):
+                t0 = time.perf_counter()
+                st.session_state.generated_soap = ai_structure_soap(prompt)
+                st.session_state.generated_soap_patient = pat_id
+                st.session_state.soap_timing = {"ttft": None, "total": time.perf_counter() - t0}
+        cache_stats = get_soap_cache().stats()
+        st.caption(f"Cache IA: {cache_stats['memory_hits'] + cache_stats['disk_hits']} acertos · {cache_stats['misses']} chamadas · {cache_stats['hit_rate']:.0%} de aproveitamento")
+        ctx = st.session_state.get("soap_context_stats")
+        if ctx:
+            st.caption(f"Contexto: {ctx['trechos']} registros · {ctx['alergias']} alergias · ~{ctx['tokens']} tokens (prontuário completo: ~{ctx['tokens_prontuario']})")
         st.markdown("</div>", unsafe_allow_html=True)
     with c2:
-        if "generated_soap" in st.session_state:
+        if processar and streaming:
+            st.markdown("<div class='glass-card'>", unsafe_allow_html=True)
+            st.markdown("#### Documento Gerado")
+            stream = ai_stream_soap(prompt)
+            try:
+                st.write_stream(stream)
+            finally:
+                # Libera quem espera esta geração mesmo se o rerun for interrompido
+                stream.close()
+                trace_soap_stream(stream)
+            # Mesmo com falha no meio do stream o texto parcial é mantido
+            st.session_state.generated_soap = stream.text
+            st.session_state.generated_soap_patient = pat_id
+            st.session_state.soap_timing = stream.timing()
+            if stream.error:
+                faltando = [nome for nome, corpo in stream.sections.items() if not corpo]
+                st.warning(f"A geração foi interrompida. O texto parcial foi mantido (seções incompletas: {', '.join(faltando) or 'nenhuma'}).")
+        elif "generated_soap" in st.session_state:
             st.markdown("<div class='glass-card'>", unsafe_allow_html=True)
             st.markdown("#### Documento Gerado")
             st.markdown(st.session_state.generated_soap)
-            st.button("Assinar e Salvar", use_container_width=True)
+        if "generated_soap" in st.session_state:
+            timing = st.session_state.get("soap_timing") or {}
+            if timing.get("total") is not None:
+                ttft = f"{timing['ttft']:.2f}s" if timing.get("ttft") is not None else "—"
+                st.caption(f"⏱️ Primeiro token: {ttft} · Total: {timing['total']:.2f}s")
+            if st.button("Assinar e Salvar", use_container_width=True):
+                target = st.session_state.get("generated_soap_patient")
+                p_data = store.get_patient(target) if target else None
+                if p_data:
+                    add_timeline_event(p_data['id'], {"data": datetime.date.today().isoformat(), "evento": "Prontuário SOAP", "detalhe": st.session_state.generated_soap})
+                    st.success(f"Prontuário salvo na timeline de {p_data['nome']}.")
             st.markdown("</div>", unsafe_allow_html=True)
 
+    with st.expander("📦 Processamento em Lote (ditados do turno)"):
+        page_soap_batch()
+
+@tracer.trace
+def page_soap_batch():
+    st.caption("Envie um CSV ou JSONL com as colunas `paciente` (ou `paciente_id`) e `notas`. Cada prontuário é salvo na timeline assim que fica pronto.")
+    arquivo = st.file_uploader("Arquivo de notas", type=["csv", "jsonl", "ndjson"], key="batch_file")
+    b1, b2, b3 = st.columns(3)
+    concorrencia = b1.slider("Concorrência", 1, 16, 4)
+    por_minuto = b2.slider("Limite (req/min)", 10, 300, 60, step=10)
+    tentativas = b3.slider("Tentativas extras", 0, 5, 3)
+    if arquivo is None or not st.button("Processar Lote", use_container_width=True):
+        return
+    client = get_groq_client()
+    if not client:
+        st.error("⚠️ Erro: IA Offline")
+        return
+    try:
+        itens = parse_batch_file(arquivo.name, arquivo.getvalue())
+    except (ValueError, KeyError) as e:
+        st.error(f"Arquivo inválido: {e}")
+        return
+    if not itens:
+        st.warning("Nenhuma nota encontrada no arquivo.")
+        return
+
+    for item in itens:
+        p_data = store.get_patient(item.paciente_id) if item.paciente_id else store.find_patient_by_name(item.paciente)
+        if p_data:
+            item.paciente_id, item.paciente = p_data['id'], p_data['nome']
+    desconhecidos = [i for i in itens if not i.paciente_id]
+    validos = [i for i in itens if i.paciente_id]
+    if desconhecidos:
+        st.warning(f"{len(desconhecidos)} linha(s) ignoradas: paciente não encontrado ({', '.join(i.paciente or '?' for i in desconhecidos[:5])}).")
+
+    progresso = st.progress(0.0, text="Iniciando lote...")
+    t0 = time.perf_counter()
+    concluidos, falhas = 0, []
+    # Contexto montado antes do lote: embeddings e índice ficam na thread do script
+    prompts = {item.index: soap_prompt(item.paciente_id, item.paciente, item.notas)[0] for item in validos}
+    worker = lambda item: soap_completion(client, prompts[item.index])
+
+    def salvar(res):
+        if res.ok:
+            add_timeline_event(res.item.paciente_id, {"data": datetime.date.today().isoformat(), "evento": "Prontuário SOAP (lote)", "detalhe": res.soap})
+
+    # Em rerun/parada, o que já estava em andamento ainda é gravado (na thread do pool)
+    for res in run_batch(validos, worker, concurrency=concorrencia, rate_per_minute=por_minuto, retries=tentativas, on_abandoned=salvar):
+        concluidos += 1
+        salvar(res)
+        if not res.ok:
+            falhas.append(res)
+        progresso.progress(concluidos / len(validos), text=f"{concluidos}/{len(validos)} · {res.item.paciente} ({res.elapsed:.1f}s)")
+    st.success(f"Lote concluído: {len(validos) - len(falhas)} prontuários salvos em {time.perf_counter() - t0:.1f}s.")
+    if falhas:
+        st.dataframe(pd.DataFrame([{"linha": f.item.index + 1, "paciente": f.item.paciente, "erro": f.error} for f in falhas]), hide_index=True, use_container_width=True)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def doctor_info(username='admin'):
+    """Nome e CRM do médico para a assinatura dos documentos."""
+    medico = store.get_credential(username) or {}
+    return {"nome": medico.get('nome', ''), "crm": medico.get('crm') or ''}
+
+@tracer.trace
 def page_prescription():
     st.markdown("### 💊 Receituário & Atestados")
     c1, c2 = st.columns([1, 1])
     
     with c1:
         st.markdown("<div class='glass-card'>", unsafe_allow_html=True)
-        pat = st.selectbox("Selecione o Paciente", [p['nome'] for p in st.session_state.data['pacientes']], key="presc_pat")
-        meds = st.multiselect("Medicamentos", st.session_state.data['medicamentos'])
+        pat_id, _ = patient_picker("Selecione o Paciente", key="presc_pat")
+        meds = st.multiselect("Medicamentos", store.medicamentos())
+        p_data = store.get_patient(pat_id) if pat_id else None
+        pat = p_data['nome'] if p_data else None
+        alertas = get_interaction_engine().check(meds, p_data['historico'] if p_data else "")
+        for alerta in alertas:
+            if alerta.gravidade == "grave":
+                st.error(f"⛔ **{alerta.tipo.capitalize()}:** {alerta.mensagem}")
+            else:
+                st.warning(f"⚠️ **{alerta.tipo.capitalize()}:** {alerta.mensagem}")
         obs = st.text_area("Instruções de Uso", "Tomar 1 comprimido a cada 8 horas por 5 dias.")
         add_atestado = st.checkbox("Gerar Atestado Médico")
         dias_afastamento = 0
         if add_atestado:
             dias_afastamento = st.number_input("Dias de afastamento", min_value=1, value=1)
         
-        gerar = st.button("Gerar Documento Oficial", use_container_width=True)
+        ciente = True
+        if any(a.gravidade == "grave" for a in alertas):
+            ciente = st.checkbox("Estou ciente dos alertas graves e desejo prescrever mesmo assim")
+        gerar = st.button("Gerar Documento Oficial", use_container_width=True, disabled=not ciente)
         st.markdown("</div>", unsafe_allow_html=True)
         
     with c2:
         if gerar:
-            st.markdown(f"""
-            <div class='paper-sheet'>
-                <div style='text-align:center; border-bottom: 2px solid #333; padding-bottom:10px; margin-bottom:20px;'>
-                    <h2>CLÍNICA AURAMED</h2>
-                    <small>Rua da Saúde, 1000 - Centro | Tel: (11) 99999-9999</small>
-                </div>
-                <p><strong>Paciente:</strong> {pat}</p>
-                <p><strong>Data:</strong> {datetime.date.today().strftime('%d/%m/%Y')}</p>
-                <hr>
-                <h4>USO INTERNO/ORAL</h4>
-                <ul>
-                    {''.join([f'<li style="margin-bottom:10px;"><b>{m}</b><br>{obs}</li>' for m in meds])}
-                </ul>
-                {f"<hr><h4>ATESTADO</h4><p>Atesto para os devidos fins que o paciente necessita de <b>{dias_afastamento} dias</b> de afastamento.</p>" if add_atestado else ""}
-                <br><br><br>
-                <div style='text-align:center;'>
-                    <p>___________________________________</p>
-                    <p>{st.session_state.data['credentials']['admin']['nome']}</p>
-                    <p>{st.session_state.data['credentials']['admin']['crm']}</p>
-                    <p style='color:#0d9488; font-size:0.8em;'>Assinado Digitalmente via AuraMed OS</p>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+            if p_data and meds:
+                store.add_prescription(p_data['id'], datetime.date.today(), meds, obs, dias_afastamento)
+            doc = PrescriptionDoc(pat or "", meds, obs, dias_afastamento)
+            medico = doctor_info()
+            st.markdown(render_html(doc, medico), unsafe_allow_html=True)
+            st.download_button("⬇️ Baixar PDF", render_pdf(doc, medico), file_name=f"receita_{(pat or 'paciente').replace(' ', '_')}.pdf", mime="application/pdf", use_container_width=True)
 
+    with st.expander("🔁 Renovação de Receitas em Lote"):
+        st.caption("Gera receitas de uso contínuo para todos os pacientes crônicos de um medicamento. Pacientes com alerta grave (alergia, interação) ficam de fora.")
+        med_lote = st.selectbox("Medicamento de uso contínuo", store.medicamentos(), index=None, placeholder="ex: Losartana 50mg", key="lote_med")
+        obs_lote = st.text_input("Posologia", "Tomar 1 comprimido ao dia. Uso contínuo.", key="lote_obs")
+        if med_lote and st.button("Gerar receitas (PDF)", key="lote_gerar"):
+            # O termo casa também com "alergia a <fármaco>" no histórico: cada paciente passa pelas regras
+            engine = get_interaction_engine()
+            pacientes, bloqueados = [], []
+            for p in store.patients_using(med_lote.split()[0]):
+                graves = [a.mensagem for a in engine.check([med_lote], p['historico']) if a.gravidade == "grave"]
+                if graves:
+                    bloqueados.append({"paciente": p['nome'], "alerta": " ".join(graves)})
+                else:
+                    pacientes.append(p)
+            docs = [PrescriptionDoc(p['nome'], [med_lote], obs_lote) for p in pacientes]
+            pdfs, stats = render_batch(docs, doctor_info())
+            if bloqueados:
+                st.error(f"⛔ {len(bloqueados)} pacientes não receberam a renovação por alerta grave:")
+                st.dataframe(pd.DataFrame(bloqueados), hide_index=True, use_container_width=True)
+            if not pdfs:
+                st.info("Nenhum paciente em uso contínuo deste medicamento.")
+            else:
+                store.add_prescriptions_bulk([p['id'] for p in pacientes], datetime.date.today(), [med_lote], obs_lote)
+                pacote = io.BytesIO()
+                with zipfile.ZipFile(pacote, "w", zipfile.ZIP_DEFLATED) as zf:
+                    for p, pdf in zip(pacientes, pdfs):
+                        zf.writestr(f"receita_{p['id']}_{p['nome'].replace(' ', '_')}.pdf", pdf)
+                st.success(f"{stats.documentos} receitas em {stats.segundos:.2f}s ({stats.por_segundo:.0f} docs/s, {stats.bytes_medio / 1024:.1f} KB por documento).")
+                st.download_button("⬇️ Baixar pacote (.zip)", pacote.getvalue(), file_name=f"renovacao_{med_lote.split()[0]}.zip", mime="application/zip", key="lote_zip")
+
+    with st.expander("🔎 Auditoria de Prescrições"):
+        engine = get_interaction_engine()
+        st.caption(f"Regras versão {engine.version} · {engine.pair_count} pares de interação · {store.count_prescriptions()} prescrições registradas")
+        if st.button("Auditar todas as prescrições com as regras atuais"):
+            t0 = time.perf_counter()
+            achados = engine.audit((pr['id'], pr['medicamentos'], pr['historico']) for pr in store.iter_prescriptions())
+            linhas = [{"prescrição": pid, "gravidade": a.gravidade, "tipo": a.tipo, "alerta": a.mensagem} for pid, alertas in achados for a in alertas]
+            st.success(f"Auditoria concluída em {(time.perf_counter() - t0) * 1000:.1f} ms: {len(achados)} prescrições com alertas.")
+            if linhas:
+                st.dataframe(pd.DataFrame(linhas), hide_index=True, use_container_width=True)
+
+@tracer.trace
 def page_financial():
     st.markdown("### 💰 Gestão Financeira")
     
-    # Top Stats
+    # Período padrão: o semestre que termina no último lançamento
+    fim_padrao = ledger.last_day or datetime.date.today()
+    mes_inicio = fim_padrao.month - 5
+    inicio_padrao = datetime.date(fim_padrao.year + (mes_inicio - 1) // 12, (mes_inicio - 1) % 12 + 1, 1)
+    periodo = st.date_input("Período", value=(inicio_padrao, fim_padrao), format="DD/MM/YYYY", key="fin_periodo")
+    inicio, fim = (periodo[0], periodo[1]) if len(periodo) == 2 else (inicio_padrao, fim_padrao)
+
+    # Top Stats (comparados ao período anterior de mesmo tamanho)
     f1, f2, f3 = st.columns(3)
-    rec_total = sum(st.session_state.data['financeiro']['receita'])
-    desp_total = sum(st.session_state.data['financeiro']['despesas'])
-    lucro = rec_total - desp_total
+    atual, anterior = ledger.summary(inicio, fim)
+    rec_total, desp_total, lucro = atual[RECEITA], atual[DESPESA], atual['lucro']
     
-    f1.metric("Receita Semestral", f"R$ {rec_total:,.2f}")
-    f2.metric("Despesas", f"R$ {desp_total:,.2f}", delta="-12%", delta_color="inverse")
-    f3.metric("Lucro Líquido", f"R$ {lucro:,.2f}", delta="Bom")
+    f1.metric("Receita do Período", f"R$ {rec_total:,.2f}", delta=pct_delta(rec_total, anterior[RECEITA]))
+    f2.metric("Despesas", f"R$ {desp_total:,.2f}", delta=pct_delta(desp_total, anterior[DESPESA]), delta_color="inverse")
+    f3.metric("Lucro Líquido", f"R$ {lucro:,.2f}", delta=pct_delta(lucro, anterior['lucro']))
     
     st.markdown("<div class='glass-card'>", unsafe_allow_html=True)
-    st.plotly_chart(plot_finance_chart(), use_container_width=True)
+    st.plotly_chart(plot_finance_chart(inicio, fim), use_container_width=True)
     st.markdown("</div>", unsafe_allow_html=True)
 
+    c1, c2 = st.columns([2, 1])
+    with c1:
+        st.markdown("<div class='glass-card'>", unsafe_allow_html=True)
+        st.subheader("Últimos Lançamentos")
+        lanc = pd.DataFrame(store.ledger_entries(inicio, fim, limit=PAGE_SIZE), columns=['data', 'tipo', 'descricao', 'valor'])
+        st.dataframe(lanc, use_container_width=True, hide_index=True, column_config={"valor": st.column_config.NumberColumn("Valor", format="R$ %.2f")})
+        st.markdown("</div>", unsafe_allow_html=True)
+    with c2:
+        st.markdown("<div class='glass-card'>", unsafe_allow_html=True)
+        st.subheader("Lançar Despesa")
+        with st.form("nova_despesa", clear_on_submit=True, border=False):
+            data = st.date_input("Data", value=datetime.date.today(), format="DD/MM/YYYY")
+            descricao = st.text_input("Descrição")
+            valor = st.number_input("Valor (R$)", min_value=0.0, step=50.0)
+            if st.form_submit_button("Lançar", use_container_width=True) and valor > 0:
+                ledger.record(data, DESPESA, valor, descricao)
+                st.rerun()
+        st.markdown("</div>", unsafe_allow_html=True)
+
+@tracer.trace
 def page_patient_list():
     st.markdown("### 📂 Prontuário Eletrônico (Timeline)")
-    search = st.text_input("Buscar paciente...", placeholder="Nome, CPF ou Telefone")
+    search = st.text_input("Buscar paciente...", placeholder="Nome, CID (ex: I10) ou sintomas/histórico")
     
-    filtered = [p for p in st.session_state.data['pacientes'] if search.lower() in p['nome'].lower()] if search else st.session_state.data['pacientes']
+    total = store.count_patients()
+    if search:
+        indice = get_search_index()
+        if indice is not None:
+            filtered = store.get_patients(indice.search(search, k=SEARCH_TOP_K))
+        else:
+            st.caption("Índice semântico em preparação: buscando apenas pelo nome.")
+            filtered = store.get_patients(list(store.find_patient_choices(search.strip(), limit=SEARCH_TOP_K)))
+    else:
+        pagina = st.number_input("Página", min_value=1, value=1, max_value=max(1, -(-total // PAGE_SIZE)), key="pac_page")
+        filtered = store.list_patients(limit=PAGE_SIZE, offset=(pagina - 1) * PAGE_SIZE)
+    st.caption(f"Mostrando {len(filtered)} de {total} pacientes")
+    reduzir = st.toggle(f"Reduzir séries longas de sinais vitais (máx. {VITALS_MAX_POINTS} pontos)", value=True, key="vitals_lttb")
     
+    ultimas = store.last_visits(p['id'] for p in filtered)
     for p in filtered:
-        with st.expander(f"👤 {p['nome']} | Última Visita: {p['timeline'][-1]['data']}"):
-            t1, t2 = st.tabs(["Timeline Clínica", "Dados Vitais"])
-            with t1:
-                for event in reversed(p.get('timeline', [])):
-                    st.markdown(f"""
-                    <div style='border-left: 2px solid #e2e8f0; padding-left: 15px; margin-bottom: 20px;'>
-                        <small style='color:#0d9488; font-weight:bold;'>{event['data']}</small>
-                        <h5 style='margin:0;'>{event['evento']}</h5>
-                        <p style='margin:0; color:#64748b;'>{event['detalhe']}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-            with t2:
-                # Simples gráfico de linha usando plotly express
-                fig = px.line(x=p['vitals']['datas'], y=p['vitals']['pressao'], markers=True, title="Evolução Pressão Arterial")
-                fig.update_layout(plot_bgcolor='white')
-                st.plotly_chart(fig, use_container_width=True)
+        ultima = ultimas.get(p['id']) or "—"
+        # Expander e abas com execução preguiçosa: só montamos o conteúdo aberto
+        exp = st.expander(f"👤 {p['nome']} | Última Visita: {ultima}", key=f"pac_exp_{p['id']}", on_change="rerun")
+        if not exp.open:
+            continue
+        with exp:
+            t1, t2 = st.tabs(["Timeline Clínica", "Dados Vitais"], key=f"pac_tabs_{p['id']}", on_change="rerun")
+            if t1.open:
+                with t1:
+                    render_timeline(p['id'], variant="doctor", key_prefix="pac_tl")
+            if t2.open:
+                with t2:
+                    fig = plot_vitals_chart(p['id'], max_points=VITALS_MAX_POINTS if reduzir else None)
+                    st.plotly_chart(fig, use_container_width=True)
+
+@tracer.trace
+def page_bulk_io():
+    st.markdown("### 🔄 Importação e Exportação em Massa")
+    st.caption("Arquivos são processados em blocos de linhas; arquivos grandes podem ser lidos direto de um caminho no servidor.")
+    rotulos = {"pacientes": "Pacientes", "timeline": "Timeline clínica", "vitals": "Sinais vitais", "appointments": "Agendamentos"}
+    t1, t2 = st.tabs(["Importar", "Exportar"])
+    with t1:
+        entidade = st.selectbox("Dados", list(SCHEMAS), format_func=rotulos.get, key="bulk_in_ent")
+        st.caption("Colunas: " + ", ".join(SCHEMAS[entidade]) + " (* obrigatória)")
+        origem = st.radio("Origem", ["Upload", "Caminho no servidor"], horizontal=True, key="bulk_in_src")
+        if origem == "Upload":
+            arquivo = st.file_uploader("Arquivo", type=["csv", "jsonl", "ndjson", "json", "parquet"], key="bulk_in_file")
+            nome = arquivo.name if arquivo else ""
+        else:
+            arquivo = nome = st.text_input("Caminho do arquivo", key="bulk_in_path").strip()
+        referencia = "origem"
+        if entidade in ("timeline", "vitals"):
+            referencia = "local" if st.toggle("`paciente_id` é o id do AuraMed (não o do sistema de origem)", key="bulk_in_ref") else "origem"
+        if st.button("Importar", type="primary", disabled=not arquivo, key="bulk_in_go"):
+            try:
+                fmt = detect_format(nome)
+                if origem != "Upload" and not os.path.isfile(arquivo):
+                    raise ValueError(f"arquivo não encontrado: {arquivo}")
+                progresso = st.empty()
+                # O índice de busca alcança o banco sozinho (em segundo plano para lotes grandes)
+                relatorio = import_records(store, entidade, arquivo, fmt, vitals=vitals_store, referencia=referencia, scheduler=scheduler,
+                                           on_chunk=lambda r: progresso.caption(f"{r.lidas:,} linhas lidas · {r.linhas_por_s:,.0f} linhas/s"))
+                progresso.empty()
+                st.session_state.bulk_report = relatorio
+            except Exception as e:
+                st.error(f"Falha na importação: {e}")
+        relatorio = st.session_state.get("bulk_report")
+        if relatorio:
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Linhas lidas", f"{relatorio.lidas:,}")
+            c2.metric("Gravadas", f"{relatorio.gravadas:,}", delta=f"{relatorio.ignoradas:,} já existentes" if relatorio.ignoradas else None, delta_color="off")
+            c3.metric("Rejeitadas", f"{relatorio.rejeitadas:,}")
+            c4.metric("Vazão", f"{relatorio.linhas_por_s:,.0f} linhas/s", help=f"{relatorio.segundos:.2f}s em {relatorio.blocos} blocos")
+            if relatorio.erros:
+                st.dataframe(pd.DataFrame(relatorio.erros), hide_index=True, use_container_width=True)
+                if relatorio.rejeitadas > len(relatorio.erros):
+                    st.caption(f"Exibindo os primeiros {len(relatorio.erros)} de {relatorio.rejeitadas} erros.")
+    with t2:
+        c1, c2 = st.columns(2)
+        entidade = c1.selectbox("Dados", list(SCHEMAS), format_func=rotulos.get, key="bulk_out_ent")
+        fmt = c2.selectbox("Formato", FORMATS, format_func=str.upper, key="bulk_out_fmt")
+        if st.button("Gerar arquivo", key="bulk_out_go"):
+            import tempfile
+            caminho = os.path.join(tempfile.gettempdir(), f"auramed_{entidade}_{os.getpid()}.{fmt}")
+            relatorio = export_records(store, entidade, fmt, caminho, vitals=vitals_store)
+            st.session_state.bulk_export = (caminho, entidade, fmt, relatorio)
+        exportado = st.session_state.get("bulk_export")
+        if exportado and os.path.exists(exportado[0]):
+            caminho, entidade, fmt, relatorio = exportado
+            st.caption(f"{relatorio.gravadas:,} linhas · {relatorio.bytes / 1024:,.0f} KB em {relatorio.segundos:.2f}s")
+            with open(caminho, "rb") as f:
+                st.download_button(f"⬇️ Baixar {os.path.basename(caminho)}", f, file_name=f"auramed_{entidade}.{fmt}", use_container_width=True)
+
+@tracer.trace
+def page_diagnostics():
+    st.markdown("### 🩺 Diagnóstico de Desempenho")
+    linhas = tracer.rows()
+    if linhas:
+        st.dataframe(pd.DataFrame(linhas), hide_index=True, use_container_width=True,
+                     column_config={c: st.column_config.NumberColumn(c, format="%.2f") for c in ("p50 (ms)", "p95 (ms)", "p99 (ms)", "máx (ms)")})
+    else:
+        st.info("Nenhum span registrado ainda.")
+    st.caption(f"Percentis sobre as últimas {tracer.capacity} chamadas de cada span · figuras em cache: {figure_cache.hits} acertos / {figure_cache.misses} construções")
+
+    c1, c2, c3 = st.columns(3)
+    if c1.button("🔬 Perfilar próximo rerun", use_container_width=True, help="Liga cProfile e tracemalloc na próxima interação (ex: trocar de módulo)."):
+        st.session_state.profile_next_rerun = True
+        st.toast("A próxima interação será perfilada.")
+    c2.download_button("⬇️ Métricas (Prometheus)", tracer.prometheus(), file_name="auramed_metrics.prom", mime="text/plain", use_container_width=True)
+    if c3.button("Zerar métricas", use_container_width=True):
+        tracer.reset()
+        st.rerun()
+
+    captura = st.session_state.get("last_profile")
+    if captura:
+        with st.expander(f"Último perfil ({captura['label']}): {captura['segundos'] * 1000:.0f} ms · pico {captura['pico_kb']:.0f} KB", expanded=True):
+            st.dataframe(pd.DataFrame(captura['alocacoes']), hide_index=True, use_container_width=True,
+                         column_config={"KB": st.column_config.NumberColumn("KB", format="%.1f")})
+            st.code(captura['perfil'], language=None)
 
 # --- 5. PAINEL DO PACIENTE (NOVO) ---
+@tracer.trace
 def page_patient_dashboard():
     st.markdown(f"## Olá, {st.session_state.user_name}")
     
-    p_data = next((p for p in st.session_state.data['pacientes'] if p['nome'] == st.session_state.user_name), None)
+    p_data = store.get_patient(st.session_state.paciente_id) if st.session_state.get("paciente_id") else None
     
     if p_data:
         c1, c2 = st.columns([2, 1])
         with c1:
              st.markdown("<div class='glass-card'><h4>📈 Meus Sinais Vitais</h4>", unsafe_allow_html=True)
-             fig = px.line(x=p_data['vitals']['datas'], y=p_data['vitals']['pressao'], markers=True)
-             fig.update_layout(plot_bgcolor='white', height=300, margin=dict(l=20, r=20, t=20, b=20))
+             fig = plot_vitals_chart(p_data['id'], compact=True)
              st.plotly_chart(fig, use_container_width=True)
+             with st.form("nova_medicao", clear_on_submit=True, border=False):
+                 m1, m2 = st.columns([2, 1])
+                 sistolica = m1.number_input("Pressão sistólica (mmHg)", min_value=50, max_value=260, value=120)
+                 if m2.form_submit_button("Registrar medição", use_container_width=True):
+                     vitals_store.append(p_data['id'], datetime.datetime.now(), sistolica)
+                     st.rerun()
              st.markdown("</div>", unsafe_allow_html=True)
              
              st.markdown("<div class='glass-card'><h4>🗓️ Minha Timeline</h4>", unsafe_allow_html=True)
-             for event in reversed(p_data.get('timeline', [])):
-                    st.markdown(f"""
-                    <div style='border-left: 3px solid #0d9488; padding-left: 15px; margin-bottom: 15px;'>
-                        <b>{event['data']}</b> - {event['evento']}<br>
-                        <span style='color:gray'>{event['detalhe']}</span>
-                    </div>
-                    """, unsafe_allow_html=True)
+             render_timeline(p_data['id'], variant="patient", key_prefix="meu_tl")
              st.markdown("</div>", unsafe_allow_html=True)
 
         with c2:
@@ -396,7 +1014,7 @@ def page_patient_dashboard():
         st.info("Bem-vindo ao AuraMed. Seus dados clínicos aparecerão aqui após a primeira consulta.")
 
     if st.sidebar.button("Sair", key="logout_pat"):
-        st.session_state.logged_in = False
+        st.session_state.pop("auth_token", None)
         st.rerun()
 
 # --- 6. LOGIN ---
@@ -416,12 +1034,10 @@ def login_screen():
             role = st.radio("Perfil", ["Médico(a)", "Paciente"], horizontal=True)
             
             if st.button("Entrar", use_container_width=True):
-                creds = st.session_state.data.get("credentials", {})
-                u_data = creds.get(user)
-                if u_data and u_data['senha'] == pwd:
-                    st.session_state.logged_in = True
-                    st.session_state.user_role = u_data['role']
-                    st.session_state.user_name = u_data['nome']
+                with st.spinner("Verificando..."):
+                    u_data = authenticator.authenticate(user, pwd)
+                if u_data:
+                    st.session_state.auth_token = authenticator.issue_token(u_data)
                     st.rerun()
                 else:
                     st.error("Dados incorretos.")
@@ -434,26 +1050,34 @@ def login_screen():
             new_role_sel = st.selectbox("Tipo de Conta", ["Paciente", "Médico(a)"])
             
             if st.button("Criar Conta"):
-                if new_u:
-                    role_code = "doctor" if new_role_sel == "Médico(a)" else "patient"
-                    st.session_state.data["credentials"][new_u] = {"senha": new_p, "role": role_code, "nome": new_n}
-                    
-                    if role_code == "patient":
-                        st.session_state.data["pacientes"].append({"id": 99, "nome": new_n, "idade": 0, "sexo": "-", "historico": "Novo", "vitals": {"pressao":[], "datas":[]}, "timeline": []})
-                    
+                role_code = "doctor" if new_role_sel == "Médico(a)" else "patient"
+                novo = None
+                if role_code == "patient":
+                    novo = {"nome": new_n, "idade": 0, "sexo": "-", "historico": "Novo", "vitals": {"pressao":[], "datas":[]}, "timeline": []}
+                try:
+                    authenticator.register(new_u, new_p, role=role_code, nome=new_n, paciente=novo)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
                     st.success(f"Conta de {new_role_sel} criada! Faça login.")
 
         st.markdown("</div>", unsafe_allow_html=True)
         st.markdown("<div style='text-align:center; color:gray; font-size:0.8em;'>Demo: admin/admin | ana/123</div>", unsafe_allow_html=True)
 
 # --- 7. ROUTER ---
-def main():
-    if "logged_in" not in st.session_state:
-        st.session_state.logged_in = False
-
-    if not st.session_state.logged_in:
+@tracer.trace(name="main")
+def run_app():
+    # Só a assinatura do token é conferida a cada rerun; o scrypt roda apenas no login
+    sessao = authenticator.read_token(st.session_state.get("auth_token"))
+    if sessao is None:
         login_screen()
+        # Tela já enviada ao navegador: aquece o modelo sem atrasar a primeira pintura
+        embedding_model_loader().warm()
+        search_index_loader().warm()
     else:
+        st.session_state.user_role = sessao["r"]
+        st.session_state.user_name = sessao["n"]
+        st.session_state.paciente_id = sessao["p"]
         if st.session_state.user_role == "doctor":
             page = sidebar_nav()
             if page == "Dashboard": page_doctor_dashboard()
@@ -461,9 +1085,23 @@ def main():
             elif page == "Receituário": page_prescription()
             elif page == "Pacientes": page_patient_list()
             elif page == "Financeiro": page_financial()
+            elif page == "Importar/Exportar": page_bulk_io()
+            elif page == "Diagnóstico": page_diagnostics()
         else:
             # Chama o novo Dashboard Completo do Paciente
             page_patient_dashboard()
+    startup_report.mark("first_paint")
+
+def main():
+    # Captura opt-in (painel de Diagnóstico): cProfile + tracemalloc apenas neste rerun
+    if st.session_state.pop("profile_next_rerun", False):
+        with tracer.capture(label=datetime.datetime.now().strftime("%d/%m %H:%M:%S")) as captura:
+            st.session_state.last_profile = captura
+            run_app()
+    else:
+        run_app()
+    if METRICS_PATH:
+        tracer.export_textfile(METRICS_PATH)
 
 if __name__ == "__main__":
     main()
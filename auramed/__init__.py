@@ -0,0 +1 @@
+"""Núcleo do AuraMed OS: motores de dados, busca e IA usados pelo app.py."""
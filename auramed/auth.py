@@ -0,0 +1,125 @@
+"""Autenticação: senhas com scrypt e tokens de sessão assinados.
+
+As senhas são guardadas como `scrypt$n$r$p$sal$hash` e comparadas em tempo
+constante. O scrypt é caro de propósito; ele roda em um pool pequeno de
+threads (o hashlib libera o GIL durante o cálculo), o que limita a memória e a
+CPU usadas por logins simultâneos sem travar as outras sessões.
+
+Depois do login a sessão guarda apenas um token assinado com HMAC, e cada
+rerun confere a assinatura em vez de refazer o scrypt.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+PREFIX = "scrypt$"
+TOKEN_TTL = 8 * 3600
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(senha, salt, n, r, p):
+    return hashlib.scrypt(senha.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=32)
+
+
+def hash_password(senha, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    salt = os.urandom(16)
+    return f"{PREFIX}{n}${r}${p}${_b64(salt)}${_b64(_scrypt(senha, salt, n, r, p))}"
+
+
+def is_hashed(valor):
+    return bool(valor) and valor.startswith(PREFIX)
+
+
+def verify_password(senha, armazenada):
+    """Confere a senha em tempo constante. Aceita registros antigos em texto puro."""
+    if not is_hashed(armazenada):
+        return hmac.compare_digest((senha or "").encode("utf-8"), (armazenada or "").encode("utf-8"))
+    try:
+        n, r, p, salt, esperado = armazenada[len(PREFIX):].split("$")
+        calculado = _scrypt(senha or "", _unb64(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(calculado, _unb64(esperado))
+
+
+class Authenticator:
+    """Login, cadastro e sessões sobre as credenciais do `ClinicStore`."""
+
+    def __init__(self, store, secret=None, workers=2, token_ttl=TOKEN_TTL):
+        self.store = store
+        # Sem segredo configurado, os tokens valem só enquanto o processo viver
+        self.secret = (secret.encode("utf-8") if isinstance(secret, str) else secret) or os.urandom(32)
+        self.token_ttl = token_ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+        # Usuários inexistentes também pagam um scrypt: o tempo de resposta não revela quem existe
+        self._dummy = hash_password(_b64(os.urandom(12)))
+
+    def _hash(self, senha):
+        return self._pool.submit(hash_password, senha).result()
+
+    def _check(self, username, senha):
+        cred = self.store.get_credential(username)
+        ok = verify_password(senha, cred["senha"] if cred else self._dummy)
+        if not (ok and cred):
+            return None
+        if not is_hashed(cred["senha"]):
+            self.store.set_password(username, hash_password(senha))
+        return cred
+
+    def authenticate(self, username, senha):
+        """Credencial do usuário se a senha confere; caso contrário None."""
+        return self._pool.submit(self._check, username or "", senha or "").result()
+
+    def register(self, username, senha, role, nome, paciente=None):
+        """Cria a conta (e o prontuário, para pacientes). Devolve o id do paciente ou None."""
+        if not username or not senha:
+            raise ValueError("Usuário e senha são obrigatórios.")
+        if self.store.get_credential(username):
+            raise ValueError(f"O usuário '{username}' já existe.")
+        senha_hash = self._hash(senha)
+        # A checagem acima só poupa o scrypt; quem garante a unicidade é o INSERT
+        try:
+            return self.store.add_account(username, senha_hash, role, nome, paciente)
+        except sqlite3.IntegrityError:
+            raise ValueError(f"O usuário '{username}' já existe.") from None
+
+    def upgrade_plaintext(self):
+        """Converte senhas antigas em texto puro para scrypt. Devolve quantas mudaram."""
+        antigas = [(u, s) for u, s in self.store.credential_secrets() if not is_hashed(s)]
+        for (username, _), novo in zip(antigas, self._pool.map(hash_password, [s for _, s in antigas])):
+            self.store.set_password(username, novo)
+        return len(antigas)
+
+    # --- tokens de sessão ---
+
+    def _sign(self, payload):
+        return _b64(hmac.new(self.secret, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def issue_token(self, cred):
+        claims = {"u": cred["username"], "r": cred["role"], "n": cred["nome"], "p": cred.get("paciente_id"),
+                  "exp": int(time.time()) + self.token_ttl}
+        payload = _b64(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return f"{payload}.{self._sign(payload)}"
+
+    def read_token(self, token):
+        """Claims do token se a assinatura confere e ele não expirou; senão None."""
+        if not token or token.count(".") != 1:
+            return None
+        payload, assinatura = token.split(".")
+        if not hmac.compare_digest(assinatura, self._sign(payload)):
+            return None
+        claims = json.loads(_unb64(payload))
+        return claims if claims.get("exp", 0) > time.time() else None
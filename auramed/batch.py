@@ -0,0 +1,138 @@
+"""Pipeline em lote para ditados de fim de turno.
+
+Recebe muitos pares (paciente, notas), distribui as chamadas ao LLM em um pool
+de threads com limite de concorrência, rate limit por token bucket e retry com
+backoff exponencial, e entrega os resultados à medida que ficam prontos.
+"""
+import csv
+import io
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class BatchItem:
+    index: int
+    paciente: str
+    notas: str
+    paciente_id: Optional[int] = None
+
+
+@dataclass
+class BatchResult:
+    item: BatchItem
+    soap: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def parse_batch_file(filename, content):
+    """Lê CSV ou JSONL com colunas `paciente` (ou `paciente_id`) e `notas`."""
+    text = content.decode("utf-8-sig") if isinstance(content, bytes) else content
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        rows = (json.loads(line) for line in text.splitlines() if line.strip())
+    else:
+        rows = csv.DictReader(io.StringIO(text))
+    items = []
+    for i, row in enumerate(rows):
+        notas = (row.get("notas") or "").strip()
+        if not notas:
+            continue
+        pid = row.get("paciente_id")
+        items.append(BatchItem(
+            index=i,
+            paciente=(row.get("paciente") or "").strip(),
+            notas=notas,
+            paciente_id=int(pid) if pid not in (None, "") else None,
+        ))
+    return items
+
+
+class TokenBucket:
+    """Rate limiter: `rate` requisições por segundo, rajadas até `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def call_with_retry(fn, retries=3, base_delay=1.0, max_delay=30.0):
+    """Executa `fn()` com backoff exponencial + jitter. Retorna (valor, tentativas)."""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn(), attempt
+        except Exception:
+            if attempt > retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+def run_batch(items, worker, concurrency=4, rate_per_minute=60, retries=3, base_delay=1.0, on_abandoned=None):
+    """Processa `items` em paralelo e produz `BatchResult` na ordem de conclusão.
+
+    `worker(item)` devolve o texto SOAP e pode levantar exceção para retry.
+    O consumo do gerador acontece na thread chamadora, então é seguro
+    atualizar a interface e o banco a cada resultado.
+
+    Se o gerador for fechado antes do fim (rerun ou parada do Streamlit), os
+    itens ainda na fila são cancelados sem esperar o pool, e os que já estavam
+    rodando (ou prontos e não entregues) vão para `on_abandoned(resultado)`,
+    chamado na thread do pool.
+    """
+    bucket = TokenBucket(rate_per_minute / 60.0, capacity=concurrency) if rate_per_minute else None
+
+    def task(item):
+        t0 = time.perf_counter()
+
+        def attempt():
+            if bucket:
+                bucket.acquire()
+            return worker(item)
+
+        try:
+            soap, attempts = call_with_retry(attempt, retries=retries, base_delay=base_delay)
+            return BatchResult(item, soap=soap, attempts=attempts, elapsed=time.perf_counter() - t0)
+        except Exception as e:
+            return BatchResult(item, error=str(e), attempts=retries + 1, elapsed=time.perf_counter() - t0)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="soap-batch")
+    futures = [pool.submit(task, item) for item in items]
+    entregues = set()
+    try:
+        for future in as_completed(futures):
+            entregues.add(future)
+            yield future.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        if on_abandoned is not None:
+            for future in futures:
+                if future not in entregues and not future.cancelled():
+                    future.add_done_callback(lambda f: on_abandoned(f.result()))
@@ -0,0 +1,363 @@
+"""Importação e exportação em massa (CSV, JSONL e Parquet).
+
+Os arquivos são lidos em blocos de linhas (`pd.read_csv(chunksize=...)`,
+`pd.read_json(lines=True, chunksize=...)` e `ParquetFile.iter_batches`). Uma
+thread leitora entrega os blocos por uma fila limitada enquanto a thread
+chamadora valida e grava, então a memória fica em poucos blocos, qualquer que
+seja o tamanho do arquivo.
+
+Arquivos de pacientes trazem o `id` do sistema de origem, guardado em
+`pacientes.origem_id`. Timeline e sinais vitais referenciam esse mesmo id e são
+ligados ao paciente local pelo banco, sem mapa em memória. Reimportar o mesmo
+arquivo de pacientes não duplica registros.
+"""
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from auramed.scheduler import STATUSES
+
+FORMATS = ("csv", "jsonl", "parquet")
+CHUNK_ROWS = 20_000
+MAX_ERRORS = 200
+
+# Colunas por entidade; as marcadas com * são obrigatórias
+SCHEMAS = {
+    "pacientes": ["id", "nome*", "idade", "sexo", "historico"],
+    "timeline": ["paciente_id*", "data*", "evento*", "detalhe"],
+    "vitals": ["paciente_id*", "ts*", "pressao*"],
+    "appointments": ["paciente*", "data*", "hora*", "tipo", "status", "valor", "medico", "sala", "duracao"],
+}
+
+
+# Tipos fixos do Parquet: o esquema não pode depender do primeiro bloco (uma
+# coluna toda vazia nele viraria `null` e os blocos seguintes não casariam)
+PARQUET_TYPES = {
+    "pacientes": {"id": "int64", "nome": "string", "idade": "int64", "sexo": "string", "historico": "string"},
+    "timeline": {"paciente_id": "int64", "data": "string", "evento": "string", "detalhe": "string"},
+    "vitals": {"paciente_id": "int64", "ts": "timestamp[s]", "pressao": "float32"},
+    "appointments": {"paciente": "string", "data": "string", "hora": "string", "tipo": "string", "status": "string",
+                     "valor": "float64", "medico": "string", "sala": "string", "duracao": "int64"},
+}
+
+
+def columns(entity):
+    return [c.rstrip("*") for c in SCHEMAS[entity]]
+
+
+def required(entity):
+    return [c.rstrip("*") for c in SCHEMAS[entity] if c.endswith("*")]
+
+
+def detect_format(filename):
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    fmt = {"ndjson": "jsonl", "json": "jsonl", "pq": "parquet"}.get(ext, ext)
+    if fmt not in FORMATS:
+        raise ValueError(f"formato não suportado: '{ext}' (use CSV, JSONL ou Parquet)")
+    return fmt
+
+
+@dataclass
+class BulkReport:
+    entidade: str
+    formato: str
+    lidas: int = 0
+    gravadas: int = 0
+    rejeitadas: int = 0
+    ignoradas: int = 0
+    blocos: int = 0
+    bytes: int = 0
+    segundos: float = 0.0
+    erros: list = field(default_factory=list)
+
+    @property
+    def linhas_por_s(self):
+        return self.lidas / self.segundos if self.segundos else 0.0
+
+    def reject(self, linhas, motivo):
+        self.rejeitadas += len(linhas)
+        espaco = MAX_ERRORS - len(self.erros)
+        self.erros.extend({"linha": int(n) + 1, "motivo": motivo} for n in linhas[:max(0, espaco)])
+
+
+# --- leitura ---
+
+def read_chunks(source, fmt, chunk_rows=CHUNK_ROWS):
+    """Blocos (DataFrame de strings/valores brutos) de um caminho ou arquivo aberto."""
+    if fmt == "csv":
+        yield from pd.read_csv(source, chunksize=chunk_rows, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    elif fmt == "jsonl":
+        yield from pd.read_json(source, lines=True, chunksize=chunk_rows, dtype=False)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"formato não suportado: {fmt}")
+
+
+def _prefetch(chunks, depth=2):
+    """Lê o próximo bloco em outra thread enquanto o atual é gravado (fila limitada)."""
+    fila = queue.Queue(maxsize=depth)
+    parar = threading.Event()
+    fim = object()
+
+    def entregar(item):
+        while not parar.is_set():
+            try:
+                fila.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produtor():
+        try:
+            for chunk in chunks:
+                if not entregar(chunk):
+                    return
+        except Exception as e:
+            entregar(e)
+        entregar(fim)
+
+    threading.Thread(target=produtor, daemon=True, name="bulk-reader").start()
+    try:
+        while True:
+            item = fila.get()
+            if item is fim:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Consumidor interrompido (erro de validação, por exemplo): libera o leitor
+        parar.set()
+
+
+# --- validação (vetorizada por bloco) ---
+
+def _text(df, col):
+    if col not in df:
+        return pd.Series([""] * len(df), index=df.index, dtype=object)
+    return df[col].astype(object).where(df[col].notna(), "").astype(str).str.strip()
+
+
+def _validate(entity, df, offset, report):
+    """Devolve o bloco só com as linhas válidas e as colunas normalizadas."""
+    faltando = [c for c in required(entity) if c not in df.columns]
+    if faltando:
+        raise ValueError(f"colunas obrigatórias ausentes em {entity}: {', '.join(faltando)}")
+    linhas = np.arange(offset, offset + len(df))
+    df = df.set_axis(linhas)
+    out = pd.DataFrame({c: _text(df, c) for c in columns(entity)})
+    for c in ("id", "paciente_id"):
+        if c in out:
+            # JSONL com ids ausentes chega como float ("12.0")
+            out[c] = out[c].str.replace(r"\.0$", "", regex=True)
+    ok = np.ones(len(df), dtype=bool)
+
+    def falha(mask, motivo):
+        nonlocal ok
+        mask = np.asarray(mask, dtype=bool) & ok
+        if mask.any():
+            report.reject(linhas[mask], motivo)
+            ok &= ~mask
+
+    for c in required(entity):
+        falha(out[c] == "", f"campo obrigatório vazio: {c}")
+    if entity == "pacientes":
+        idade = pd.to_numeric(out["idade"].replace("", np.nan), errors="coerce")
+        falha(out["idade"].ne("") & ~idade.between(0, 130), "idade inválida")
+        out["idade"] = [None if pd.isna(v) else int(v) for v in idade]
+        out["id"] = out["id"].replace("", None)
+    elif entity == "timeline":
+        datas = pd.to_datetime(out["data"], errors="coerce", format="ISO8601")
+        falha(datas.isna(), "data inválida")
+        out["data"] = datas.dt.strftime("%Y-%m-%d")
+    elif entity == "vitals":
+        ts = pd.to_datetime(out["ts"], errors="coerce", format="ISO8601")
+        pressao = pd.to_numeric(out["pressao"], errors="coerce")
+        falha(ts.isna(), "data/hora inválida")
+        falha(~pressao.between(40, 300), "pressão fora da faixa (40-300 mmHg)")
+        out["ts"], out["pressao"] = ts, pressao
+    elif entity == "appointments":
+        datas = pd.to_datetime(out["data"], errors="coerce", format="ISO8601")
+        horas = pd.to_datetime(out["hora"], errors="coerce", format="%H:%M")
+        valor = pd.to_numeric(out["valor"].replace("", "0"), errors="coerce")
+        duracao = pd.to_numeric(out["duracao"].replace("", "30"), errors="coerce")
+        falha(datas.isna(), "data inválida")
+        falha(horas.isna(), "hora inválida (use HH:MM)")
+        falha(valor.isna() | (valor < 0), "valor inválido")
+        falha(duracao.isna() | (duracao <= 0), "duração inválida")
+        falha(~out["status"].isin(("",) + STATUSES), "status inválido (use " + ", ".join(STATUSES) + ")")
+        out["data"], out["hora"] = datas.dt.strftime("%Y-%m-%d"), horas.dt.strftime("%H:%M")
+        out["valor"], out["duracao"] = valor, duracao
+    return out[ok]
+
+
+def _resolve_patients(store, ids, referencia):
+    """Série de ids locais (NaN quando o paciente não existe)."""
+    if referencia == "local":
+        numeros = pd.to_numeric(ids, errors="coerce")
+        existentes = store.existing_patient_ids(numeros.dropna().astype(np.int64).tolist())
+        return numeros.where(numeros.isin(list(existentes)))
+    mapa = store.resolve_origin_ids(ids.tolist())
+    return ids.map(mapa)
+
+
+# --- importação ---
+
+def import_records(store, entity, source, fmt, chunk_rows=CHUNK_ROWS, vitals=None, index=None,
+                   referencia="origem", on_chunk=None, scheduler=None):
+    """Importa `source` (caminho ou arquivo aberto) em blocos e devolve um `BulkReport`.
+
+    `index` (opcional) recebe os pacientes/eventos importados com um embedding
+    em lote por bloco. `referencia` diz se `paciente_id` de timeline/vitals é o
+    id de origem ("origem") ou o id local ("local"). Agendamentos passam pelo
+    `scheduler`, que rejeita conflitos de médico/sala e mantém os KPIs.
+    `on_chunk(report)` é chamado após cada bloco (barra de progresso).
+    """
+    if entity not in SCHEMAS:
+        raise ValueError(f"entidade desconhecida: {entity}")
+    if entity == "vitals" and vitals is None:
+        raise ValueError("importação de sinais vitais requer o VitalsStore")
+    if entity == "appointments" and scheduler is None:
+        raise ValueError("importação de agendamentos requer o Scheduler")
+    report = BulkReport(entity, fmt)
+    t0 = time.perf_counter()
+    try:
+        for chunk in _prefetch(read_chunks(source, fmt, chunk_rows)):
+            offset = report.lidas
+            report.lidas += len(chunk)
+            report.blocos += 1
+            validos = _validate(entity, chunk, offset, report)
+            if len(validos):
+                _write(store, entity, validos, report, vitals, index, referencia, scheduler)
+            report.segundos = time.perf_counter() - t0
+            if on_chunk:
+                on_chunk(report)
+    finally:
+        if entity == "vitals":
+            vitals.flush()
+        report.segundos = time.perf_counter() - t0
+    return report
+
+
+def _write(store, entity, df, report, vitals, index, referencia, scheduler):
+    if entity == "pacientes":
+        rows = list(zip(*(df[c].tolist() for c in columns(entity))))
+        novos = store.add_patients_bulk(rows)
+        report.gravadas += len(novos)
+        report.ignoradas += len(rows) - len(novos)
+        if index is not None and novos:
+            index.add_patients([dict(p, timeline=[]) for p in novos])
+        return
+    if entity == "appointments":
+        appts = [
+            {"paciente": p, "data": d, "hora": h, "tipo": t, "status": s, "valor": v, "medico": m, "sala": sa, "duracao": du}
+            for p, d, h, t, s, v, m, sa, du in zip(
+                df["paciente"].tolist(), df["data"].tolist(), df["hora"].tolist(), df["tipo"].tolist(),
+                df["status"].replace("", "Pendente").tolist(), df["valor"].astype(float).tolist(),
+                [m or None for m in df["medico"].tolist()], [sa or None for sa in df["sala"].tolist()], df["duracao"].astype(int).tolist(),
+            )
+        ]
+        ids, conflitos = scheduler.book_many(appts)
+        linhas = df.index.to_numpy()
+        for pos, erro in conflitos:
+            report.reject(linhas[pos:pos + 1], str(erro))
+        report.gravadas += len(ids)
+        return
+
+    local = _resolve_patients(store, df["paciente_id"], referencia)
+    sem_paciente = local.isna().to_numpy()
+    if sem_paciente.any():
+        report.reject(df.index.to_numpy()[sem_paciente], "paciente não encontrado")
+    df, local = df[~sem_paciente], local[~sem_paciente].astype(np.int64)
+    if not len(df):
+        return
+    if entity == "timeline":
+        rows = list(zip(local.tolist(), df["data"].tolist(), df["evento"].tolist(), df["detalhe"].tolist()))
+        store.add_events_bulk(rows)
+        if index is not None:
+            index.add_events([(pid, {"evento": ev, "detalhe": det}) for pid, _, ev, det in rows])
+    else:
+        vitals.append_many(local.to_numpy(), df["ts"].to_numpy("datetime64[s]"), df["pressao"].to_numpy(np.float32), flush=False)
+    report.gravadas += len(df)
+
+
+# --- exportação ---
+
+def _frames(store, entity, chunk_rows, vitals):
+    if entity == "pacientes":
+        lote = []
+        for p in store.iter_patients(batch_size=chunk_rows, with_timeline=False):
+            lote.append({"id": p["id"], "nome": p["nome"], "idade": p["idade"], "sexo": p["sexo"], "historico": p["historico"]})
+            if len(lote) >= chunk_rows:
+                yield pd.DataFrame(lote, columns=columns(entity))
+                lote = []
+        if lote:
+            yield pd.DataFrame(lote, columns=columns(entity))
+    elif entity == "timeline":
+        for rows in store.iter_events(batch_size=chunk_rows):
+            yield pd.DataFrame(rows, columns=["id"] + columns(entity)).drop(columns="id")
+    elif entity == "appointments":
+        lote = []
+        for a in store.iter_appointments(batch_size=chunk_rows):
+            lote.append(a)
+            if len(lote) >= chunk_rows:
+                yield pd.DataFrame(lote)[columns(entity)]
+                lote = []
+        if lote:
+            yield pd.DataFrame(lote)[columns(entity)]
+    elif entity == "vitals":
+        if vitals is None:
+            raise ValueError("exportação de sinais vitais requer o VitalsStore")
+        for pid, ts, pressao in vitals.iter_chunks(chunk_rows):
+            yield pd.DataFrame({"paciente_id": pid, "ts": ts, "pressao": pressao})
+    else:
+        raise ValueError(f"entidade desconhecida: {entity}")
+
+
+def parquet_schema(entity):
+    import pyarrow as pa
+    return pa.schema([(c, pa.type_for_alias(t)) for c, t in PARQUET_TYPES[entity].items()])
+
+
+def export_records(store, entity, fmt, path, chunk_rows=CHUNK_ROWS, vitals=None):
+    """Grava a entidade em `path`, bloco a bloco, e devolve um `BulkReport`."""
+    if fmt not in FORMATS:
+        raise ValueError(f"formato não suportado: {fmt}")
+    report = BulkReport(entity, fmt)
+    t0 = time.perf_counter()
+    writer = None
+    with open(path, "wb") as f:
+        try:
+            if fmt == "parquet":
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                schema = parquet_schema(entity)
+                writer = pq.ParquetWriter(f, schema)
+            for df in _frames(store, entity, chunk_rows, vitals):
+                if fmt == "csv":
+                    f.write(df.to_csv(index=False, header=report.blocos == 0, quoting=csv.QUOTE_MINIMAL).encode("utf-8"))
+                elif fmt == "jsonl":
+                    registros = df.to_dict("records") if entity != "vitals" else df.assign(ts=df["ts"].astype(str)).to_dict("records")
+                    f.write("".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in registros).encode("utf-8"))
+                else:
+                    writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+                report.lidas += len(df)
+                report.gravadas += len(df)
+                report.blocos += 1
+        finally:
+            if writer is not None:
+                writer.close()
+    report.bytes = os.path.getsize(path)
+    report.segundos = time.perf_counter() - t0
+    return report
@@ -0,0 +1,243 @@
+"""Renderização de receitas e atestados no servidor.
+
+Os templates são compilados uma vez e os blocos fixos (cabeçalho da clínica e
+assinatura do médico) ficam em cache. A saída é HTML (para a tela) ou PDF,
+gerado por um escritor mínimo embutido, sem dependências externas. O modo em
+lote mede vazão e tamanho; só lotes grandes vão para um pool de processos
+(`spawn`: o servidor do Streamlit tem threads, e `fork` copiaria locks presos).
+"""
+import datetime
+import html
+import multiprocessing
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from string import Template
+
+CLINICA = {"nome": "CLÍNICA AURAMED", "endereco": "Rua da Saúde, 1000 - Centro | Tel: (11) 99999-9999"}
+# Abaixo disso a partida dos processos custa mais que renderizar tudo em série
+POOL_MIN_DOCS = 3000
+
+_SHEET = Template("""
+<div class='paper-sheet'>
+    $letterhead
+    <p><strong>Paciente:</strong> $paciente</p>
+    <p><strong>Data:</strong> $data</p>
+    <hr>
+    <h4>USO INTERNO/ORAL</h4>
+    <ul>
+        $itens
+    </ul>
+    $atestado
+    <br><br><br>
+    $assinatura
+</div>
+""")
+_ITEM = Template('<li style="margin-bottom:10px;"><b>$med</b><br>$obs</li>')
+_ATESTADO = Template("<hr><h4>ATESTADO</h4><p>Atesto para os devidos fins que o paciente necessita de <b>$dias dias</b> de afastamento.</p>")
+
+
+@dataclass
+class PrescriptionDoc:
+    paciente: str
+    medicamentos: list
+    instrucoes: str = ""
+    dias_afastamento: int = 0
+    data: datetime.date = field(default_factory=datetime.date.today)
+
+
+@dataclass
+class RenderStats:
+    documentos: int = 0
+    segundos: float = 0.0
+    bytes_total: int = 0
+
+    @property
+    def por_segundo(self):
+        return self.documentos / self.segundos if self.segundos else 0.0
+
+    @property
+    def bytes_medio(self):
+        return self.bytes_total / self.documentos if self.documentos else 0.0
+
+
+@lru_cache(maxsize=8)
+def letterhead_html(nome, endereco):
+    return (
+        "<div style='text-align:center; border-bottom: 2px solid #333; padding-bottom:10px; margin-bottom:20px;'>"
+        f"<h2>{html.escape(nome)}</h2><small>{html.escape(endereco)}</small></div>"
+    )
+
+
+@lru_cache(maxsize=64)
+def doctor_block_html(nome, crm):
+    return (
+        "<div style='text-align:center;'><p>___________________________________</p>"
+        f"<p>{html.escape(nome or '')}</p><p>{html.escape(crm or '')}</p>"
+        "<p style='color:#0d9488; font-size:0.8em;'>Assinado Digitalmente via AuraMed OS</p></div>"
+    )
+
+
+def render_html(doc, medico, clinica=CLINICA):
+    """HTML da folha de receita (com atestado, se houver)."""
+    obs = html.escape(doc.instrucoes or "").replace("\n", "<br>")
+    return _SHEET.substitute(
+        letterhead=letterhead_html(clinica["nome"], clinica["endereco"]),
+        paciente=html.escape(doc.paciente),
+        data=doc.data.strftime("%d/%m/%Y"),
+        itens="".join(_ITEM.substitute(med=html.escape(m), obs=obs) for m in doc.medicamentos),
+        atestado=_ATESTADO.substitute(dias=int(doc.dias_afastamento)) if doc.dias_afastamento else "",
+        assinatura=doctor_block_html(medico.get("nome"), medico.get("crm")),
+    )
+
+
+# --- PDF ---
+
+class SimplePDF:
+    """Escritor PDF mínimo: texto Helvetica (WinAnsi) e linhas, várias páginas."""
+
+    WIDTH, HEIGHT, MARGIN = 595, 842, 56
+
+    def __init__(self):
+        self.pages = [[]]
+        self.y = self.HEIGHT - self.MARGIN
+
+    @staticmethod
+    def _escape(text):
+        raw = text.encode("cp1252", errors="replace").decode("latin-1")
+        return raw.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    def _ensure(self, height):
+        if self.y - height < self.MARGIN:
+            self.pages.append([])
+            self.y = self.HEIGHT - self.MARGIN
+
+    def text(self, text, size=11, bold=False, align="left", gap=4):
+        """Escreve um parágrafo com quebra de linha aproximada pela largura."""
+        max_chars = max(10, int((self.WIDTH - 2 * self.MARGIN) / (size * 0.5)))
+        words, lines, current = (text or "").split(), [], ""
+        for word in words:
+            if current and len(current) + 1 + len(word) > max_chars:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}".strip()
+        lines.append(current)
+        font = "F2" if bold else "F1"
+        for line in lines:
+            self._ensure(size + gap)
+            self.y -= size + gap
+            x = self.MARGIN
+            if align == "center":
+                x = (self.WIDTH - len(line) * size * 0.5) / 2
+            self.pages[-1].append(f"BT /{font} {size} Tf {x:.1f} {self.y:.1f} Td ({self._escape(line)}) Tj ET")
+
+    def rule(self, gap=8):
+        self._ensure(gap * 2)
+        self.y -= gap
+        self.pages[-1].append(f"{self.MARGIN} {self.y:.1f} m {self.WIDTH - self.MARGIN} {self.y:.1f} l S")
+        self.y -= gap
+
+    def space(self, height):
+        self._ensure(height)
+        self.y -= height
+
+    def output(self):
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            None,  # páginas, preenchido abaixo
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        ]
+        kids = []
+        for ops in self.pages:
+            stream = zlib.compress("\n".join(ops).encode("latin-1"))
+            objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            content_ref = len(objects)
+            objects.append(
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+                % (self.WIDTH, self.HEIGHT, content_ref)
+            )
+            kids.append(len(objects))
+        objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for i, obj in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+        out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+        return bytes(out)
+
+
+def render_pdf(doc, medico, clinica=CLINICA):
+    """Bytes do PDF da receita, com o mesmo conteúdo do HTML."""
+    pdf = SimplePDF()
+    pdf.text(clinica["nome"], size=16, bold=True, align="center")
+    pdf.text(clinica["endereco"], size=9, align="center")
+    pdf.rule()
+    pdf.text(f"Paciente: {doc.paciente}", bold=True)
+    pdf.text(f"Data: {doc.data.strftime('%d/%m/%Y')}")
+    pdf.rule()
+    pdf.text("USO INTERNO/ORAL", size=12, bold=True)
+    for med in doc.medicamentos:
+        pdf.space(4)
+        pdf.text(med, bold=True)
+        pdf.text(doc.instrucoes or "")
+    if doc.dias_afastamento:
+        pdf.rule()
+        pdf.text("ATESTADO", size=12, bold=True)
+        pdf.text(f"Atesto para os devidos fins que o paciente necessita de {int(doc.dias_afastamento)} dias de afastamento.")
+    pdf.space(48)
+    pdf.text("___________________________________", align="center")
+    pdf.text(medico.get("nome") or "", align="center")
+    pdf.text(medico.get("crm") or "", align="center")
+    pdf.text("Assinado Digitalmente via AuraMed OS", size=8, align="center")
+    return pdf.output()
+
+
+# --- lote ---
+
+_worker_ctx = {}
+
+
+def _init_worker(medico, clinica):
+    _worker_ctx["medico"] = medico
+    _worker_ctx["clinica"] = clinica
+
+
+def _render_one(args):
+    doc, fmt = args
+    if fmt == "pdf":
+        return render_pdf(doc, _worker_ctx["medico"], _worker_ctx["clinica"])
+    return render_html(doc, _worker_ctx["medico"], _worker_ctx["clinica"]).encode("utf-8")
+
+
+def render_batch(docs, medico, fmt="pdf", processes=None, clinica=CLINICA):
+    """Renderiza muitos documentos, em série ou em um pool de processos.
+
+    Sem `processes`, lotes com menos de POOL_MIN_DOCS documentos são
+    renderizados em série no próprio processo.
+    Devolve (lista de bytes na ordem de `docs`, RenderStats).
+    """
+    docs = list(docs)
+    t0 = time.perf_counter()
+    if not docs:
+        return [], RenderStats()
+    if processes is None:
+        processes = min(len(docs), os.cpu_count() or 1) if len(docs) >= POOL_MIN_DOCS else 1
+    if processes <= 1:
+        _init_worker(medico, clinica)
+        outputs = [_render_one((d, fmt)) for d in docs]
+    else:
+        chunk = max(1, len(docs) // (processes * 4))
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(medico, clinica)) as pool:
+            outputs = list(pool.map(_render_one, [(d, fmt) for d in docs], chunksize=chunk))
+    stats = RenderStats(len(outputs), time.perf_counter() - t0, sum(len(o) for o in outputs))
+    return outputs, stats
@@ -0,0 +1,116 @@
+"""Construção memoizada de figuras Plotly.
+
+Os builders são chaveados pela versão (hash) dos dados: um rerun sem mudança
+nos dados reaproveita a figura já montada. O cache é LRU com número máximo de
+entradas. Séries longas podem ser reduzidas com LTTB antes do plot.
+"""
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def data_version(*parts):
+    """Hash curto e estável dos dados que alimentam uma figura."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(str(part.dtype).encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=str).encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: reduz (x, y) a `threshold` pontos
+    preservando a forma visual da série. Retorna os índices escolhidos."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    xs = np.asarray(x, dtype=np.float64)
+    ys = np.asarray(y, dtype=np.float64)
+    # Limites dos baldes intermediários (primeiro e último pontos são fixos)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    chosen = np.empty(threshold, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_start, nxt_end = end, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = xs[nxt_start:nxt_end].mean()
+        avg_y = ys[nxt_start:nxt_end].mean()
+        bx, by = xs[start:end], ys[start:end]
+        area = np.abs((xs[a] - avg_x) * (by - ys[a]) - (xs[a] - bx) * (avg_y - ys[a]))
+        a = start + int(np.argmax(area))
+        chosen[i + 1] = a
+    return chosen
+
+
+def downsample(x, y, max_points):
+    """Aplica LTTB se a série passar de `max_points`. Aceita x categórico."""
+    if not max_points or len(y) <= max_points:
+        return list(x), list(y)
+    arr = np.asarray(x)
+    if np.issubdtype(arr.dtype, np.datetime64):
+        numeric_x = arr.astype("datetime64[s]").astype(np.int64).astype(np.float64)
+    else:
+        try:
+            numeric_x = arr.astype(np.float64)
+        except (TypeError, ValueError):
+            numeric_x = np.arange(len(y), dtype=np.float64)
+    idx = lttb(numeric_x, y, max_points)
+    return [x[i] for i in idx], [y[i] for i in idx]
+
+
+class FigureCache:
+    """LRU de figuras, seguro entre threads (uma instância por processo)."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            fig = self._entries.get(key)
+            if fig is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fig
+        fig = build()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = fig
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fig
+
+    def memoize(self, func):
+        """Decorator: `func(version, *args)` é memoizado por (nome, version, args
+        hasheáveis). Argumentos com nome iniciado em '_' não entram na chave,
+        como no st.cache_data."""
+        @functools.wraps(func)
+        def wrapper(version, *args, **kwargs):
+            key_kwargs = tuple(sorted((k, v) for k, v in kwargs.items() if not k.startswith("_")))
+            key = (func.__qualname__, version, args, key_kwargs)
+            return self.get_or_build(key, lambda: func(version, *args, **kwargs))
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Cache compartilhado pelos builders do app (figuras são tratadas como imutáveis)
+figure_cache = FigureCache(max_entries=256)
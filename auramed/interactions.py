@@ -0,0 +1,220 @@
+"""Checagem de interações medicamentosas e alergias do Receituário.
+
+As regras vêm de um JSON local e são compiladas uma vez: nomes comerciais e
+princípios ativos viram um autômato Aho-Corasick, e as interações uma tabela
+de pares de princípios ativos. Checar uma prescrição é então uma varredura
+linear do texto mais consultas O(1) por par.
+"""
+import json
+import re
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+
+from auramed.search import normalize_text
+
+SEVERITY_ORDER = {"grave": 0, "moderada": 1, "leve": 2}
+_ALLERGY_CUE = re.compile(r"\b(alergi\w*|alergic\w*|hipersensibilidade|reacao adversa|anafilaxia)\b")
+_NEGATION = re.compile(r"\b(nega|sem|nenhuma|ausencia de)\b")
+_SENTENCE_SPLIT = re.compile(r"[.;\n]+")
+_CLAUSE_SPLIT = re.compile(r",|\be\b")
+# Negação só vale para o gatilho se estiver nas últimas palavras antes dele
+# ("nega alergia", "sem história de alergia"), não em qualquer ponto da frase
+NEGATION_WINDOW = 3
+# A lista de alérgenos só continua em orações feitas de nomes de fármacos e
+# conectivos; qualquer outra palavra (ex: "uso contínuo de losartana") a encerra
+_LIST_WORDS = frozenset("a ao aos as o os de do da dos das ou tambem".split())
+_USAGE_CUE = re.compile(r"\b(uso|usa|usando|toma|tomando|prescrit\w*)\b")
+
+
+@dataclass(frozen=True)
+class Alerta:
+    tipo: str
+    gravidade: str
+    mensagem: str
+    medicamentos: tuple = ()
+
+
+class AhoCorasick:
+    """Casamento simultâneo de muitos termos em uma passada pelo texto."""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for term, value in patterns.items():
+            node = 0
+            for ch in term:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(term), value))
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0) if self._goto[f].get(ch, 0) != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text):
+        """[(início, fim, valor)] para termos que aparecem como palavras inteiras."""
+        found = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, value in self._out[node]:
+                start = i - length + 1
+                before_ok = start == 0 or not text[start - 1].isalnum()
+                after_ok = i + 1 == len(text) or not text[i + 1].isalnum()
+                if before_ok and after_ok:
+                    found.append((start, i + 1, value))
+        return found
+
+
+class InteractionEngine:
+    """Regras compiladas de interações, classes e alergias."""
+
+    def __init__(self, rules):
+        self.version = rules.get("versao", "?")
+        self.classes = {}
+        terms = {}
+        for ingredient, synonyms in rules.get("ingredientes", {}).items():
+            for syn in [ingredient] + synonyms:
+                terms[normalize_text(syn)] = ("ingrediente", ingredient)
+        for name, spec in rules.get("classes", {}).items():
+            self.classes[name] = frozenset(spec.get("membros", []))
+            for syn in [name] + spec.get("sinonimos", []):
+                terms.setdefault(normalize_text(syn), ("classe", name))
+        self._matcher = AhoCorasick(terms)
+        self._cross = {}
+        for rule in rules.get("reatividade_cruzada", []):
+            self._cross.setdefault(rule["de"], []).append(rule)
+        self._pairs = {}
+        for rule in rules.get("interacoes", []):
+            for a in self._expand(rule["a"]):
+                for b in self._expand(rule["b"]):
+                    if a != b:
+                        key = (a, b) if a < b else (b, a)
+                        current = self._pairs.get(key)
+                        if current is None or SEVERITY_ORDER[rule["gravidade"]] < SEVERITY_ORDER[current["gravidade"]]:
+                            self._pairs[key] = rule
+        self._allergies = lru_cache(maxsize=4096)(self._scan_allergies)
+        self._ingredients = lru_cache(maxsize=4096)(self._scan_ingredients)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as fh:
+            return cls(json.load(fh))
+
+    def _expand(self, ref):
+        return self.classes.get(ref, frozenset([ref]))
+
+    @property
+    def pair_count(self):
+        return len(self._pairs)
+
+    # --- normalização ---
+
+    def _scan_ingredients(self, drug_name):
+        return frozenset(v for _, _, (kind, v) in self._matcher.find(normalize_text(drug_name)) if kind == "ingrediente")
+
+    def ingredients_of(self, drug_name):
+        """Princípios ativos citados em um nome como 'Rivotril 0.5mg'."""
+        return self._ingredients(drug_name)
+
+    def _scan_allergies(self, historico):
+        """{princípio ativo: termo alergênico citado} a partir do texto do histórico."""
+        allergic = {}
+        for sentence in _SENTENCE_SPLIT.split(normalize_text(historico)):
+            # Orações separadas por vírgula ou "e"; uma oração sem gatilho
+            # continua a lista da anterior ("alergia a dipirona, AAS e penicilina")
+            ativa = False
+            for clause in _CLAUSE_SPLIT.split(sentence):
+                cue = _ALLERGY_CUE.search(clause)
+                if cue:
+                    antes = " ".join(clause[:cue.start()].split()[-NEGATION_WINDOW:])
+                    ativa = not _NEGATION.search(antes)
+                    trecho = clause[cue.end():]
+                    uso = _USAGE_CUE.search(trecho)
+                    if uso:
+                        # "alergia a dipirona usa losartana": o uso não é alergia
+                        trecho = trecho[:uso.start()]
+                else:
+                    ativa = ativa and self._is_drug_list(clause)
+                    trecho = clause
+                if ativa:
+                    self._collect_allergies(trecho, allergic)
+        return allergic
+
+    def _is_drug_list(self, clause):
+        """Oração só com nomes de fármacos/classes e conectivos (continuação de lista)."""
+        sobra, fim = [], 0
+        for start, end, _ in sorted(self._matcher.find(clause)):
+            if start >= fim:
+                sobra.append(clause[fim:start])
+                fim = end
+        if not fim:
+            return False
+        sobra.append(clause[fim:])
+        return all(w in _LIST_WORDS for w in " ".join(sobra).split())
+
+    def _collect_allergies(self, trecho, allergic):
+        for _, _, (kind, value) in self._matcher.find(trecho):
+            members = self.classes.get(value, frozenset()) if kind == "classe" else {value}
+            for ing in members:
+                allergic.setdefault(ing, value)
+            if kind == "classe":
+                for rule in self._cross.get(value, []):
+                    for ing in self.classes.get(rule["para"], frozenset()):
+                        allergic.setdefault(ing, f"{value} (reação cruzada)")
+
+    def allergies(self, historico):
+        return self._allergies(historico or "")
+
+    # --- checagem ---
+
+    def check(self, medicamentos, historico=""):
+        """Alertas da prescrição, do mais grave para o mais leve."""
+        alerts = []
+        allergic = self.allergies(historico)
+        resolved = []
+        for med in medicamentos:
+            for ing in sorted(self.ingredients_of(med)):
+                resolved.append((med, ing))
+                if ing in allergic:
+                    origem = allergic[ing]
+                    detalhe = "" if origem == ing else f" (registrada como '{origem}')"
+                    alerts.append(Alerta("alergia", "grave", f"Paciente com alergia a {ing}{detalhe}: {med}.", (med,)))
+        seen = {}
+        for i, (med_a, ing_a) in enumerate(resolved):
+            if ing_a in seen and seen[ing_a] != med_a:
+                alerts.append(Alerta("duplicidade", "moderada", f"{ing_a} prescrito em duplicidade.", (seen[ing_a], med_a)))
+            seen.setdefault(ing_a, med_a)
+            for med_b, ing_b in resolved[i + 1:]:
+                if ing_a == ing_b:
+                    continue
+                rule = self._pairs.get((ing_a, ing_b) if ing_a < ing_b else (ing_b, ing_a))
+                if rule:
+                    alerts.append(Alerta("interacao", rule["gravidade"], f"{med_a} + {med_b}: {rule['mensagem']}", (med_a, med_b)))
+        alerts.sort(key=lambda a: SEVERITY_ORDER.get(a.gravidade, 9))
+        return alerts
+
+    def audit(self, prescriptions):
+        """Modo em lote: (id, medicamentos, historico) -> [(id, alertas)] com alertas."""
+        results = []
+        for presc_id, medicamentos, historico in prescriptions:
+            alerts = self.check(medicamentos, historico)
+            if alerts:
+                results.append((presc_id, alerts))
+        return results
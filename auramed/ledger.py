@@ -0,0 +1,176 @@
+"""Livro-caixa incremental.
+
+Os lançamentos (receitas de consultas finalizadas e despesas) são só de
+inclusão. Para cada tipo há uma árvore de Fenwick indexada por dia, então o
+total de qualquer intervalo de datas sai em O(log n) sem reler o histórico,
+além de acumulados mensais e anuais atualizados a cada lançamento.
+"""
+import datetime
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+RECEITA = "receita"
+DESPESA = "despesa"
+
+
+class FenwickTree:
+    """Soma de prefixos com atualização pontual, ambos O(log n)."""
+
+    def __init__(self, values):
+        self.n = len(values)
+        tree = np.zeros(self.n + 1, dtype=np.float64)
+        tree[1:] = values
+        # Construção O(n): cada nó empurra sua soma para o pai
+        for i in range(1, self.n + 1):
+            parent = i + (i & -i)
+            if parent <= self.n:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, i, delta):
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+        """Soma das posições [0, i]."""
+        i = min(i, self.n - 1) + 1
+        total = 0.0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class DailySeries:
+    """Totais diários sobre uma Fenwick que cresce conforme surgem datas novas."""
+
+    def __init__(self, capacity=4096):
+        self.origin = None
+        self.daily = np.zeros(capacity, dtype=np.float64)
+        self.tree = FenwickTree(self.daily)
+
+    def _rebuild(self, origin, capacity):
+        daily = np.zeros(capacity, dtype=np.float64)
+        if self.origin is not None:
+            shift = self.origin - origin
+            daily[shift:shift + len(self.daily)] = self.daily
+        self.origin, self.daily = origin, daily
+        self.tree = FenwickTree(daily)
+
+    def add(self, day, value):
+        ordinal = day.toordinal()
+        if self.origin is None:
+            # Margem para trás evita reconstruções ao importar histórico antigo
+            self._rebuild(ordinal - len(self.daily) // 2, len(self.daily))
+        if ordinal < self.origin:
+            new_origin = ordinal - len(self.daily) // 2
+            self._rebuild(new_origin, len(self.daily) + (self.origin - new_origin))
+        elif ordinal - self.origin >= len(self.daily):
+            self._rebuild(self.origin, max(len(self.daily) * 2, ordinal - self.origin + 1))
+        i = ordinal - self.origin
+        self.daily[i] += value
+        self.tree.add(i, value)
+
+    def total(self, start, end):
+        """Soma de [start, end], datas inclusivas."""
+        if self.origin is None or end < start:
+            return 0.0
+        hi = end.toordinal() - self.origin
+        lo = start.toordinal() - self.origin
+        if hi < 0 or lo >= len(self.daily):
+            return 0.0
+        upper = self.tree.prefix(hi)
+        lower = self.tree.prefix(lo - 1) if lo > 0 else 0.0
+        return upper - lower
+
+
+def _as_date(value):
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value)[:10])
+
+
+class Ledger:
+    """Consultas financeiras em tempo constante/logarítmico sobre o `ClinicStore`."""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.RLock()
+        self._series = {RECEITA: DailySeries(), DESPESA: DailySeries()}
+        self._monthly = {RECEITA: defaultdict(float), DESPESA: defaultdict(float)}
+        self._yearly = {RECEITA: defaultdict(float), DESPESA: defaultdict(float)}
+        self.first_day = None
+        self.last_day = None
+        self.version = 0
+        # O histórico chega já agregado por dia: a carga é O(dias), não O(lançamentos)
+        for data, tipo, valor in store.ledger_daily_totals():
+            self._apply(_as_date(data), tipo, valor)
+
+    def _apply(self, day, tipo, valor):
+        self._series[tipo].add(day, valor)
+        self._monthly[tipo][day.strftime("%Y-%m")] += valor
+        self._yearly[tipo][day.year] += valor
+        self.first_day = day if self.first_day is None else min(self.first_day, day)
+        self.last_day = day if self.last_day is None else max(self.last_day, day)
+        self.version += 1
+
+    # --- lançamentos ---
+
+    def record(self, data, tipo, valor, descricao="", appointment_id=None):
+        """Grava um lançamento; devolve False se a consulta já estava lançada."""
+        if tipo not in self._series:
+            raise ValueError(f"tipo de lançamento inválido: {tipo}")
+        day = _as_date(data)
+        with self._lock:
+            if not self.store.add_ledger_entry(day.isoformat(), tipo, float(valor), descricao, appointment_id):
+                return False
+            self._apply(day, tipo, float(valor))
+        return True
+
+    def record_appointment(self, appt):
+        """Receita de uma consulta finalizada (idempotente por agendamento)."""
+        return self.record(appt["data"], RECEITA, appt.get("valor") or 0,
+                           f"{appt.get('tipo') or 'Consulta'} - {appt['paciente']}", appointment_id=appt["id"])
+
+    # --- consultas ---
+
+    def total(self, start, end, tipo=RECEITA):
+        with self._lock:
+            return self._series[tipo].total(_as_date(start), _as_date(end))
+
+    def summary(self, start, end):
+        """Receita, despesas e lucro do período e do período anterior de mesmo tamanho."""
+        start, end = _as_date(start), _as_date(end)
+        length = (end - start).days + 1
+        prev_end = start - datetime.timedelta(days=1)
+        prev_start = prev_end - datetime.timedelta(days=length - 1)
+        cur = {t: self.total(start, end, t) for t in (RECEITA, DESPESA)}
+        prev = {t: self.total(prev_start, prev_end, t) for t in (RECEITA, DESPESA)}
+        cur["lucro"] = cur[RECEITA] - cur[DESPESA]
+        prev["lucro"] = prev[RECEITA] - prev[DESPESA]
+        return cur, prev
+
+    def monthly(self, start, end):
+        """Série mensal (mês, receita, despesa) entre duas datas, dos acumulados."""
+        start, end = _as_date(start), _as_date(end)
+        months = []
+        y, m = start.year, start.month
+        while (y, m) <= (end.year, end.month):
+            key = f"{y:04d}-{m:02d}"
+            with self._lock:
+                months.append((key, self._monthly[RECEITA].get(key, 0.0), self._monthly[DESPESA].get(key, 0.0)))
+            y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+        return months
+
+    def yearly(self, year, tipo=RECEITA):
+        with self._lock:
+            return self._yearly[tipo].get(year, 0.0)
+
+
+def pct_delta(current, previous):
+    """Variação percentual formatada para st.metric (None sem base de comparação)."""
+    if not previous:
+        return None
+    return f"{(current - previous) / abs(previous):+.0%}"
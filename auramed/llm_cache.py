@@ -0,0 +1,224 @@
+"""Cache de respostas do LLM endereçado por conteúdo.
+
+A chave é o hash do prompt normalizado + modelo + temperatura. Há um nível LRU
+em memória, um nível opcional em disco (SQLite) com TTL e limite de tamanho, e
+deduplicação single-flight: chamadas simultâneas com a mesma chave esperam uma
+única ida ao provedor.
+
+O lock global cobre só o LRU, o mapa de chamadas em andamento e os contadores;
+o disco é acessado fora dele, com uma conexão por thread.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(text):
+    return _WS_RE.sub(" ", text or "").strip()
+
+
+class CompletionCache:
+    """LRU em memória + SQLite em disco para textos gerados pelo LLM."""
+
+    def __init__(self, max_entries=256, disk_path=None, ttl=7 * 24 * 3600, max_disk_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+        self.disk_path = disk_path
+        self._local = threading.local()
+        if disk_path:
+            disk = self._disk
+            disk.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, "
+                "accessed REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            disk.execute("CREATE INDEX IF NOT EXISTS idx_completions_accessed ON completions(accessed)")
+            disk.commit()
+
+    @property
+    def _disk(self):
+        """Conexão SQLite da thread atual (None sem nível em disco)."""
+        if not self.disk_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.disk_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def make_key(model, messages, temperature):
+        payload = {
+            "model": model,
+            "temperature": round(float(temperature), 4),
+            "messages": [{"role": m["role"], "content": normalize_prompt(m["content"])} for m in messages],
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    # --- níveis ---
+
+    def _memory_get(self, key):
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _disk_get(self, key):
+        disk = self._disk
+        if disk is None:
+            return None
+        now = time.time()
+        row = disk.execute("SELECT value, created FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > self.ttl:
+            with disk:
+                disk.execute("DELETE FROM completions WHERE key = ?", (key,))
+            return None
+        with disk:
+            disk.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _disk_put(self, key, value):
+        """Grava no disco e devolve quantas entradas antigas foram descartadas."""
+        disk = self._disk
+        if disk is None:
+            return 0
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        victims = []
+        with disk:
+            disk.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, size),
+            )
+            disk.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl,))
+            total = disk.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            if total > self.max_disk_bytes:
+                freed = 0
+                for victim, vsize in disk.execute("SELECT key, size FROM completions ORDER BY accessed"):
+                    if total - freed <= self.max_disk_bytes:
+                        break
+                    victims.append((victim,))
+                    freed += vsize
+                disk.executemany("DELETE FROM completions WHERE key = ?", victims)
+        return len(victims)
+
+    # --- API ---
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory_get(key)
+            if value is not None:
+                self._counters["memory_hits"] += 1
+                return value
+        value = self._disk_get(key)
+        if value is not None:
+            with self._lock:
+                self._counters["disk_hits"] += 1
+                self._memory_put(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._memory_put(key, value)
+        evicted = self._disk_put(key, value)
+        if evicted:
+            with self._lock:
+                self._counters["evictions"] += evicted
+
+    def begin(self, key):
+        """Abre o single-flight manualmente (ex: geração em streaming).
+
+        Devolve (valor, future, líder): `valor` se já estiver em cache; senão
+        `future` da chamada em andamento. O líder (única chamada ao provedor)
+        deve encerrar com `finish`, com o texto ou com o erro.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, None, False
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return None, future, False
+            future = self._inflight[key] = Future()
+        # O líder anterior pode ter gravado entre o get acima e a posse da chave
+        value = self.get(key)
+        if value is not None:
+            self._settle(key, value)
+            return value, None, False
+        with self._lock:
+            self._counters["misses"] += 1
+        return None, future, True
+
+    def finish(self, key, value=None, error=None):
+        """Encerra a chave aberta por `begin`: grava o valor e acorda quem espera (ou repassa o erro)."""
+        if error is None:
+            self.put(key, value)
+        self._settle(key, value, error)
+
+    def _settle(self, key, value, error=None):
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    def get_or_create(self, key, factory):
+        """Devolve o valor em cache ou chama `factory()` uma única vez.
+
+        Requisições concorrentes com a mesma chave aguardam o mesmo resultado;
+        exceções são repassadas a todas e nada é gravado no cache.
+        """
+        value, future, leader = self.begin(key)
+        if value is not None:
+            return value
+        if not leader:
+            return future.result()
+        try:
+            value = factory()
+        except BaseException as exc:
+            self.finish(key, error=exc)
+            raise
+        self.finish(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (lookups - stats["misses"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        disk = self._disk
+        if disk is not None:
+            with disk:
+                disk.execute("DELETE FROM completions")
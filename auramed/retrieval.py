@@ -0,0 +1,213 @@
+"""Contexto recuperado do prontuário para a geração de SOAP (RAG).
+
+Cada paciente tem um índice vetorial próprio em disco: `<pid>.f16` com os
+embeddings em float16 (lido via `np.memmap`, sem carregar tudo na memória),
+`<pid>.jsonl` com o trecho de cada linha e `<pid>.json` com o último evento já
+indexado. Só eventos novos são embutidos a cada sincronização.
+
+O `.json` é a fonte da verdade: guarda também a identidade do banco (um índice
+de outro banco é refeito do zero) e, antes de cada acréscimo, `.f16` e `.jsonl`
+são cortados para `rows` — linhas órfãs de uma queda no meio da escrita somem.
+
+Na montagem do prompt entram primeiro o histórico e tudo que cita alergia
+(sempre), depois os trechos mais parecidos com as notas atuais, até o limite
+de tokens.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+CHARS_PER_TOKEN = 4
+CHUNK_CHARS = 600
+OPEN_MAPS = 64
+ALLERGY_RE = re.compile(r"alerg", re.IGNORECASE)
+SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]?")
+
+
+def estimate_tokens(text):
+    """Estimativa barata (≈4 caracteres por token), suficiente para orçamento."""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def chunk_text(text, size=CHUNK_CHARS):
+    """Quebra textos longos (ex: SOAP completo) em trechos por parágrafo."""
+    text = (text or "").strip()
+    if len(text) <= size:
+        return [text] if text else []
+    chunks, current = [], ""
+    for para in re.split(r"\n\s*\n", text):
+        if current and len(current) + len(para) + 2 > size:
+            chunks.append(current)
+            current = ""
+        while len(para) > size:
+            chunks.append(para[:size])
+            para = para[size:]
+        current = f"{current}\n\n{para}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def allergy_sentences(text):
+    return [s.strip() for s in SENTENCE_RE.findall(text or "") if ALLERGY_RE.search(s)]
+
+
+class PatientContextIndex:
+    """Índices vetoriais por paciente, em disco, para recuperação de contexto."""
+
+    def __init__(self, root, encode, fingerprint=None):
+        self.root = root
+        self._encode = encode
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self._maps = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+
+    def _paths(self, patient_id):
+        shard = os.path.join(self.root, f"{int(patient_id) % 1000:03d}")
+        base = os.path.join(shard, str(int(patient_id)))
+        return shard, f"{base}.f16", f"{base}.jsonl", f"{base}.json"
+
+    def _meta(self, patient_id):
+        _, _, _, meta_path = self._paths(patient_id)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = None
+        if meta is None or meta.get("db") != self.fingerprint:
+            # Sem índice, ou índice de outro banco (ids de eventos não batem): recomeça
+            return {"last_event_id": 0, "dim": None, "rows": 0, "db": self.fingerprint}
+        return meta
+
+    @staticmethod
+    def _truncate(vec_path, text_path, meta):
+        """Corta os arquivos para as `rows` confirmadas no meta."""
+        if os.path.exists(vec_path):
+            with open(vec_path, "rb+") as f:
+                f.truncate(meta["rows"] * (meta["dim"] or 0) * 2)
+        if os.path.exists(text_path):
+            with open(text_path, "rb+") as f:
+                for _ in range(meta["rows"]):
+                    f.readline()
+                f.truncate()
+
+    def _embed(self, texts):
+        vecs = np.asarray(self._encode(list(texts)), dtype=np.float32)
+        if vecs.ndim == 1:
+            vecs = vecs[None, :]
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vecs / norms
+
+    # --- escrita ---
+
+    def sync(self, patient_id, new_events):
+        """Indexa eventos (dicts com `id`) posteriores ao último já indexado. Devolve quantos trechos entraram."""
+        with self._lock:
+            meta = self._meta(patient_id)
+            snippets = []
+            for ev in sorted(new_events, key=lambda e: e["id"]):
+                if ev["id"] <= meta["last_event_id"]:
+                    continue
+                for chunk in chunk_text(ev.get("detalhe", "")) or [""]:
+                    snippets.append({"data": ev.get("data", ""), "evento": ev.get("evento", ""), "texto": chunk})
+                meta["last_event_id"] = ev["id"]
+            if not snippets:
+                return 0
+            vecs = self._embed(f"{s['evento']}. {s['texto']}" for s in snippets)
+            if meta["dim"] not in (None, vecs.shape[1]):
+                raise ValueError(f"dimensão do embedding mudou ({meta['dim']} -> {vecs.shape[1]}); recrie o índice")
+            shard, vec_path, text_path, meta_path = self._paths(patient_id)
+            os.makedirs(shard, exist_ok=True)
+            self._truncate(vec_path, text_path, meta)
+            with open(vec_path, "ab") as f:
+                f.write(vecs.astype(np.float16).tobytes())
+            with open(text_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(s, ensure_ascii=False) + "\n" for s in snippets)
+            meta.update(dim=int(vecs.shape[1]), rows=meta["rows"] + len(snippets))
+            tmp = f"{meta_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, meta_path)
+            self._maps.pop(int(patient_id), None)
+            return len(snippets)
+
+    # --- leitura ---
+
+    def last_event_id(self, patient_id):
+        return self._meta(patient_id)["last_event_id"]
+
+    def _load(self, patient_id):
+        """(memmap float16 (n, dim), trechos) do paciente, reaproveitados até a próxima sincronização."""
+        cached = self._maps.get(int(patient_id))
+        if cached is not None:
+            self._maps.move_to_end(int(patient_id))
+            return cached
+        meta = self._meta(patient_id)
+        _, vec_path, text_path, _ = self._paths(patient_id)
+        if not meta["rows"]:
+            return None, []
+        vecs = np.memmap(vec_path, dtype=np.float16, mode="r", shape=(meta["rows"], meta["dim"]))
+        with open(text_path, encoding="utf-8") as f:
+            snippets = [json.loads(line) for _, line in zip(range(meta["rows"]), f)]
+        self._maps[int(patient_id)] = (vecs, snippets)
+        if len(self._maps) > OPEN_MAPS:
+            self._maps.popitem(last=False)
+        return vecs, snippets
+
+    def search(self, patient_id, query, k=8):
+        """Top-k trechos do paciente por cosseno com a consulta: [(score, trecho), ...]."""
+        with self._lock:
+            vecs, snippets = self._load(patient_id)
+        if vecs is None or not len(snippets):
+            return []
+        q = self._embed([query])[0]
+        scores = np.asarray(vecs, dtype=np.float32) @ q
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [(float(scores[i]), snippets[i]) for i in top[np.argsort(-scores[top])]]
+
+    def all_snippets(self, patient_id):
+        with self._lock:
+            return list(self._load(patient_id)[1])
+
+
+def build_context(historico, ranked, token_budget, pinned=()):
+    """Bloco de contexto para o prompt.
+
+    Histórico e trechos fixados (alergias) entram sempre; os trechos
+    ranqueados entram em ordem de relevância enquanto couberem no orçamento.
+    Devolve (texto, estatísticas).
+    """
+    linhas, alergias = [], []
+    historico = " ".join((historico or "").split())
+    limite = token_budget // 2 * CHARS_PER_TOKEN
+    if len(historico) > limite:
+        # Histórico longo é truncado, mas as alergias dele não se perdem
+        alergias += allergy_sentences(historico)
+        historico = historico[:limite].rsplit(" ", 1)[0] + " […]"
+    for p in pinned:
+        alergias += [s for s in allergy_sentences(p["texto"]) if s not in alergias and s not in historico]
+    if historico:
+        linhas.append(f"Histórico: {historico}")
+    if alergias:
+        linhas.append("Alergias registradas: " + " ".join(alergias))
+    usados = estimate_tokens("\n".join(linhas))
+    trechos = []
+    for _, s in ranked:
+        linha = f"- [{s['data']}] {s['evento']}: {' '.join(s['texto'].split())}"
+        custo = estimate_tokens(linha)
+        if usados + custo > token_budget:
+            continue
+        trechos.append(linha)
+        usados += custo
+    if trechos:
+        linhas.append("Registros anteriores relevantes:")
+        linhas += trechos
+    texto = "Contexto do prontuário (recuperado automaticamente):\n" + "\n".join(linhas) if linhas else ""
+    return texto, {"trechos": len(trechos), "tokens": estimate_tokens(texto), "alergias": len(allergy_sentences(texto))}
@@ -0,0 +1,247 @@
+"""Motor de agenda da clínica.
+
+Cada médico e cada sala têm um índice de intervalos ordenado (busca binária),
+então checar conflito de horário é O(log n). Os KPIs por dia (agendamentos,
+faturamento, em espera) são mantidos incrementalmente a cada operação.
+"""
+import bisect
+import datetime
+import threading
+from collections import defaultdict
+
+WAITING_STATUSES = ("Pendente", "Confirmado")
+STATUSES = ("Confirmado", "Pendente", "Em Atendimento", "Finalizado")
+
+
+class SlotConflict(ValueError):
+    """Horário já ocupado pelo médico ou pela sala."""
+
+    def __init__(self, resource, appt_id):
+        label = "médico" if resource[0] == "medico" else resource[0]
+        if isinstance(appt_id, tuple):
+            # Reserva provisória de `book_many`: outra linha do mesmo lote
+            super().__init__(f"Conflito de horário com outro agendamento do mesmo lote ({label}: {resource[1]})")
+        else:
+            super().__init__(f"Conflito de horário com o agendamento #{appt_id} ({label}: {resource[1]})")
+        self.resource = resource
+        self.appt_id = appt_id
+
+
+def to_minutes(data, hora):
+    """'2023-11-20', '14:30' -> minutos absolutos (sem fuso)."""
+    day = datetime.date.fromisoformat(str(data))
+    hh, mm = str(hora).split(":")[:2]
+    return day.toordinal() * 1440 + int(hh) * 60 + int(mm)
+
+
+def from_minutes(minutes):
+    day = datetime.date.fromordinal(minutes // 1440)
+    rest = minutes % 1440
+    return day.isoformat(), f"{rest // 60:02d}:{rest % 60:02d}"
+
+
+class IntervalIndex:
+    """Intervalos [início, fim) sem sobreposição de um recurso, ordenados."""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+
+    def conflict(self, start, end):
+        """Id do agendamento que se sobrepõe a [start, end), ou None."""
+        i = bisect.bisect_left(self.starts, end)
+        if i > 0 and self.ends[i - 1] > start:
+            return self.ids[i - 1]
+        return None
+
+    def add(self, start, end, appt_id):
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, appt_id)
+
+    def remove(self, start, appt_id):
+        i = bisect.bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.ids[i] == appt_id:
+                del self.starts[i], self.ends[i], self.ids[i]
+                return
+            i += 1
+
+    def window(self, start, end):
+        """Intervalos que tocam [start, end), em ordem."""
+        lo = max(0, bisect.bisect_left(self.starts, start) - 1)
+        hi = bisect.bisect_left(self.starts, end)
+        return [(s, e) for s, e in zip(self.starts[lo:hi], self.ends[lo:hi]) if e > start]
+
+
+class Scheduler:
+    """Agenda sobre o `ClinicStore`, com índices por médico e por sala."""
+
+    def __init__(self, store, default_duration=30, on_finalized=None):
+        self.store = store
+        self.default_duration = default_duration
+        self.on_finalized = on_finalized
+        self._lock = threading.RLock()
+        self._indexes = defaultdict(IntervalIndex)
+        self._spans = {}
+        self._daily = defaultdict(lambda: {"agendamentos": 0, "faturamento": 0.0, "em_espera": 0})
+        for appt in store.iter_appointments():
+            self._track(appt)
+
+    def _resources(self, appt):
+        keys = []
+        if appt.get("medico"):
+            keys.append(("medico", appt["medico"]))
+        if appt.get("sala"):
+            keys.append(("sala", appt["sala"]))
+        return keys
+
+    def _track(self, appt):
+        start = to_minutes(appt["data"], appt["hora"])
+        end = start + int(appt.get("duracao") or self.default_duration)
+        for key in self._resources(appt):
+            self._indexes[key].add(start, end, appt["id"])
+        self._spans[appt["id"]] = (start, appt["data"], appt.get("status"), float(appt.get("valor") or 0))
+        self._kpi_add(appt["data"], appt.get("status"), float(appt.get("valor") or 0), +1)
+
+    def _kpi_add(self, data, status, valor, sign):
+        day = self._daily[str(data)]
+        day["agendamentos"] += sign
+        day["faturamento"] += sign * valor
+        if status in WAITING_STATUSES:
+            day["em_espera"] += sign
+
+    # --- operações ---
+
+    def check(self, data, hora, duracao=None, medico=None, sala=None):
+        """Levanta SlotConflict se o horário colidir com médico ou sala."""
+        start = to_minutes(data, hora)
+        end = start + int(duracao or self.default_duration)
+        with self._lock:
+            for key in self._resources({"medico": medico, "sala": sala}):
+                other = self._indexes[key].conflict(start, end)
+                if other is not None:
+                    raise SlotConflict(key, other)
+
+    def book(self, appt):
+        """Grava o agendamento se não houver conflito e devolve o id."""
+        appt = dict(appt)
+        appt.setdefault("duracao", self.default_duration)
+        appt.setdefault("status", "Pendente")
+        with self._lock:
+            self.check(appt["data"], appt["hora"], appt["duracao"], appt.get("medico"), appt.get("sala"))
+            appt["id"] = self.store.add_appointment(appt)
+            self._track(appt)
+        return appt["id"]
+
+    def book_many(self, appts):
+        """Agenda em lote (importação): grava, em uma transação, só os sem conflito.
+
+        Devolve (ids, conflitos), com `conflitos` = [(posição, SlotConflict)];
+        choques entre linhas do próprio lote também contam.
+        """
+        pendentes, conflitos = [], []
+        with self._lock:
+            for pos, appt in enumerate(appts):
+                appt = dict(appt)
+                appt.setdefault("duracao", self.default_duration)
+                appt.setdefault("status", "Pendente")
+                try:
+                    self.check(appt["data"], appt["hora"], appt["duracao"], appt.get("medico"), appt.get("sala"))
+                except SlotConflict as e:
+                    conflitos.append((pos, e))
+                    continue
+                # Reserva o horário até o banco devolver o id
+                start = to_minutes(appt["data"], appt["hora"])
+                for key in self._resources(appt):
+                    self._indexes[key].add(start, start + int(appt["duracao"]), ("lote", pos))
+                pendentes.append((pos, start, appt))
+            try:
+                ids = self.store.add_appointments_bulk([appt for _, _, appt in pendentes])
+            finally:
+                for pos, start, appt in pendentes:
+                    for key in self._resources(appt):
+                        self._indexes[key].remove(start, ("lote", pos))
+            for appt_id, (_, _, appt) in zip(ids, pendentes):
+                appt["id"] = appt_id
+                self._track(appt)
+        return ids, conflitos
+
+    def set_status(self, appt_id, status):
+        with self._lock:
+            start, data, old, valor = self._spans[appt_id]
+            self.store.update_appointment_status(appt_id, status)
+            if (old in WAITING_STATUSES) != (status in WAITING_STATUSES):
+                self._daily[str(data)]["em_espera"] += 1 if status in WAITING_STATUSES else -1
+            self._spans[appt_id] = (start, data, status, valor)
+        if status == "Finalizado" and old != "Finalizado" and self.on_finalized:
+            self.on_finalized(self.store.get_appointment(appt_id))
+
+    def finish_current(self, data):
+        """Finaliza os atendimentos em andamento do dia; devolve os finalizados."""
+        done = []
+        for appt in self.store.appointments_between(data, data):
+            if appt["status"] == "Em Atendimento":
+                self.set_status(appt["id"], "Finalizado")
+                done.append(appt)
+        return done
+
+    def call_next(self, data):
+        """Passa o próximo paciente em espera do dia para 'Em Atendimento'."""
+        for appt in self.store.appointments_between(data, data):
+            if appt["status"] in WAITING_STATUSES:
+                self.set_status(appt["id"], "Em Atendimento")
+                appt["status"] = "Em Atendimento"
+                return appt
+        return None
+
+    # --- consultas ---
+
+    def kpis(self, data):
+        with self._lock:
+            return dict(self._daily.get(str(data), {"agendamentos": 0, "faturamento": 0.0, "em_espera": 0}))
+
+    def busiest_day_near(self, data):
+        """Dia com agenda mais próximo de `data` (para abrir a visão do dia)."""
+        with self._lock:
+            days = sorted(d for d, k in self._daily.items() if k["agendamentos"] > 0)
+        if not days:
+            return data
+        target = str(data)
+        i = bisect.bisect_left(days, target)
+        candidates = days[max(0, i - 1):i + 1]
+        best = min(candidates, key=lambda d: abs(datetime.date.fromisoformat(d).toordinal() - data.toordinal()))
+        return datetime.date.fromisoformat(best)
+
+    def day_view(self, data, medico=None):
+        return self.store.appointments_between(data, data, medico=medico)
+
+    def week_view(self, data, medico=None):
+        """Agendamentos da semana (segunda a domingo) que contém `data`."""
+        monday = data - datetime.timedelta(days=data.weekday())
+        return self.store.appointments_between(monday, monday + datetime.timedelta(days=6), medico=medico)
+
+    def free_slots(self, start_day, end_day, duracao=None, medico=None, sala=None,
+                   work_hours=(8, 18), step=15, limit=10):
+        """Horários livres para médico E sala no intervalo de dias (inclusivo)."""
+        duracao = int(duracao or self.default_duration)
+        keys = self._resources({"medico": medico, "sala": sala})
+        slots = []
+        day = start_day
+        with self._lock:
+            while day <= end_day and len(slots) < limit:
+                open_at = day.toordinal() * 1440 + work_hours[0] * 60
+                close_at = day.toordinal() * 1440 + work_hours[1] * 60
+                busy = sorted(iv for key in keys for iv in self._indexes[key].window(open_at, close_at))
+                cursor = open_at
+                for s, e in busy + [(close_at, close_at)]:
+                    while cursor + duracao <= min(s, close_at) and len(slots) < limit:
+                        slots.append(from_minutes(cursor))
+                        cursor += step
+                    if e > cursor:
+                        # realinha ao passo depois do fim do bloco ocupado
+                        cursor = open_at + -(-(e - open_at) // step) * step
+                day += datetime.timedelta(days=1)
+        return slots
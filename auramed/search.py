@@ -0,0 +1,357 @@
+"""Motor de busca semântica de pacientes.
+
+Mantém uma matriz NumPy normalizada com os embeddings de `historico` e de cada
+evento da `timeline`, atualizada incrementalmente, e índices invertidos para
+nome exato e códigos CID. `sync` alcança o banco a partir das marcas do último
+paciente e do último evento já indexados, de modo que cada linha entra uma
+única vez, mesmo com gravações durante a montagem.
+"""
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+CID_RE = re.compile(r"\b([A-TV-Z]\d{2}(?:\.\d{1,2})?)\b", re.IGNORECASE)
+TOKEN_RE = re.compile(r"\w+")
+# Linhas mortas (pacientes reindexados/removidos) são compactadas acima desta fração
+COMPACT_DEAD_FRACTION = 0.25
+COMPACT_MIN_ROWS = 1024
+
+
+def normalize_text(text):
+    """Minúsculas e sem acentos, para comparação de nomes."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower().strip()
+
+
+def extract_cids(text):
+    """Retorna os códigos CID citados no texto (ex: 'G43', 'I10')."""
+    return {m.upper() for m in CID_RE.findall(text or "")}
+
+
+def event_text(event):
+    return f"{event.get('evento', '')}. {event.get('detalhe', '')}"
+
+
+class PatientSearchIndex:
+    """Índice vetorial + invertido sobre os pacientes da clínica.
+
+    `encode` recebe uma lista de textos e devolve um array (n, dim). Cada
+    paciente ocupa várias linhas da matriz (histórico + eventos); o score do
+    paciente é o maior cosseno entre suas linhas e a consulta.
+    """
+
+    def __init__(self, encode, initial_capacity=1024):
+        self._encode = encode
+        self._lock = threading.RLock()
+        self._capacity = initial_capacity
+        self._matrix = None
+        self._size = 0
+        self._row_owner = np.zeros(initial_capacity, dtype=np.int64)
+        self._alive = np.zeros(initial_capacity, dtype=bool)
+        self._rows_by_patient = defaultdict(list)
+        self._names = {}
+        self._name_index = defaultdict(set)
+        self._token_index = defaultdict(set)
+        self._cid_index = defaultdict(set)
+        self._cids_by_patient = defaultdict(set)
+        self._dead = 0
+        # (ordem das linhas por dono, início de cada grupo, donos) até a próxima escrita
+        self._groups = None
+        # (último paciente, último evento) do banco já indexados
+        self.synced = (0, 0)
+        self._sync_lock = threading.Lock()
+        self._sync_thread = None
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def rows(self):
+        return int(self._alive[: self._size].sum())
+
+    # --- escrita ---
+
+    def _embed(self, texts):
+        # Textos repetidos (ex: "Sem comorbidades" em importações) vão ao modelo uma vez só
+        texts = list(texts)
+        unique = list(dict.fromkeys(texts))
+        vecs = np.asarray(self._encode(unique), dtype=np.float32)
+        if vecs.ndim == 1:
+            vecs = vecs[None, :]
+        if len(unique) < len(texts):
+            pos = {t: i for i, t in enumerate(unique)}
+            vecs = vecs[[pos[t] for t in texts]]
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vecs / norms
+
+    def _ensure_capacity(self, extra, dim):
+        needed = self._size + extra
+        if self._matrix is None:
+            self._capacity = max(self._capacity, needed)
+            self._matrix = np.zeros((self._capacity, dim), dtype=np.float32)
+            self._row_owner = np.resize(self._row_owner, self._capacity)
+            self._alive = np.zeros(self._capacity, dtype=bool)
+            return
+        if needed <= self._capacity:
+            return
+        new_cap = max(needed, self._capacity * 2)
+        matrix = np.zeros((new_cap, self._matrix.shape[1]), dtype=np.float32)
+        matrix[: self._size] = self._matrix[: self._size]
+        alive = np.zeros(new_cap, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        owner = np.zeros(new_cap, dtype=np.int64)
+        owner[: self._size] = self._row_owner[: self._size]
+        self._matrix, self._alive, self._row_owner = matrix, alive, owner
+        self._capacity = new_cap
+
+    def _append_rows(self, patient_id, texts):
+        texts = [t for t in texts if t and t.strip()]
+        if not texts:
+            return
+        vecs = self._embed(texts)
+        self._ensure_capacity(len(vecs), vecs.shape[1])
+        start, end = self._size, self._size + len(vecs)
+        self._matrix[start:end] = vecs
+        self._row_owner[start:end] = patient_id
+        self._alive[start:end] = True
+        self._rows_by_patient[patient_id].extend(range(start, end))
+        self._size = end
+        self._groups = None
+
+    def _index_terms(self, patient_id, text):
+        for cid in extract_cids(text):
+            self._cid_index[cid].add(patient_id)
+            self._cids_by_patient[patient_id].add(cid)
+
+    def add_patient(self, patient):
+        """Indexa (ou reindexa) um paciente completo."""
+        self.add_patients([patient])
+
+    def add_patients(self, patients):
+        """Indexa vários pacientes com uma única chamada ao modelo."""
+        with self._lock:
+            owners, texts = [], []
+            for p in patients:
+                pid = int(p["id"])
+                self._remove(pid)
+                name = normalize_text(p.get("nome", ""))
+                self._names[pid] = name
+                self._name_index[name].add(pid)
+                for tok in TOKEN_RE.findall(name):
+                    self._token_index[tok].add(pid)
+                self._index_terms(pid, p.get("historico", ""))
+                chunk = [p.get("historico", "")]
+                for ev in p.get("timeline", []):
+                    self._index_terms(pid, event_text(ev))
+                    chunk.append(event_text(ev))
+                owners.extend([pid] * len(chunk))
+                texts.extend(chunk)
+            keep = [i for i, t in enumerate(texts) if t and t.strip()]
+            if not keep:
+                return
+            vecs = self._embed([texts[i] for i in keep])
+            self._ensure_capacity(len(vecs), vecs.shape[1])
+            start = self._size
+            for offset, i in enumerate(keep):
+                row = start + offset
+                self._matrix[row] = vecs[offset]
+                self._row_owner[row] = owners[i]
+                self._alive[row] = True
+                self._rows_by_patient[owners[i]].append(row)
+            self._size = start + len(keep)
+            self._groups = None
+            self._maybe_compact()
+
+    def add_event(self, patient_id, event):
+        """Acrescenta um evento de timeline sem reindexar o paciente."""
+        with self._lock:
+            pid = int(patient_id)
+            self._index_terms(pid, event_text(event))
+            self._append_rows(pid, [event_text(event)])
+
+    def add_events(self, pairs):
+        """Vários eventos [(patient_id, evento), ...] com uma única chamada ao modelo."""
+        with self._lock:
+            owners, texts = [], []
+            for patient_id, event in pairs:
+                pid, text = int(patient_id), event_text(event)
+                self._index_terms(pid, text)
+                if text.strip():
+                    owners.append(pid)
+                    texts.append(text)
+            if not texts:
+                return
+            vecs = self._embed(texts)
+            self._ensure_capacity(len(vecs), vecs.shape[1])
+            start, end = self._size, self._size + len(vecs)
+            self._matrix[start:end] = vecs
+            self._row_owner[start:end] = owners
+            self._alive[start:end] = True
+            for offset, pid in enumerate(owners):
+                self._rows_by_patient[pid].append(start + offset)
+            self._size = end
+            self._groups = None
+
+    def _remove(self, patient_id):
+        rows = self._rows_by_patient.pop(patient_id, [])
+        if rows:
+            self._alive[rows] = False
+            self._dead += len(rows)
+        name = self._names.pop(patient_id, None)
+        if name is not None:
+            self._name_index[name].discard(patient_id)
+            for tok in TOKEN_RE.findall(name):
+                self._token_index[tok].discard(patient_id)
+        for cid in self._cids_by_patient.pop(patient_id, ()):
+            self._cid_index[cid].discard(patient_id)
+
+    def _maybe_compact(self):
+        if self._dead < COMPACT_MIN_ROWS or self._dead < COMPACT_DEAD_FRACTION * self._size:
+            return
+        # Arrays novos (não in-place): buscas em andamento seguem com as vistas antigas
+        keep = np.flatnonzero(self._alive[: self._size])
+        matrix = np.zeros_like(self._matrix)
+        matrix[: len(keep)] = self._matrix[keep]
+        owner = np.zeros_like(self._row_owner)
+        owner[: len(keep)] = self._row_owner[keep]
+        alive = np.zeros_like(self._alive)
+        alive[: len(keep)] = True
+        rows_by_patient = defaultdict(list)
+        for row, pid in enumerate(owner[: len(keep)].tolist()):
+            rows_by_patient[pid].append(row)
+        self._matrix, self._row_owner, self._alive = matrix, owner, alive
+        self._rows_by_patient = rows_by_patient
+        self._size, self._dead, self._groups = len(keep), 0, None
+
+    # --- sincronização com o banco ---
+
+    def lag(self, store):
+        """Quantos ids (pacientes + eventos) o banco está à frente do índice."""
+        pacientes, eventos = store.last_ids()
+        return pacientes - self.synced[0] + eventos - self.synced[1]
+
+    def sync(self, store, batch_size=500):
+        """Indexa pacientes e eventos gravados depois da última sincronização.
+
+        Eventos de pacientes já indexados entram por `add_events`; pacientes
+        novos entram completos, com a timeline até a mesma marca de evento.
+        """
+        with self._sync_lock:
+            ultimo_pac, ultimo_ev = self.synced
+            max_pac, max_ev = store.last_ids()
+            if (max_pac, max_ev) == self.synced:
+                return
+            for eventos in store.iter_events(batch_size, after_id=ultimo_ev, until_id=max_ev, max_patient_id=ultimo_pac):
+                self.add_events([(e["paciente_id"], e) for e in eventos])
+            batch = []
+            for p in store.iter_patients(batch_size, after_id=ultimo_pac, until_id=max_pac, max_event_id=max_ev):
+                batch.append(p)
+                if len(batch) >= batch_size:
+                    self.add_patients(batch)
+                    batch = []
+            self.add_patients(batch)
+            self.synced = (max_pac, max_ev)
+
+    def sync_in_background(self, store):
+        """Dispara `sync` em uma thread daemon (idempotente enquanto ela roda)."""
+        if self._sync_thread is not None and self._sync_thread.is_alive():
+            return
+        self._sync_thread = threading.Thread(target=self.sync, args=(store,), name="sync-busca", daemon=True)
+        self._sync_thread.start()
+
+    def remove_patient(self, patient_id):
+        with self._lock:
+            self._remove(int(patient_id))
+            self._maybe_compact()
+
+    # --- leitura ---
+
+    def lookup_name(self, query):
+        """Nome exato, ou todos os tokens da consulta presentes no nome."""
+        q = normalize_text(query)
+        with self._lock:
+            exact = self._name_index.get(q)
+            if exact:
+                return set(exact)
+            tokens = TOKEN_RE.findall(q)
+            if not tokens:
+                return set()
+            hits = [self._token_index.get(t, set()) for t in tokens]
+            return set.intersection(*hits) if all(hits) else set()
+
+    def lookup_cid(self, code):
+        """Pacientes com o código CID (prefixo 'G43' também casa 'G43.1')."""
+        code = code.upper()
+        with self._lock:
+            found = set(self._cid_index.get(code, set()))
+            if "." not in code:
+                for key, ids in self._cid_index.items():
+                    if key.startswith(code + "."):
+                        found |= ids
+            return found
+
+    def semantic_search_many(self, queries, k=10):
+        """Top-k pacientes por consulta, com um único produto matricial.
+
+        Retorna, para cada consulta, uma lista [(patient_id, score), ...].
+        """
+        with self._lock:
+            if self._matrix is None or not queries or self._size == self._dead:
+                return [[] for _ in queries]
+            # Vistas, sem cópia da matriz; compactação troca os arrays em vez de alterá-los
+            matrix = self._matrix[: self._size]
+            dead = ~self._alive[: self._size]
+            order, starts, uniq = self._owner_groups()
+        q = self._embed(queries)
+        scores = q @ matrix.T
+        scores[:, dead] = -np.inf
+        # Maior cosseno por paciente: linhas agrupadas por dono + reduceat
+        best = np.maximum.reduceat(scores[:, order], starts, axis=1)
+        results = []
+        for row in best:
+            top = min(k, int(np.isfinite(row).sum()))
+            if not top:
+                results.append([])
+                continue
+            idx = np.argpartition(-row, top - 1)[:top]
+            idx = idx[np.argsort(-row[idx])]
+            results.append([(int(uniq[i]), float(row[i])) for i in idx])
+        return results
+
+    def _owner_groups(self):
+        if self._groups is None or len(self._groups[0]) != self._size:
+            owners = self._row_owner[: self._size]
+            order = np.argsort(owners, kind="stable")
+            sorted_owners = owners[order]
+            starts = np.flatnonzero(np.r_[True, sorted_owners[1:] != sorted_owners[:-1]])
+            self._groups = (order, starts, sorted_owners[starts])
+        return self._groups
+
+    def semantic_search(self, query, k=10):
+        return self.semantic_search_many([query], k=k)[0]
+
+    def search(self, query, k=10, semantic=True):
+        """Busca combinada: CID e nome pelo índice invertido; sem acerto
+        exato, cai na busca semântica.
+
+        Retorna os ids de pacientes ordenados por relevância.
+        """
+        query = (query or "").strip()
+        if not query:
+            return []
+        ordered = []
+        for cid in extract_cids(query):
+            ordered.extend(sorted(self.lookup_cid(cid)))
+        ordered.extend(sorted(self.lookup_name(query)))
+        if semantic and not ordered:
+            ordered.extend(pid for pid, _ in self.semantic_search(query, k=k))
+        seen, result = set(), []
+        for pid in ordered:
+            if pid not in seen:
+                seen.add(pid)
+                result.append(pid)
+        return result[:k]
@@ -0,0 +1,94 @@
+"""Geração SOAP em streaming.
+
+`SoapStream` embrulha o iterador de tokens do provedor: repassa cada trecho
+para `st.write_stream`, guarda o texto parcial mesmo se a conexão cair e mede o
+tempo até o primeiro token e a latência total.
+"""
+import re
+import time
+
+SOAP_SECTIONS = ("Subjetivo", "Objetivo", "Avaliação", "Plano")
+_SECTION_RE = re.compile(
+    r"^\s*(?:#+\s*|\*\*)?\s*(?:[SOAP]\s*[-–:.)]\s*)?(" + "|".join(SOAP_SECTIONS) + r")\b\s*(?:\*\*)?\s*[:.\-–]?\s*(?:\*\*)?[ \t]*",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def split_soap_sections(text):
+    """Divide o texto nas quatro seções SOAP (seções ausentes ficam vazias)."""
+    sections = dict.fromkeys(SOAP_SECTIONS, "")
+    matches = list(_SECTION_RE.finditer(text or ""))
+    for i, m in enumerate(matches):
+        name = next(s for s in SOAP_SECTIONS if s.lower() == m.group(1).lower())
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections[name] = text[m.end():end].strip()
+    return sections
+
+
+class SoapStream:
+    """Iterável de trechos de texto com métricas de latência."""
+
+    def __init__(self, chunks, on_complete=None, on_abort=None):
+        self._chunks = chunks
+        self._on_complete = on_complete
+        # Chamado com a exceção quando o stream falha ou é abandonado pela metade
+        self._on_abort = on_abort
+        self._settled = False
+        self._parts = []
+        self.started = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.error = None
+
+    @classmethod
+    def from_text(cls, text):
+        """Stream de um único trecho (ex: resposta vinda do cache)."""
+        return cls(iter([text]))
+
+    def __iter__(self):
+        self.started = time.perf_counter()
+        concluido = False
+        try:
+            for chunk in self._chunks:
+                if not chunk:
+                    continue
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                self._parts.append(chunk)
+                yield chunk
+            concluido = True
+        except Exception as e:
+            self.error = e
+            yield f"\n\n⚠️ Geração interrompida: {e}"
+        finally:
+            self.finished_at = time.perf_counter()
+            if not concluido:
+                self.close()
+        if concluido and not self._settled:
+            self._settled = True
+            if self._on_complete:
+                self._on_complete(self.text)
+
+    def close(self):
+        """Encerra um stream não concluído (falha, abandono ou nunca iniciado)."""
+        if self._settled:
+            return
+        self._settled = True
+        if self._on_abort:
+            self._on_abort(self.error or RuntimeError("geração abandonada antes do fim"))
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    @property
+    def sections(self):
+        return split_soap_sections(self.text)
+
+    def timing(self):
+        """{'ttft': s, 'total': s} — None para métricas ainda não medidas."""
+        if self.started is None:
+            return {"ttft": None, "total": None}
+        ttft = self.first_token_at - self.started if self.first_token_at else None
+        total = self.finished_at - self.started if self.finished_at else None
+        return {"ttft": ttft, "total": total}
@@ -0,0 +1,97 @@
+"""Cold start: carregamento preguiçoso de dependências pesadas e relatório de
+tempos de inicialização (imports e primeira renderização)."""
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Marcos de inicialização do processo, em segundos desde `origin`."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.imports = {}
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        """Registra o marco apenas na primeira vez (reruns não sobrescrevem)."""
+        with self._lock:
+            if name in self.marks:
+                return False
+            self.marks[name] = time.perf_counter() - self.origin
+        logger.info("startup: %s em %.3fs", name, self.marks[name])
+        return True
+
+    def import_module(self, name):
+        """`importlib.import_module` cronometrado (a primeira carga é a que conta)."""
+        t0 = time.perf_counter()
+        module = importlib.import_module(name)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.imports.setdefault(name, elapsed)
+        return module
+
+    def rows(self):
+        with self._lock:
+            rows = [{"etapa": f"marco: {k}", "segundos": v} for k, v in sorted(self.marks.items(), key=lambda kv: kv[1])]
+            rows += [{"etapa": f"import: {k}", "segundos": v} for k, v in sorted(self.imports.items(), key=lambda kv: -kv[1])]
+        return rows
+
+
+class LazyResource:
+    """Recurso caro (ex: modelo de embeddings) criado sob demanda.
+
+    `warm()` inicia a carga em uma thread daemon; `get()` bloqueia até o recurso
+    estar pronto, reaproveitando uma carga em andamento.
+    """
+
+    def __init__(self, factory, name="resource"):
+        self._factory = factory
+        self.name = name
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self._thread = None
+        self.load_seconds = None
+        self.error = None
+
+    @property
+    def ready(self):
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                t0 = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.error = e
+                    raise
+                self.error = None
+                self.load_seconds = time.perf_counter() - t0
+                self._loaded = True
+                logger.info("%s carregado em %.2fs", self.name, self.load_seconds)
+        return self._value
+
+    def warm(self):
+        """Dispara a carga em segundo plano (idempotente)."""
+        if self._loaded or (self._thread is not None and self._thread.is_alive()):
+            return
+        def run():
+            try:
+                self.get()
+            except Exception:
+                logger.exception("falha ao pré-carregar %s", self.name)
+        self._thread = threading.Thread(target=run, name=f"warm-{self.name}", daemon=True)
+        self._thread.start()
+
+
+# Um relatório por processo: o primeiro import deste módulo marca a origem.
+startup_report = StartupReport()
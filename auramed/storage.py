@@ -0,0 +1,588 @@
+"""Armazenamento clínico compartilhado (SQLite em modo WAL).
+
+Um único `ClinicStore` por processo substitui o dicionário `data` de cada
+sessão: todos os médicos e pacientes enxergam os mesmos registros. Cada thread
+usa sua própria conexão, reaproveitada entre reruns do Streamlit.
+"""
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS credentials (
+    username TEXT PRIMARY KEY,
+    senha TEXT NOT NULL,
+    role TEXT NOT NULL,
+    nome TEXT NOT NULL,
+    especialidade TEXT,
+    crm TEXT,
+    paciente_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS pacientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome TEXT NOT NULL,
+    idade INTEGER,
+    sexo TEXT,
+    historico TEXT,
+    vitals TEXT NOT NULL DEFAULT '{}',
+    origem_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pacientes_nome ON pacientes(nome);
+CREATE TABLE IF NOT EXISTS timeline (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    paciente_id INTEGER NOT NULL REFERENCES pacientes(id) ON DELETE CASCADE,
+    data TEXT NOT NULL,
+    evento TEXT NOT NULL,
+    detalhe TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_timeline_paciente_data ON timeline(paciente_id, data);
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    paciente TEXT NOT NULL,
+    data TEXT NOT NULL,
+    hora TEXT NOT NULL,
+    tipo TEXT,
+    status TEXT,
+    valor REAL NOT NULL DEFAULT 0,
+    medico TEXT,
+    sala TEXT,
+    duracao INTEGER NOT NULL DEFAULT 30
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_data_hora ON appointments(data, hora);
+CREATE INDEX IF NOT EXISTS idx_appointments_status ON appointments(status);
+CREATE TABLE IF NOT EXISTS financeiro (
+    ordem INTEGER PRIMARY KEY,
+    mes TEXT NOT NULL,
+    receita REAL NOT NULL DEFAULT 0,
+    despesas REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS ledger (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL,
+    tipo TEXT NOT NULL CHECK (tipo IN ('receita', 'despesa')),
+    valor REAL NOT NULL,
+    descricao TEXT,
+    appointment_id INTEGER UNIQUE
+);
+CREATE INDEX IF NOT EXISTS idx_ledger_data ON ledger(data);
+CREATE TABLE IF NOT EXISTS prescricoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    paciente_id INTEGER NOT NULL REFERENCES pacientes(id) ON DELETE CASCADE,
+    data TEXT NOT NULL,
+    medicamentos TEXT NOT NULL,
+    instrucoes TEXT,
+    dias_afastamento INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_prescricoes_paciente ON prescricoes(paciente_id, data);
+CREATE TABLE IF NOT EXISTS medicamentos (
+    nome TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+"""
+
+# Colunas acrescentadas depois da primeira versão do schema (bancos antigos
+# recebem ALTER TABLE na abertura).
+MIGRATIONS = {
+    "pacientes": [("origem_id", "TEXT")],
+    "credentials": [("paciente_id", "INTEGER")],
+    "appointments": [("medico", "TEXT"), ("sala", "TEXT"), ("duracao", "INTEGER NOT NULL DEFAULT 30")],
+}
+POST_MIGRATION_SQL = """
+CREATE INDEX IF NOT EXISTS idx_appointments_medico_data ON appointments(medico, data);
+CREATE INDEX IF NOT EXISTS idx_appointments_sala_data ON appointments(sala, data);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pacientes_origem ON pacientes(origem_id) WHERE origem_id IS NOT NULL;
+"""
+# Contas de paciente antigas eram ligadas ao prontuário só pelo nome
+LINK_PATIENTS_SQL = """
+UPDATE credentials SET paciente_id = (SELECT id FROM pacientes WHERE pacientes.nome = credentials.nome ORDER BY id LIMIT 1)
+WHERE role = 'patient' AND paciente_id IS NULL;
+"""
+
+
+class ClinicStore:
+    """Camada de dados da clínica com consultas parametrizadas e paginadas."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._all_conns = []
+        self._pool_lock = threading.Lock()
+        with self._tx() as conn:
+            conn.executescript(SCHEMA)
+            for table, columns in MIGRATIONS.items():
+                existing = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+                for name, decl in columns:
+                    if name not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+            conn.executescript(POST_MIGRATION_SQL)
+            conn.executescript(LINK_PATIENTS_SQL)
+            conn.execute("INSERT OR IGNORE INTO meta (chave, valor) VALUES ('db_uuid', ?)", (uuid.uuid4().hex,))
+        self.db_uuid = self._query("SELECT valor FROM meta WHERE chave = 'db_uuid'")[0]["valor"]
+
+    # --- conexões ---
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._pool_lock:
+                self._all_conns.append(conn)
+        return conn
+
+    @contextmanager
+    def _tx(self):
+        conn = self._conn()
+        with conn:
+            yield conn
+
+    def _query(self, sql, params=()):
+        return self._conn().execute(sql, params).fetchall()
+
+    def close(self):
+        with self._pool_lock:
+            for conn in self._all_conns:
+                conn.close()
+            self._all_conns.clear()
+        self._local = threading.local()
+
+    # --- carga inicial ---
+
+    def is_empty(self):
+        return self._query("SELECT 1 FROM credentials LIMIT 1") == []
+
+    def seed(self, data):
+        """Popula um banco vazio a partir do dicionário de demonstração."""
+        if not self.is_empty():
+            return
+        for username, cred in data.get("credentials", {}).items():
+            self.add_credential(username, **cred)
+        for p in data.get("pacientes", []):
+            self.add_patient(p)
+        for a in data.get("appointments", []):
+            self.add_appointment(a)
+        fin = data.get("financeiro")
+        if fin:
+            with self._tx() as conn:
+                conn.executemany(
+                    "INSERT INTO financeiro (ordem, mes, receita, despesas) VALUES (?, ?, ?, ?)",
+                    [(i, m, r, d) for i, (m, r, d) in enumerate(zip(fin["meses"], fin["receita"], fin["despesas"]))],
+                )
+        with self._tx() as conn:
+            conn.executemany("INSERT OR IGNORE INTO medicamentos (nome) VALUES (?)", [(m,) for m in data.get("medicamentos", [])])
+            conn.executescript(LINK_PATIENTS_SQL)
+
+    # --- credenciais ---
+
+    def get_credential(self, username):
+        rows = self._query("SELECT * FROM credentials WHERE username = ?", (username,))
+        return dict(rows[0]) if rows else None
+
+    def list_doctors(self):
+        rows = self._query("SELECT username, nome, especialidade, crm FROM credentials WHERE role = 'doctor' ORDER BY nome")
+        return [dict(r) for r in rows]
+
+    def add_credential(self, username, senha, role, nome, especialidade=None, crm=None, paciente_id=None):
+        """Cria a credencial; usuário repetido levanta `sqlite3.IntegrityError` (nunca sobrescreve)."""
+        with self._tx() as conn:
+            self._insert_credential(conn, username, senha, role, nome, especialidade, crm, paciente_id)
+
+    def add_account(self, username, senha, role, nome, paciente=None):
+        """Paciente (opcional) + credencial na mesma transação; devolve o id do paciente ou None.
+
+        Usuário repetido levanta `sqlite3.IntegrityError` e nada é gravado.
+        """
+        with self._tx() as conn:
+            paciente_id = self._insert_patient(conn, paciente) if paciente is not None else None
+            self._insert_credential(conn, username, senha, role, nome, paciente_id=paciente_id)
+        return paciente_id
+
+    @staticmethod
+    def _insert_credential(conn, username, senha, role, nome, especialidade=None, crm=None, paciente_id=None):
+        conn.execute(
+            "INSERT INTO credentials (username, senha, role, nome, especialidade, crm, paciente_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (username, senha, role, nome, especialidade, crm, paciente_id),
+        )
+
+    def set_password(self, username, senha):
+        with self._tx() as conn:
+            conn.execute("UPDATE credentials SET senha = ? WHERE username = ?", (senha, username))
+
+    def credential_secrets(self):
+        return [(r["username"], r["senha"]) for r in self._query("SELECT username, senha FROM credentials")]
+
+    # --- pacientes ---
+
+    @staticmethod
+    def _patient_row(row):
+        p = dict(row)
+        p["vitals"] = json.loads(p.get("vitals") or "{}")
+        return p
+
+    def add_patient(self, patient):
+        """Insere o paciente (e sua timeline) e devolve o id atribuído.
+
+        Sem `id` no dicionário, o banco gera um novo id único.
+        """
+        with self._tx() as conn:
+            return self._insert_patient(conn, patient)
+
+    @staticmethod
+    def _insert_patient(conn, patient):
+        cur = conn.execute(
+            "INSERT INTO pacientes (id, nome, idade, sexo, historico, vitals) VALUES (?, ?, ?, ?, ?, ?)",
+            (patient.get("id"), patient["nome"], patient.get("idade"), patient.get("sexo"), patient.get("historico", ""),
+             json.dumps(patient.get("vitals", {}))),
+        )
+        pid = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO timeline (paciente_id, data, evento, detalhe) VALUES (?, ?, ?, ?)",
+            [(pid, e["data"], e["evento"], e.get("detalhe", "")) for e in patient.get("timeline", [])],
+        )
+        return pid
+
+    def add_patients_bulk(self, rows):
+        """Importação em lote de tuplas (origem_id, nome, idade, sexo, historico).
+
+        Tudo em uma transação. Linhas cujo `origem_id` já existe são ignoradas
+        (reimportar o mesmo arquivo não duplica pacientes). Devolve a lista de
+        pacientes efetivamente inseridos, já com o id atribuído.
+        """
+        inserted = []
+        with self._tx() as conn:
+            for origem_id, nome, idade, sexo, historico in rows:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO pacientes (nome, idade, sexo, historico, origem_id) VALUES (?, ?, ?, ?, ?)",
+                    (nome, idade, sexo, historico, origem_id),
+                )
+                if cur.rowcount:
+                    inserted.append({"id": cur.lastrowid, "nome": nome, "idade": idade, "sexo": sexo, "historico": historico})
+        return inserted
+
+    def resolve_origin_ids(self, origem_ids):
+        """{origem_id: id local} para os ids de origem informados."""
+        ids = list({str(o) for o in origem_ids})
+        found = {}
+        for i in range(0, len(ids), 900):
+            part = ids[i:i + 900]
+            marks = ",".join("?" * len(part))
+            found.update((r[0], r[1]) for r in self._query(f"SELECT origem_id, id FROM pacientes WHERE origem_id IN ({marks})", part))
+        return found
+
+    def existing_patient_ids(self, patient_ids):
+        ids = list({int(p) for p in patient_ids})
+        found = set()
+        for i in range(0, len(ids), 900):
+            part = ids[i:i + 900]
+            marks = ",".join("?" * len(part))
+            found.update(r[0] for r in self._query(f"SELECT id FROM pacientes WHERE id IN ({marks})", part))
+        return found
+
+    def count_patients(self):
+        return self._query("SELECT COUNT(*) FROM pacientes")[0][0]
+
+    def list_patients(self, limit=20, offset=0):
+        rows = self._query("SELECT * FROM pacientes ORDER BY id LIMIT ? OFFSET ?", (limit, offset))
+        return [self._patient_row(r) for r in rows]
+
+    def get_patient(self, patient_id):
+        rows = self._query("SELECT * FROM pacientes WHERE id = ?", (patient_id,))
+        return self._patient_row(rows[0]) if rows else None
+
+    def get_patients(self, patient_ids):
+        """Pacientes na ordem dos ids pedidos (ids inexistentes são ignorados)."""
+        ids = list(patient_ids)
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        rows = self._query(f"SELECT * FROM pacientes WHERE id IN ({marks})", ids)
+        by_id = {r["id"]: self._patient_row(r) for r in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def find_patient_by_name(self, nome):
+        rows = self._query("SELECT * FROM pacientes WHERE nome = ? ORDER BY id LIMIT 1", (nome,))
+        return self._patient_row(rows[0]) if rows else None
+
+    def patient_choices(self, limit=1000, offset=0):
+        """{id: nome} em ordem alfabética, para seletores que identificam o paciente pelo id."""
+        return {r[0]: r[1] for r in self._query("SELECT id, nome FROM pacientes ORDER BY nome, id LIMIT ? OFFSET ?", (limit, offset))}
+
+    def find_patient_choices(self, termo, limit=50):
+        """{id: nome} dos pacientes cujo nome contém `termo` (sem depender do índice semântico)."""
+        rows = self._query("SELECT id, nome FROM pacientes WHERE nome LIKE ? ORDER BY nome, id LIMIT ?", (f"%{termo}%", limit))
+        return {r[0]: r[1] for r in rows}
+
+    def last_ids(self):
+        """(maior id de paciente, maior id de evento): marcas para sincronização incremental."""
+        row = self._query("SELECT (SELECT COALESCE(MAX(id), 0) FROM pacientes), (SELECT COALESCE(MAX(id), 0) FROM timeline)")[0]
+        return row[0], row[1]
+
+    def iter_patients(self, batch_size=500, with_timeline=True, after_id=0, until_id=None, max_event_id=None):
+        """Percorre os pacientes (id em (`after_id`, `until_id`]) em lotes, sem carregar a tabela inteira.
+
+        `max_event_id` limita a timeline aos eventos com id até essa marca.
+        """
+        last_id = after_id
+        limite = "AND id <= ?" if until_id is not None else ""
+        while True:
+            rows = self._query(f"SELECT * FROM pacientes WHERE id > ? {limite} ORDER BY id LIMIT ?",
+                               (last_id, *([until_id] if until_id is not None else []), batch_size))
+            if not rows:
+                return
+            batch = [self._patient_row(r) for r in rows]
+            if with_timeline:
+                marks = ",".join("?" * len(batch))
+                corte = "AND id <= ?" if max_event_id is not None else ""
+                events = self._query(
+                    f"SELECT * FROM timeline WHERE paciente_id IN ({marks}) {corte} ORDER BY paciente_id, data, id",
+                    [p["id"] for p in batch] + ([max_event_id] if max_event_id is not None else []),
+                )
+                grouped = {}
+                for e in events:
+                    grouped.setdefault(e["paciente_id"], []).append(dict(e))
+                for p in batch:
+                    p["timeline"] = grouped.get(p["id"], [])
+            yield from batch
+            last_id = batch[-1]["id"]
+
+    # --- timeline ---
+
+    def add_event(self, patient_id, event):
+        with self._tx() as conn:
+            cur = conn.execute(
+                "INSERT INTO timeline (paciente_id, data, evento, detalhe) VALUES (?, ?, ?, ?)",
+                (patient_id, event["data"], event["evento"], event.get("detalhe", "")),
+            )
+        return cur.lastrowid
+
+    @staticmethod
+    def _date_range(start, end):
+        clauses, params = [], []
+        if start:
+            clauses.append("AND data >= ?")
+            params.append(str(start))
+        if end:
+            clauses.append("AND data <= ?")
+            params.append(str(end))
+        return " ".join(clauses), params
+
+    def timeline(self, patient_id, limit=50, offset=0, start=None, end=None):
+        """Eventos do paciente, do mais recente para o mais antigo.
+
+        `start`/`end` (ISO, inclusivos) filtram pelo índice (paciente_id, data).
+        """
+        where, params = self._date_range(start, end)
+        rows = self._query(
+            f"SELECT * FROM timeline WHERE paciente_id = ? {where} ORDER BY data DESC, id DESC LIMIT ? OFFSET ?",
+            (patient_id, *params, limit, offset),
+        )
+        return [dict(r) for r in rows]
+
+    def events_after(self, patient_id, last_id=0, limit=5000):
+        """Eventos com id maior que `last_id`, em ordem de inclusão (indexação incremental)."""
+        rows = self._query(
+            "SELECT * FROM timeline WHERE paciente_id = ? AND id > ? ORDER BY id LIMIT ?", (patient_id, last_id, limit)
+        )
+        return [dict(r) for r in rows]
+
+    def add_events_bulk(self, rows):
+        """Inclusão em lote de tuplas (paciente_id, data, evento, detalhe)."""
+        with self._tx() as conn:
+            conn.executemany("INSERT INTO timeline (paciente_id, data, evento, detalhe) VALUES (?, ?, ?, ?)", rows)
+
+    def iter_events(self, batch_size=5000, after_id=0, until_id=None, max_patient_id=None):
+        """Eventos de timeline com id em (`after_id`, `until_id`], em lotes por id.
+
+        `max_patient_id` restringe aos pacientes com id até essa marca.
+        """
+        last_id = after_id
+        filtros, extra = "", []
+        if until_id is not None:
+            filtros += " AND id <= ?"
+            extra.append(until_id)
+        if max_patient_id is not None:
+            filtros += " AND paciente_id <= ?"
+            extra.append(max_patient_id)
+        while True:
+            rows = self._query(f"SELECT * FROM timeline WHERE id > ?{filtros} ORDER BY id LIMIT ?", (last_id, *extra, batch_size))
+            if not rows:
+                return
+            yield [dict(r) for r in rows]
+            last_id = rows[-1]["id"]
+
+    def count_events(self, patient_id, start=None, end=None):
+        where, params = self._date_range(start, end)
+        return self._query(f"SELECT COUNT(*) FROM timeline WHERE paciente_id = ? {where}", (patient_id, *params))[0][0]
+
+    def last_visit(self, patient_id):
+        rows = self._query(
+            "SELECT data FROM timeline WHERE paciente_id = ? ORDER BY data DESC LIMIT 1", (patient_id,)
+        )
+        return rows[0][0] if rows else None
+
+    def last_visits(self, patient_ids):
+        """{paciente_id: última data} para uma página de pacientes, em uma consulta."""
+        ids = list(patient_ids)
+        if not ids:
+            return {}
+        marks = ",".join("?" * len(ids))
+        rows = self._query(
+            f"SELECT paciente_id, MAX(data) FROM timeline WHERE paciente_id IN ({marks}) GROUP BY paciente_id", ids
+        )
+        return {r[0]: r[1] for r in rows}
+
+    # --- agenda ---
+
+    def add_appointment(self, appt):
+        with self._tx() as conn:
+            cur = conn.execute(
+                "INSERT INTO appointments (id, paciente, data, hora, tipo, status, valor, medico, sala, duracao) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (appt.get("id"), appt["paciente"], appt["data"], appt["hora"], appt.get("tipo"), appt.get("status"),
+                 appt.get("valor", 0), appt.get("medico"), appt.get("sala"), appt.get("duracao", 30)),
+            )
+        return cur.lastrowid
+
+    def get_appointment(self, appt_id):
+        rows = self._query("SELECT * FROM appointments WHERE id = ?", (appt_id,))
+        return dict(rows[0]) if rows else None
+
+    def update_appointment_status(self, appt_id, status):
+        with self._tx() as conn:
+            conn.execute("UPDATE appointments SET status = ? WHERE id = ?", (status, appt_id))
+
+    def appointments_between(self, start, end, medico=None):
+        """Agendamentos com data em [start, end] (ISO), pela ordem do dia."""
+        if medico:
+            rows = self._query(
+                "SELECT * FROM appointments WHERE medico = ? AND data BETWEEN ? AND ? ORDER BY data, hora",
+                (medico, str(start), str(end)),
+            )
+        else:
+            rows = self._query(
+                "SELECT * FROM appointments WHERE data BETWEEN ? AND ? ORDER BY data, hora", (str(start), str(end))
+            )
+        return [dict(r) for r in rows]
+
+    def add_appointments_bulk(self, appts):
+        """Inclusão em lote (uma transação) de dicts de agendamento; devolve os ids na mesma ordem."""
+        ids = []
+        with self._tx() as conn:
+            for a in appts:
+                cur = conn.execute(
+                    "INSERT INTO appointments (paciente, data, hora, tipo, status, valor, medico, sala, duracao) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (a["paciente"], a["data"], a["hora"], a.get("tipo"), a.get("status"), a.get("valor", 0),
+                     a.get("medico"), a.get("sala"), a.get("duracao", 30)),
+                )
+                ids.append(cur.lastrowid)
+        return ids
+
+    def iter_appointments(self, batch_size=1000):
+        last_id = 0
+        while True:
+            rows = self._query("SELECT * FROM appointments WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+            if not rows:
+                return
+            yield from (dict(r) for r in rows)
+            last_id = rows[-1]["id"]
+
+    # --- livro-caixa ---
+
+    def add_ledger_entry(self, data, tipo, valor, descricao="", appointment_id=None):
+        """Inclui um lançamento. Devolve False se a consulta já foi lançada."""
+        with self._tx() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO ledger (data, tipo, valor, descricao, appointment_id) VALUES (?, ?, ?, ?, ?)",
+                (data, tipo, valor, descricao, appointment_id),
+            )
+        return cur.rowcount > 0
+
+    def add_ledger_entries(self, entries):
+        """Inclusão em lote de tuplas (data, tipo, valor, descricao)."""
+        with self._tx() as conn:
+            conn.executemany("INSERT INTO ledger (data, tipo, valor, descricao) VALUES (?, ?, ?, ?)", entries)
+
+    def ledger_is_empty(self):
+        return self._query("SELECT 1 FROM ledger LIMIT 1") == []
+
+    def ledger_daily_totals(self):
+        """(data, tipo, soma) por dia — agregado no banco."""
+        return [tuple(r) for r in self._query("SELECT data, tipo, SUM(valor) FROM ledger GROUP BY data, tipo")]
+
+    def ledger_entries(self, start, end, limit=50, offset=0):
+        rows = self._query(
+            "SELECT * FROM ledger WHERE data BETWEEN ? AND ? ORDER BY data DESC, id DESC LIMIT ? OFFSET ?",
+            (str(start), str(end), limit, offset),
+        )
+        return [dict(r) for r in rows]
+
+    # --- prescrições ---
+
+    def add_prescription(self, paciente_id, data, medicamentos, instrucoes="", dias_afastamento=0):
+        with self._tx() as conn:
+            cur = conn.execute(
+                "INSERT INTO prescricoes (paciente_id, data, medicamentos, instrucoes, dias_afastamento) VALUES (?, ?, ?, ?, ?)",
+                (paciente_id, str(data), json.dumps(list(medicamentos), ensure_ascii=False), instrucoes, dias_afastamento),
+            )
+        return cur.lastrowid
+
+    def add_prescriptions_bulk(self, paciente_ids, data, medicamentos, instrucoes=""):
+        """A mesma prescrição para vários pacientes, em uma transação (renovação em lote)."""
+        meds = json.dumps(list(medicamentos), ensure_ascii=False)
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT INTO prescricoes (paciente_id, data, medicamentos, instrucoes, dias_afastamento) VALUES (?, ?, ?, ?, 0)",
+                [(pid, str(data), meds, instrucoes) for pid in paciente_ids],
+            )
+
+    def count_prescriptions(self):
+        return self._query("SELECT COUNT(*) FROM prescricoes")[0][0]
+
+    def iter_prescriptions(self, batch_size=1000):
+        """Prescrições com nome e histórico do paciente, em lotes por id."""
+        last_id = 0
+        while True:
+            rows = self._query(
+                "SELECT pr.*, p.nome, p.historico FROM prescricoes pr JOIN pacientes p ON p.id = pr.paciente_id "
+                "WHERE pr.id > ? ORDER BY pr.id LIMIT ?",
+                (last_id, batch_size),
+            )
+            if not rows:
+                return
+            for r in rows:
+                presc = dict(r)
+                presc["medicamentos"] = json.loads(presc["medicamentos"])
+                yield presc
+            last_id = rows[-1]["id"]
+
+    def patients_using(self, termo, limit=5000):
+        """Pacientes em uso contínuo de um fármaco: citado no histórico ou já prescrito."""
+        like = f"%{termo}%"
+        rows = self._query(
+            "SELECT * FROM pacientes WHERE historico LIKE ? "
+            "OR id IN (SELECT paciente_id FROM prescricoes WHERE medicamentos LIKE ?) ORDER BY nome LIMIT ?",
+            (like, like, limit),
+        )
+        return [self._patient_row(r) for r in rows]
+
+    # --- financeiro e catálogo ---
+
+    def financeiro(self):
+        rows = self._query("SELECT mes, receita, despesas FROM financeiro ORDER BY ordem")
+        return {
+            "meses": [r["mes"] for r in rows],
+            "receita": [r["receita"] for r in rows],
+            "despesas": [r["despesas"] for r in rows],
+        }
+
+    def medicamentos(self):
+        return [r[0] for r in self._query("SELECT nome FROM medicamentos ORDER BY nome")]
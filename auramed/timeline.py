@@ -0,0 +1,38 @@
+"""Renderização paginada da timeline clínica.
+
+Uma página de eventos vira um único bloco HTML (um `st.markdown` por página em
+vez de um por evento), o que reduz o payload enviado pelo websocket a cada
+rerun.
+"""
+import html
+
+TIMELINE_PAGE_SIZE = 25
+
+_ITEM_TEMPLATES = {
+    "doctor": (
+        "<div style='border-left: 2px solid #e2e8f0; padding-left: 15px; margin-bottom: 20px;'>"
+        "<small style='color:#0d9488; font-weight:bold;'>{data}</small>"
+        "<h5 style='margin:0;'>{evento}</h5>"
+        "<p style='margin:0; color:#64748b;'>{detalhe}</p>"
+        "</div>"
+    ),
+    "patient": (
+        "<div style='border-left: 3px solid #0d9488; padding-left: 15px; margin-bottom: 15px;'>"
+        "<b>{data}</b> - {evento}<br>"
+        "<span style='color:gray'>{detalhe}</span>"
+        "</div>"
+    ),
+}
+
+
+def _escape(text):
+    return html.escape(str(text or "")).replace("\n", "<br>")
+
+
+def render_events_html(events, variant="doctor"):
+    """Monta o HTML de uma página de eventos em um único bloco."""
+    template = _ITEM_TEMPLATES[variant]
+    return "".join(
+        template.format(data=_escape(e["data"]), evento=_escape(e["evento"]), detalhe=_escape(e.get("detalhe")))
+        for e in events
+    )
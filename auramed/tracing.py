@@ -0,0 +1,185 @@
+"""Instrumentação leve dos caminhos quentes de cada rerun.
+
+`tracer.trace` envolve funções (páginas, IA, gráficos, embeddings) e registra
+por span o tempo de parede e o saldo de blocos alocados
+(`sys.getallocatedblocks`, barato o bastante para ficar sempre ligado). As
+últimas amostras ficam em buffers circulares, de onde saem p50/p95/p99 para o
+painel de diagnóstico e para a exportação no formato texto do Prometheus.
+
+Para investigar um rerun específico, `capture()` liga cProfile e tracemalloc
+apenas durante aquele rerun.
+"""
+import cProfile
+import functools
+import io
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_values, q):
+    """Percentil por posição mais próxima sobre uma lista já ordenada."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+class SpanStats:
+    """Amostras recentes de um span (buffer circular) e totais acumulados."""
+
+    def __init__(self, capacity):
+        self.seconds = deque(maxlen=capacity)
+        self.blocks = deque(maxlen=capacity)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.errors = 0
+
+    def add(self, seconds, blocks, failed):
+        self.seconds.append(seconds)
+        self.blocks.append(blocks)
+        self.count += 1
+        self.total_seconds += seconds
+        self.errors += failed
+
+
+class Tracer:
+    """Coletor de spans compartilhado pelo processo."""
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.enabled = True
+        self._spans = {}
+        self._lock = threading.Lock()
+        self.last_capture = None
+        self._last_export = 0.0
+
+    def _record(self, name, seconds, blocks, failed):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = SpanStats(self.capacity)
+            stats.add(seconds, blocks, failed)
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        blocks0, t0 = sys.getallocatedblocks(), time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            # st.rerun()/st.stop() sobem como BaseException e não contam como erro
+            failed = True
+            raise
+        finally:
+            self._record(name, time.perf_counter() - t0, sys.getallocatedblocks() - blocks0, failed)
+
+    def record(self, name, seconds, failed=False):
+        """Span medido por fora de `span()` (ex: trechos de um stream consumido pelo Streamlit)."""
+        if self.enabled:
+            self._record(name, seconds, 0, failed)
+
+    def trace(self, func=None, name=None):
+        """Decorador: `@tracer.trace` ou `@tracer.trace(name="...")`."""
+        if func is None:
+            return lambda f: self.trace(f, name=name)
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+
+    def rows(self):
+        """Uma linha por span: contagem, percentis em ms e alocação p95."""
+        with self._lock:
+            snapshot = {k: (sorted(v.seconds), sorted(v.blocks), v.count, v.errors) for k, v in self._spans.items()}
+        rows = []
+        for name, (secs, blocks, count, errors) in sorted(snapshot.items()):
+            row = {"span": name, "chamadas": count, "erros": errors}
+            for q in QUANTILES:
+                row[f"p{int(q * 100)} (ms)"] = percentile(secs, q) * 1000
+            row["máx (ms)"] = secs[-1] * 1000 if secs else 0.0
+            row["blocos p95"] = percentile(blocks, 0.95)
+            rows.append(row)
+        return rows
+
+    def prometheus(self, prefix="auramed"):
+        """Métricas no formato texto de exposição do Prometheus."""
+        with self._lock:
+            snapshot = {k: (sorted(v.seconds), sorted(v.blocks), v.count, v.total_seconds, v.errors) for k, v in self._spans.items()}
+        lines = [
+            f"# HELP {prefix}_span_seconds Duração dos spans (quantis sobre as {self.capacity} amostras mais recentes).",
+            f"# TYPE {prefix}_span_seconds summary",
+        ]
+        for name, (secs, _, count, total, _) in sorted(snapshot.items()):
+            for q in QUANTILES:
+                lines.append(f'{prefix}_span_seconds{{span="{name}",quantile="{q}"}} {percentile(secs, q):.6f}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f'{prefix}_span_seconds_count{{span="{name}"}} {count}')
+        lines += [f"# HELP {prefix}_span_alloc_blocks Saldo de blocos alocados por chamada (p95).", f"# TYPE {prefix}_span_alloc_blocks gauge"]
+        lines += [f'{prefix}_span_alloc_blocks{{span="{name}"}} {percentile(v[1], 0.95)}' for name, v in sorted(snapshot.items())]
+        lines += [f"# HELP {prefix}_span_errors_total Chamadas que terminaram em exceção.", f"# TYPE {prefix}_span_errors_total counter"]
+        lines += [f'{prefix}_span_errors_total{{span="{name}"}} {v[4]}' for name, v in sorted(snapshot.items())]
+        return "\n".join(lines) + "\n"
+
+    def export_textfile(self, path, min_interval=15.0):
+        """Grava `prometheus()` em arquivo (coletor textfile do node_exporter), no máximo a cada `min_interval` s."""
+        now = time.monotonic()
+        if now - self._last_export < min_interval:
+            return False
+        self._last_export = now
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+        return True
+
+    @contextmanager
+    def capture(self, label="rerun", top=25):
+        """cProfile + tracemalloc durante o bloco.
+
+        Entrega um dicionário preenchido ao sair do bloco (também guardado em `last_capture`).
+        """
+        result = {}
+        profiler = cProfile.Profile()
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - t0
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+            alocacoes = [
+                {"local": str(stat.traceback), "KB": stat.size / 1024, "blocos": stat.count}
+                for stat in snapshot.statistics("lineno")[:top]
+            ]
+            result.update(label=label, segundos=elapsed, pico_kb=peak / 1024, perfil=out.getvalue(), alocacoes=alocacoes)
+            self.last_capture = result
+
+
+tracer = Tracer()
@@ -0,0 +1,261 @@
+"""Armazenamento colunar de sinais vitais.
+
+As leituras ficam em colunas NumPy (paciente_id, timestamp, pressão sistólica)
+ordenadas por (paciente, tempo). A série de um paciente sai por busca binária e
+as análises (média móvel, alertas de faixa, reamostragem) rodam em uma única
+passada vetorizada sobre todos os pacientes. A persistência é um Parquet por
+coorte de pacientes.
+
+Leituras novas entram em um pequeno delta ordenado, intercalado nas colunas
+principais (busca binária + inserção, sem reordenar tudo) quando cresce ou
+quando uma análise precisa da base inteira. A gravação em disco é agrupada e
+feita em segundo plano.
+"""
+import atexit
+import glob
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+COHORT_SIZE = 1000
+HYPERTENSION_SYSTOLIC = 140.0
+DELTA_ROWS = 4096
+FLUSH_DELAY = 2.0
+# Chave de ordenação (paciente, tempo) em um int64: 34 bits de segundos desde 1900
+_TS_BASE = np.datetime64("1900-01-01", "s").astype(np.int64)
+_TS_BITS = 34
+
+_PT_MONTHS = {"jan": 1, "fev": 2, "mar": 3, "abr": 4, "mai": 5, "jun": 6,
+              "jul": 7, "ago": 8, "set": 9, "out": 10, "nov": 11, "dez": 12}
+
+
+def parse_legacy_dates(labels, year=2023):
+    """Converte rótulos antigos ('Jan', 'Fev', ...) ou datas ISO em datetime64."""
+    out = []
+    for label in labels:
+        month = _PT_MONTHS.get(str(label).strip().lower()[:3])
+        if month and not str(label)[:1].isdigit():
+            out.append(np.datetime64(f"{year}-{month:02d}-01", "s"))
+        else:
+            out.append(np.datetime64(pd.Timestamp(label).to_datetime64(), "s"))
+    return np.array(out, dtype="datetime64[s]")
+
+
+def _sort_key(pid, ts):
+    return (pid << _TS_BITS) + (ts.astype(np.int64) - _TS_BASE)
+
+
+def _merge(base, extra):
+    """Intercala `extra` (ordenado) em `base` (ordenado) sem reordenar `base`."""
+    if not len(extra[0]):
+        return base
+    if not len(base[0]):
+        return extra
+    pos = np.searchsorted(_sort_key(base[0], base[1]), _sort_key(extra[0], extra[1]), side="right")
+    return tuple(np.insert(b, pos, e) for b, e in zip(base, extra))
+
+
+def _sorted_batch(pid, ts, values):
+    order = np.lexsort((ts, pid))
+    return pid[order], ts[order], values[order]
+
+
+class VitalsStore:
+    """Colunas de leituras de pressão arterial de todos os pacientes."""
+
+    def __init__(self, root=None):
+        self.root = root
+        self._lock = threading.RLock()
+        self._pid = np.empty(0, dtype=np.int64)
+        self._ts = np.empty(0, dtype="datetime64[s]")
+        self._pressao = np.empty(0, dtype=np.float32)
+        self._delta = (self._pid, self._ts, self._pressao)
+        self._dirty = set()
+        self.version = 0
+        self._analytics = {}
+        self._flush_lock = threading.Lock()
+        self._flush_timer = None
+        if root:
+            os.makedirs(root, exist_ok=True)
+            self._load()
+            atexit.register(self.flush)
+
+    # --- persistência ---
+
+    def _cohort_path(self, cohort):
+        return os.path.join(self.root, f"cohort_{cohort:05d}.parquet")
+
+    def _load(self):
+        frames = [pd.read_parquet(path) for path in sorted(glob.glob(os.path.join(self.root, "cohort_*.parquet")))]
+        if frames:
+            df = pd.concat(frames, ignore_index=True)
+            self._pid, self._ts, self._pressao = _sorted_batch(
+                df["paciente_id"].to_numpy(np.int64),
+                df["ts"].to_numpy("datetime64[s]"),
+                df["pressao"].to_numpy(np.float32),
+            )
+
+    def flush(self):
+        """Regrava no disco apenas as coortes que receberam leituras novas."""
+        if not self.root:
+            return
+        with self._flush_lock:
+            with self._lock:
+                self._compact()
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                cohorts = sorted(self._dirty)
+                self._dirty.clear()
+                pid, ts, values = self._pid, self._ts, self._pressao
+            # Colunas nunca são alteradas in-place: a escrita roda fora do lock
+            for cohort in cohorts:
+                lo, hi = np.searchsorted(pid, [cohort * COHORT_SIZE, (cohort + 1) * COHORT_SIZE])
+                pd.DataFrame({
+                    "paciente_id": pid[lo:hi],
+                    "ts": ts[lo:hi],
+                    "pressao": values[lo:hi],
+                }).to_parquet(self._cohort_path(cohort), index=False)
+
+    def _schedule_flush(self):
+        """Agrupa as gravações de várias leituras em uma só, em segundo plano."""
+        if not self.root or self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(FLUSH_DELAY, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    # --- escrita ---
+
+    def append_many(self, patient_ids, timestamps, pressao, flush=True):
+        """Acrescenta leituras; `flush` agenda a gravação em disco (use `flush()` para gravar já)."""
+        pid = np.asarray(patient_ids, dtype=np.int64)
+        ts = np.asarray(timestamps, dtype="datetime64[s]")
+        values = np.asarray(pressao, dtype=np.float32)
+        if not (len(pid) == len(ts) == len(values)):
+            raise ValueError("colunas de tamanhos diferentes")
+        if not len(pid):
+            return
+        batch = _sorted_batch(pid, ts, values)
+        with self._lock:
+            self._delta = _merge(self._delta, batch)
+            if len(self._delta[0]) > DELTA_ROWS:
+                self._compact()
+            self._dirty.update(np.unique(pid // COHORT_SIZE).tolist())
+            self.version += 1
+            if flush:
+                self._schedule_flush()
+
+    def append(self, patient_id, timestamp, pressao, flush=True):
+        self.append_many([patient_id], [timestamp], [pressao], flush=flush)
+
+    def _compact(self):
+        if not len(self._delta[0]):
+            return
+        self._pid, self._ts, self._pressao = _merge((self._pid, self._ts, self._pressao), self._delta)
+        self._delta = (self._pid[:0], self._ts[:0], self._pressao[:0])
+
+    # --- leitura ---
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pid) + len(self._delta[0])
+
+    def has_patient(self, patient_id):
+        return len(self.series(patient_id)[0]) > 0
+
+    def series(self, patient_id, start=None, end=None):
+        """(timestamps, pressão) do paciente em ordem cronológica."""
+        with self._lock:
+            lo, hi = np.searchsorted(self._pid, [patient_id, patient_id + 1])
+            main = (self._pid[lo:hi], self._ts[lo:hi], self._pressao[lo:hi])
+            dlo, dhi = np.searchsorted(self._delta[0], [patient_id, patient_id + 1])
+            delta = tuple(col[dlo:dhi] for col in self._delta)
+        # Só a fatia do paciente é intercalada com o delta
+        _, ts, values = _merge(main, delta)
+        if start is not None or end is not None:
+            a = np.searchsorted(ts, np.datetime64(start, "s")) if start is not None else 0
+            b = np.searchsorted(ts, np.datetime64(end, "s"), side="right") if end is not None else len(ts)
+            ts, values = ts[a:b], values[a:b]
+        return ts, values
+
+    def iter_chunks(self, size=100_000):
+        """(paciente_id, timestamps, pressão) de todas as leituras, em fatias (exportação)."""
+        pid, ts, values, _ = self._snapshot()
+        for i in range(0, len(pid), size):
+            yield pid[i:i + size], ts[i:i + size], values[i:i + size]
+
+    def _snapshot(self):
+        with self._lock:
+            self._compact()
+            return self._pid, self._ts, self._pressao, self.version
+
+    def _cached(self, key, compute):
+        pid, ts, values, version = self._snapshot()
+        cache_key = (key, version)
+        with self._lock:
+            if cache_key in self._analytics:
+                return self._analytics[cache_key]
+        result = compute(pid, ts, values)
+        with self._lock:
+            self._analytics = {k: v for k, v in self._analytics.items() if k[1] == version}
+            self._analytics[cache_key] = result
+        return result
+
+    # --- análises vetorizadas ---
+
+    @staticmethod
+    def _rolling(pid, values, window):
+        """Média móvel por paciente sem laço Python (soma acumulada por grupo)."""
+        n = len(values)
+        if not n:
+            return np.empty(0, dtype=np.float64)
+        csum = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+        idx = np.arange(n)
+        group_start = np.searchsorted(pid, pid, side="left")
+        lo = np.maximum(idx - window + 1, group_start)
+        return (csum[idx + 1] - csum[lo]) / (idx + 1 - lo)
+
+    def rolling_mean(self, window=3):
+        """Array alinhado às leituras com a média das últimas `window` do paciente."""
+        return self._cached(("rolling", window), lambda pid, ts, v: self._rolling(pid, v, window))
+
+    def latest(self, window=3):
+        """DataFrame com a última leitura e a média móvel de cada paciente."""
+        def compute(pid, ts, values):
+            if not len(pid):
+                return pd.DataFrame(columns=["paciente_id", "ts", "pressao", "media"])
+            last = np.flatnonzero(np.r_[pid[1:] != pid[:-1], True])
+            media = self._rolling(pid, values, window)
+            return pd.DataFrame({"paciente_id": pid[last], "ts": ts[last], "pressao": values[last], "media": media[last]})
+        return self._cached(("latest", window), compute)
+
+    def out_of_range(self, threshold=HYPERTENSION_SYSTOLIC, window=3):
+        """Pacientes cuja média móvel mais recente está acima do limiar."""
+        latest = self.latest(window)
+        return latest[latest["media"] >= threshold].reset_index(drop=True)
+
+    def threshold_alerts(self, threshold=HYPERTENSION_SYSTOLIC):
+        """Todas as leituras acima do limiar: DataFrame (paciente_id, ts, pressao)."""
+        def compute(pid, ts, values):
+            mask = values >= threshold
+            return pd.DataFrame({"paciente_id": pid[mask], "ts": ts[mask], "pressao": values[mask]})
+        return self._cached(("alerts", threshold), compute)
+
+    def resample(self, freq="W", patient_ids=None):
+        """Médias por paciente em janelas de tempo (`freq` do pandas: D, W, MS...)."""
+        pid, ts, values, _ = self._snapshot()
+        if patient_ids is not None:
+            mask = np.isin(pid, np.asarray(list(patient_ids), dtype=np.int64))
+            pid, ts, values = pid[mask], ts[mask], values[mask]
+        df = pd.DataFrame({"paciente_id": pid, "ts": ts, "pressao": values})
+        if df.empty:
+            return df
+        return (
+            df.groupby(["paciente_id", pd.Grouper(key="ts", freq=freq)])["pressao"]
+            .mean()
+            .dropna()
+            .reset_index()
+        )
@@ -0,0 +1,4 @@
+"""Benchmarks e testes de carga do AuraMed OS (via `streamlit.testing.v1.AppTest`).
+
+Uso: `python -m benchmarks.run --help`.
+"""
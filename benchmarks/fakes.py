@@ -0,0 +1,90 @@
+"""Dublês locais dos serviços externos, para rodar os benchmarks offline.
+
+- `FakeGroq`: imita `client.chat.completions.create` (com e sem `stream=True`)
+  devolvendo um SOAP determinístico, com latência configurável.
+- `StubSentenceTransformer`: imita `SentenceTransformer.encode` com vetores
+  derivados de hash das palavras (sem torch, sem download de modelo).
+"""
+import hashlib
+import sys
+import time
+import types
+from types import SimpleNamespace
+
+import numpy as np
+
+EMBEDDING_DIM = 384
+
+
+class _Completions:
+    def __init__(self, latency, chunk_words):
+        self.latency = latency
+        self.chunk_words = chunk_words
+        self.calls = 0
+
+    @staticmethod
+    def _answer(messages):
+        notas = messages[-1]["content"]
+        return (
+            f"### Subjetivo\n{notas}\n\n### Objetivo\nSem alterações ao exame físico.\n\n"
+            "### Avaliação\nQuadro estável.\n\n### Plano\nRetorno em 30 dias."
+        )
+
+    def create(self, model, messages, temperature=None, stream=False, **kwargs):
+        self.calls += 1
+        texto = self._answer(messages)
+        if not stream:
+            time.sleep(self.latency)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=texto))])
+        return self._stream(texto)
+
+    def _stream(self, texto):
+        palavras = texto.split(" ")
+        pedacos = [" ".join(palavras[i:i + self.chunk_words]) + " " for i in range(0, len(palavras), self.chunk_words)]
+        pausa = self.latency / max(1, len(pedacos))
+        for pedaco in pedacos:
+            time.sleep(pausa)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=pedaco))])
+
+
+class FakeGroq:
+    """Substituto do `groq.Groq` com a mesma forma de chamada."""
+
+    def __init__(self, latency=0.0, chunk_words=4):
+        self.chat = SimpleNamespace(completions=_Completions(latency, chunk_words))
+
+
+class StubSentenceTransformer:
+    """`encode` determinístico: soma de vetores pseudoaleatórios por palavra, normalizada."""
+
+    def __init__(self, name=None, dim=EMBEDDING_DIM):
+        self.name = name
+        self.dim = dim
+        self._cache = {}
+
+    def _word(self, word):
+        vec = self._cache.get(word)
+        if vec is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vec = self._cache[word] = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vec
+
+    def encode(self, texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                out[i] += self._word(word)
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.where(norms == 0, 1, norms)
+        return out[0] if single else out
+
+
+def install_stub_embeddings():
+    """Registra um módulo `sentence_transformers` falso (o app o importa sob demanda)."""
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = StubSentenceTransformer
+    sys.modules["sentence_transformers"] = module
+    return module
@@ -0,0 +1,345 @@
+"""Benchmark e teste de carga do app Streamlit, sem rede.
+
+Gera uma clínica sintética, dirige o `app.py` com `AppTest` (Groq falso e
+embeddings simulados) e mede:
+
+- cold start: processo novo até a tela de login e até o primeiro painel;
+- latência de rerun por página (primeira visita e reruns seguintes);
+- memória retida por sessão;
+- modo carga: N sessões simultâneas navegando pelas páginas.
+
+Com `--baseline`, compara o resultado com medições salvas e termina com código
+1 se alguma métrica piorar além da tolerância. `--update-baseline` regrava o
+arquivo. Linhas de base dependem da máquina: gere-as no mesmo ambiente em que
+serão comparadas.
+
+Exemplos:
+    python -m benchmarks.run --scale small
+    python -m benchmarks.run --scale medium --sessions 8 --duration 20
+    python -m benchmarks.run --baseline benchmarks/baselines/small.json --update-baseline
+"""
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# Referência do cold start: o quanto antes possível no processo
+PROCESS_T0 = time.perf_counter()
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+DOCTOR_PAGES = ["Dashboard", "Prontuário IA", "Receituário", "Pacientes", "Financeiro", "Importar/Exportar", "Diagnóstico"]
+# Métricas em que maior é melhor; todas as outras são "menor é melhor"
+HIGHER_IS_BETTER = ("_per_s",)
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import FakeGroq, install_stub_embeddings  # noqa: E402
+from benchmarks.synthetic import SCALES, SENHA, Scale, generate  # noqa: E402
+
+
+def pct(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def new_session(llm_latency=0.0, timeout=120):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    at.session_state["groq_client"] = FakeGroq(latency=llm_latency)
+    return at
+
+
+def check(at, etapa):
+    if at.exception:
+        raise RuntimeError(f"{etapa}: {at.exception[0].message}")
+
+
+def login(at, usuario="admin"):
+    at.run()
+    check(at, "tela de login")
+    at.text_input(key="l_user").input(usuario)
+    at.text_input(key="l_pwd").input(SENHA)
+    at.button[0].click().run()
+    check(at, "login")
+    if "auth_token" not in at.session_state:
+        raise RuntimeError(f"login de {usuario} falhou")
+    return at
+
+
+def visit(at, page):
+    at.sidebar.radio[0].set_value(page).run()
+    check(at, page)
+    return at
+
+
+@contextlib.contextmanager
+def concurrent_apptests():
+    """Permite vários AppTest em threads (modo carga).
+
+    O AppTest não foi feito para isso: cada rerun compila o app.py (em paralelo,
+    o CPython 3.11 falha com "AST constructor recursion depth mismatch"), troca
+    o `Runtime` global e liga `global.appTest` por patch, e ambos são desfeitos
+    quando outra sessão termina o próprio rerun. Aqui a compilação é
+    serializada, o último `Runtime` simulado continua disponível e
+    `global.appTest` fica ligado até o fim do bloco.
+    """
+    from streamlit import config
+    from streamlit.runtime.runtime import Runtime
+    original_compile = builtins.compile
+    original_get_option = config.get_option
+    original_instance, original_exists = Runtime.__dict__["instance"], Runtime.__dict__["exists"]
+    lock = threading.Lock()
+    ultimo = []
+
+    def compile(*args, **kwargs):
+        with lock:
+            return original_compile(*args, **kwargs)
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultimo[:] = [cls._instance]
+        if not ultimo:
+            raise RuntimeError("Runtime hasn't been created!")
+        return ultimo[0]
+
+    def exists(cls):
+        return cls._instance is not None or bool(ultimo)
+
+    def get_option(key):
+        return True if key == "global.appTest" else original_get_option(key)
+
+    builtins.compile = compile
+    Runtime.instance, Runtime.exists = classmethod(instance), classmethod(exists)
+    config.get_option = get_option
+    try:
+        yield
+    finally:
+        builtins.compile = original_compile
+        Runtime.instance, Runtime.exists = original_instance, original_exists
+        config.get_option = original_get_option
+
+
+# --- medições ---
+
+def cold_start_probe():
+    """Executado em subprocesso: tempos desde o início do processo, em JSON."""
+    t0 = PROCESS_T0
+    install_stub_embeddings()
+    at = new_session()
+    at.run()
+    check(at, "cold start")
+    t_login = time.perf_counter() - t0
+    at.text_input(key="l_user").input("admin")
+    at.text_input(key="l_pwd").input(SENHA)
+    at.button[0].click().run()
+    check(at, "cold start (login)")
+    print(json.dumps({"login_screen_s": t_login, "first_dashboard_s": time.perf_counter() - t0}))
+
+
+def measure_cold_start(env, repeats):
+    amostras = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-m", "benchmarks.run", "--cold-start-probe"], cwd=ROOT,
+                             env={**os.environ, **env}, capture_output=True, text=True, check=True)
+        amostras.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {f"cold_start.{k}": statistics.median(a[k] for a in amostras) for k in amostras[0]}
+
+
+def measure_pages(repeats, llm_latency):
+    metricas = {}
+    at = login(new_session(llm_latency))
+    for page in DOCTOR_PAGES:
+        primeira = timed(lambda: visit(at, page))
+        reruns = [timed(at.run) for _ in range(repeats)]
+        check(at, page)
+        metricas[f"page.{page}.first_ms"] = primeira * 1000
+        metricas[f"page.{page}.p50_ms"] = pct(reruns, 0.5) * 1000
+        metricas[f"page.{page}.p95_ms"] = pct(reruns, 0.95) * 1000
+
+    # Interações que exercitam busca (embeddings) e IA (Groq falso)
+    visit(at, "Pacientes")
+    buscas = []
+    for i in range(repeats):
+        buscas.append(timed(lambda: at.text_input[0].input(f"pressão alta {i}").run()))
+        check(at, "busca")
+    metricas["action.busca_semantica.p50_ms"] = pct(buscas, 0.5) * 1000
+    visit(at, "Prontuário IA")
+    soap = []
+    for i in range(repeats):
+        at.text_area[0].input(f"Paciente relata cefaleia há {i} dias.")
+        soap.append(timed(lambda: [b for b in at.button if b.label == "Processar Prontuário"][0].click().run()))
+        check(at, "SOAP")
+    metricas["action.soap_streaming.p50_ms"] = pct(soap, 0.5) * 1000
+
+    paciente = login(new_session(llm_latency), "paciente")
+    reruns = [timed(paciente.run) for _ in range(repeats)]
+    check(paciente, "painel do paciente")
+    metricas["page.Paciente.p50_ms"] = pct(reruns, 0.5) * 1000
+    metricas["page.Paciente.p95_ms"] = pct(reruns, 0.95) * 1000
+    return metricas
+
+
+def measure_memory(sessions):
+    """Memória Python retida por sessão (tracemalloc) após percorrer todas as páginas."""
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    vivas = []
+    for _ in range(sessions):
+        at = login(new_session())
+        for page in DOCTOR_PAGES:
+            visit(at, page)
+        vivas.append(at)
+    atual, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"memory.per_session_kb": (atual - base) / sessions / 1024, "memory.peak_kb": pico / 1024}
+
+
+def measure_load(sessions, duration, llm_latency):
+    """N usuários simultâneos, cada um em sua thread, navegando em ciclo pelas páginas."""
+    latencias, erros = [], []
+    lock = threading.Lock()
+    prazo = time.perf_counter() + duration
+
+    def usuario(n):
+        try:
+            at = login(new_session(llm_latency))
+            i = n
+            while time.perf_counter() < prazo:
+                t = timed(lambda: visit(at, DOCTOR_PAGES[i % len(DOCTOR_PAGES)]))
+                with lock:
+                    latencias.append(t)
+                i += 1
+        except Exception as e:
+            with lock:
+                erros.append(repr(e))
+
+    with concurrent_apptests():
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=usuario, args=(n,), daemon=True) for n in range(sessions)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        total = time.perf_counter() - t0
+    if erros:
+        raise RuntimeError(f"{len(erros)} sessões falharam no modo carga: {erros[0]}")
+    return {
+        "load.reruns_per_s": len(latencias) / total if total else 0.0,
+        "load.p50_ms": pct(latencias, 0.5) * 1000,
+        "load.p95_ms": pct(latencias, 0.95) * 1000,
+        "load.p99_ms": pct(latencias, 0.99) * 1000,
+    }
+
+
+# --- linhas de base ---
+
+def compare(metricas, baseline, tolerance, min_delta_ms):
+    """Lista de regressões (métrica, base, atual) além da tolerância relativa."""
+    regressoes = []
+    for nome, base in baseline.get("metrics", {}).items():
+        atual = metricas.get(nome)
+        if atual is None or not base:
+            continue
+        if nome.endswith(HIGHER_IS_BETTER):
+            piorou = atual < base * (1 - tolerance)
+        else:
+            # Diferenças de poucos ms são ruído do agendador, não regressão
+            folga = min_delta_ms if nome.endswith("_ms") else 0.0
+            piorou = atual > base * (1 + tolerance) and atual - base > folga
+        if piorou:
+            regressoes.append((nome, base, atual))
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--patients", type=int, help="sobrescreve a quantidade de pacientes da escala")
+    parser.add_argument("--events", type=int, help="eventos de timeline por paciente")
+    parser.add_argument("--appointments", type=int, help="total de agendamentos")
+    parser.add_argument("--readings", type=int, help="leituras de pressão por paciente")
+    parser.add_argument("--data-dir", help="diretório da clínica sintética (padrão: temporário)")
+    parser.add_argument("--repeats", type=int, default=10, help="reruns medidos por página")
+    parser.add_argument("--cold-starts", type=int, default=3, help="processos novos para medir o cold start")
+    parser.add_argument("--memory-sessions", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=0, help="usuários simultâneos no modo carga (0 desliga)")
+    parser.add_argument("--duration", type=float, default=15.0, help="segundos do modo carga")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="latência simulada do Groq, em segundos")
+    parser.add_argument("--baseline", help="arquivo JSON de linha de base")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="piora relativa aceita (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0)
+    parser.add_argument("--output", help="grava o resultado completo em JSON")
+    parser.add_argument("--cold-start-probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.cold_start_probe:
+        cold_start_probe()
+        return 0
+
+    base = SCALES[args.scale]
+    scale = Scale(args.patients or base.pacientes, args.events or base.eventos,
+                  args.appointments or base.agendamentos, args.readings or base.leituras, base.dias_financeiro)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="auramed_bench_")
+    env, gen_s = generate(data_dir, scale)
+    os.environ.update(env)
+    install_stub_embeddings()
+
+    print(f"Clínica sintética em {data_dir} ({scale}) gerada em {gen_s:.1f}s")
+    metricas = {}
+    if args.cold_starts:
+        metricas.update(measure_cold_start(env, args.cold_starts))
+    metricas.update(measure_pages(args.repeats, args.llm_latency))
+    if args.memory_sessions:
+        metricas.update(measure_memory(args.memory_sessions))
+    if args.sessions:
+        metricas.update(measure_load(args.sessions, args.duration, args.llm_latency))
+
+    largura = max(len(k) for k in metricas)
+    for nome, valor in metricas.items():
+        print(f"  {nome:<{largura}}  {valor:10.2f}")
+
+    resultado = {"scale": vars(scale), "metrics": metricas, "python": sys.version.split()[0],
+                 "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+    if args.baseline and args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"Linha de base gravada em {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != vars(scale):
+            print("Aviso: a linha de base foi gerada com outra escala de dados.")
+        regressoes = compare(metricas, baseline, args.tolerance, args.min_delta_ms)
+        for nome, antes, agora in regressoes:
+            print(f"REGRESSÃO {nome}: {antes:.2f} -> {agora:.2f} ({(agora / antes - 1):+.0%})")
+        if regressoes:
+            return 1
+        print(f"Sem regressões em relação a {args.baseline} (tolerância {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Clínicas sintéticas em escala configurável para os benchmarks.
+
+Gera o banco SQLite, as séries de sinais vitais (Parquet) e o livro-caixa
+diretamente pelas camadas de armazenamento do app, com semente fixa para que
+duas execuções com a mesma escala produzam exatamente os mesmos dados.
+"""
+import datetime
+import os
+import random
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from auramed.auth import hash_password
+from auramed.ledger import DESPESA, RECEITA
+from auramed.scheduler import WAITING_STATUSES
+from auramed.storage import ClinicStore
+from auramed.vitals import VitalsStore
+
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Heitor", "Isabela", "João", "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Lima", "Pereira", "Costa", "Almeida", "Ferreira", "Ribeiro", "Carvalho", "Gomes"]
+HISTORICOS = [
+    "Hipertensão (CID I10). Uso contínuo de Losartana.",
+    "Diabetes tipo 2 (CID E11). Uso de Metformina.",
+    "Enxaqueca crônica (CID G43). Alergia a Dipirona.",
+    "Asma (CID J45). Alergia a Penicilina.",
+    "Gastrite (CID K29). Uso de Omeprazol.",
+    "Ansiedade generalizada (CID F41).",
+    "Sem comorbidades conhecidas.",
+]
+EVENTOS = [("Consulta", "Rotina. Pressão controlada."), ("Exame", "Hemograma sem alterações."),
+           ("Retorno", "Sintomas em melhora."), ("Prontuário SOAP", "### Subjetivo\nCefaleia leve.\n\n### Plano\nObservação.")]
+MEDICAMENTOS = ["Amoxicilina 500mg", "Dipirona 1g", "Losartana 50mg", "Omeprazol 20mg", "Ibuprofeno 600mg", "Rivotril 0.5mg"]
+SALAS = ["Sala 01", "Sala 02", "Sala 03"]
+SENHA = "bench"
+
+
+@dataclass
+class Scale:
+    pacientes: int = 200
+    eventos: int = 10
+    agendamentos: int = 300
+    leituras: int = 50
+    dias_financeiro: int = 365
+
+
+SCALES = {
+    "small": Scale(200, 10, 300, 50),
+    "medium": Scale(2000, 20, 3000, 200),
+    "large": Scale(20000, 30, 20000, 500),
+}
+
+# Data de referência fixa: mesma semente + mesma data = mesmos dados em toda execução
+REFERENCE_DAY = datetime.date(2025, 6, 2)
+
+
+def generate(root, scale, seed=42, today=None):
+    """Cria a clínica em `root` e devolve as variáveis de ambiente que apontam para ela."""
+    rng = random.Random(seed)
+    today = today or REFERENCE_DAY
+    os.makedirs(root, exist_ok=True)
+    env = {
+        "AURAMED_DB_PATH": os.path.join(root, "auramed.db"),
+        "AURAMED_VITALS_DIR": os.path.join(root, "vitals_data"),
+        "AURAMED_RAG_DIR": os.path.join(root, "rag_index"),
+        "AURAMED_LLM_CACHE_PATH": "",
+    }
+    t0 = time.perf_counter()
+    store = ClinicStore(env["AURAMED_DB_PATH"])
+    if not store.is_empty():
+        return env, 0.0
+    store.seed({"medicamentos": MEDICAMENTOS})
+
+    # Prontuários e timelines
+    ids, nomes = [], []
+    for i in range(scale.pacientes):
+        nome = f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {i:05d}"
+        inicio = today - datetime.timedelta(days=rng.randint(30, 1500))
+        timeline = [
+            {"data": (inicio + datetime.timedelta(days=30 * k)).isoformat(), "evento": ev, "detalhe": det}
+            for k, (ev, det) in enumerate(rng.choice(EVENTOS) for _ in range(scale.eventos))
+        ]
+        ids.append(store.add_patient({"nome": nome, "idade": rng.randint(1, 95), "sexo": rng.choice("MF"),
+                                      "historico": rng.choice(HISTORICOS), "timeline": timeline}))
+        nomes.append(nome)
+
+    # Contas (senhas já com hash: o cold start não paga a migração de texto puro)
+    store.add_credential("admin", senha=hash_password(SENHA), role="doctor", nome="Dr. Benchmark",
+                         especialidade="Clínica Geral", crm="00000-SP")
+    store.add_credential("paciente", senha=hash_password(SENHA), role="patient", nome=nomes[0], paciente_id=ids[0])
+
+    # Agenda: slots sequenciais por sala, sem conflitos, em torno de hoje
+    por_dia = 3 * 16
+    for n in range(scale.agendamentos):
+        dia = today + datetime.timedelta(days=n // por_dia - scale.agendamentos // (2 * por_dia))
+        slot = n % por_dia
+        hora = datetime.time(8 + (slot // 3) // 2, 30 * ((slot // 3) % 2))
+        status = "Finalizado" if dia < today else rng.choice(WAITING_STATUSES)
+        store.add_appointment({"paciente": rng.choice(nomes), "data": dia.isoformat(), "hora": hora.strftime("%H:%M"),
+                               "tipo": rng.choice(["Primeira Vez", "Retorno", "Exame"]), "status": status,
+                               "valor": rng.choice([250.0, 350.0, 500.0]), "medico": "admin",
+                               "sala": SALAS[slot % 3], "duracao": 30})
+
+    # Livro-caixa diário
+    entradas = []
+    for d in range(scale.dias_financeiro):
+        dia = (today - datetime.timedelta(days=d)).isoformat()
+        entradas.append((dia, RECEITA, round(rng.uniform(800, 4000), 2), "Consultas"))
+        if rng.random() < 0.3:
+            entradas.append((dia, DESPESA, round(rng.uniform(200, 2500), 2), "Insumos"))
+    store.add_ledger_entries(entradas)
+
+    # Sinais vitais: uma leitura por dia retroativa, gerada em bloco
+    vitals = VitalsStore(env["AURAMED_VITALS_DIR"])
+    nprng = np.random.default_rng(seed)
+    n = scale.leituras
+    pid = np.repeat(np.asarray(ids, dtype=np.int64), n)
+    offsets = np.tile(np.arange(n, 0, -1), len(ids)).astype("timedelta64[D]")
+    ts = np.datetime64(today.isoformat(), "s") - offsets
+    pressao = nprng.normal(128, 14, size=len(pid)).round()
+    vitals.append_many(pid, ts, pressao, flush=False)
+    vitals.flush()
+    return env, time.perf_counter() - t0
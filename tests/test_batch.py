@@ -0,0 +1,33 @@
+import threading
+import time
+
+from auramed.batch import BatchItem, run_batch
+
+
+def test_fechar_o_lote_cancela_a_fila_e_entrega_os_em_andamento():
+    liberar = threading.Event()
+    abandonados, chamados = [], []
+
+    def worker(item):
+        chamados.append(item.index)
+        if item.index:
+            liberar.wait(5)
+        return f"SOAP {item.index}"
+
+    itens = [BatchItem(index=i, paciente=f"P{i}", notas="notas") for i in range(10)]
+    lote = run_batch(itens, worker, concurrency=1, rate_per_minute=0, on_abandoned=abandonados.append)
+    assert next(lote).soap == "SOAP 0"
+    while len(chamados) < 2:
+        time.sleep(0.01)
+    t0 = time.perf_counter()
+    lote.close()
+    assert time.perf_counter() - t0 < 1
+    liberar.set()
+    for _ in range(50):
+        if abandonados:
+            break
+        time.sleep(0.05)
+    time.sleep(0.1)
+    # Só o item que já rodava termina e é entregue; o resto da fila é cancelado
+    assert [r.soap for r in abandonados] == ["SOAP 1"]
+    assert sorted(chamados) == [0, 1]
@@ -0,0 +1,23 @@
+import pyarrow.parquet as pq
+
+from auramed.bulk import export_records, import_records
+from auramed.storage import ClinicStore
+
+
+def test_parquet_com_primeiro_bloco_sem_opcionais(tmp_path):
+    store = ClinicStore(str(tmp_path / "origem.db"))
+    store.add_patient({"nome": "Ana Vazia", "idade": None, "sexo": None, "historico": ""})
+    store.add_patient({"nome": "Bruno Completo", "idade": 42, "sexo": "M", "historico": "HAS"})
+    destino = tmp_path / "pacientes.parquet"
+
+    report = export_records(store, "pacientes", "parquet", str(destino), chunk_rows=1)
+
+    assert report.gravadas == 2
+    tabela = pq.read_table(destino)
+    assert str(tabela.schema.field("idade").type) == "int64"
+    assert tabela.column("idade").to_pylist() == [None, 42]
+    assert tabela.column("sexo").to_pylist() == [None, "M"]
+
+    copia = ClinicStore(str(tmp_path / "copia.db"))
+    importado = import_records(copia, "pacientes", str(destino), "parquet")
+    assert (importado.gravadas, importado.rejeitadas) == (2, 0)
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from auramed.interactions import InteractionEngine
+
+RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "auramed", "data", "interacoes.json")
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return InteractionEngine.from_file(RULES)
+
+
+def test_negacao_em_outra_oracao_nao_anula_alergia(engine):
+    assert "dipirona" in engine.allergies("Paciente sem febre, alergia a dipirona")
+
+
+def test_negacao_antes_de_adjetivo_nao_anula_alergia(engine):
+    alergias = engine.allergies("Hipertensão sem controle, alérgica a penicilina")
+    assert "amoxicilina" in alergias
+
+
+def test_alergia_negada_na_segunda_oracao(engine):
+    alergias = engine.allergies("Alergia a dipirona e nega alergia a AAS")
+    assert "dipirona" in alergias
+    assert "acido acetilsalicilico" not in alergias
+
+
+def test_lista_de_alergenos_continua_apos_virgula(engine):
+    alergias = engine.allergies("Alergia a dipirona, ibuprofeno e diclofenaco")
+    assert {"dipirona", "ibuprofeno", "diclofenaco"} <= set(alergias)
+
+
+def test_negacao_direta(engine):
+    assert engine.allergies("Nega alergias medicamentosas. Usa dipirona se dor.") == {}
+
+
+def test_uso_continuo_apos_virgula_nao_e_alergia(engine):
+    alergias = engine.allergies("Alergia a dipirona, uso contínuo de losartana.")
+    assert "dipirona" in alergias
+    assert "losartana" not in alergias
+
+
+def test_faz_uso_apos_e_nao_e_alergia(engine):
+    alergias = engine.allergies("Alergia a penicilina e faz uso de omeprazol.")
+    assert "amoxicilina" in alergias
+    assert "omeprazol" not in alergias
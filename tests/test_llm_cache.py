@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from auramed.llm_cache import CompletionCache
+
+MODELO = "llama-3.3-70b-versatile"
+
+
+class FakeGroq:
+    """Imita `client.chat.completions.create` contando as idas ao provedor."""
+
+    def __init__(self, latency=0.2, falha=None):
+        self.latency = latency
+        self.falha = falha
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages, temperature=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if self.falha:
+            raise self.falha
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"SOAP: {messages[-1]['content']}"))])
+
+
+def completar(cache, client, notas):
+    messages = [{"role": "user", "content": notas}]
+    key = cache.make_key(MODELO, messages, 0.3)
+    return cache.get_or_create(key, lambda: client.chat.completions.create(model=MODELO, messages=messages, temperature=0.3).choices[0].message.content)
+
+
+def test_prompts_identicos_concorrentes_fazem_uma_chamada():
+    cache, client = CompletionCache(), FakeGroq()
+    with ThreadPoolExecutor(8) as pool:
+        textos = list(pool.map(lambda _: completar(cache, client, "Cefaleia há 3 dias."), range(8)))
+    assert client.calls == 1
+    assert set(textos) == {"SOAP: Cefaleia há 3 dias."}
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] + stats["memory_hits"] == 7
+
+
+def test_falha_do_lider_libera_quem_espera():
+    cache, client = CompletionCache(), FakeGroq(falha=RuntimeError("provedor fora do ar"))
+    with ThreadPoolExecutor(4) as pool:
+        futuros = [pool.submit(completar, cache, client, "Dor lombar.") for _ in range(4)]
+        for f in futuros:
+            with pytest.raises(RuntimeError, match="fora do ar"):
+                f.result(timeout=5)
+    assert client.calls == 1
+    # Nada foi gravado: a próxima tentativa vai ao provedor de novo
+    client.falha = None
+    assert completar(cache, client, "Dor lombar.") == "SOAP: Dor lombar."
+    assert client.calls == 2
+
+
+def test_acerto_depois_de_reiniciar(tmp_path):
+    disco = str(tmp_path / "llm_cache.db")
+    client = FakeGroq(latency=0)
+    assert completar(CompletionCache(disk_path=disco), client, "Tosse seca.") == "SOAP: Tosse seca."
+    reiniciado = CompletionCache(disk_path=disco)
+    assert completar(reiniciado, client, "Tosse  seca. ") == "SOAP: Tosse seca."
+    assert completar(reiniciado, client, "Tosse seca.") == "SOAP: Tosse seca."
+    assert client.calls == 1
+    stats = reiniciado.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
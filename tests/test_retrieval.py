@@ -0,0 +1,35 @@
+import numpy as np
+
+from auramed.retrieval import PatientContextIndex
+
+
+def encode(textos):
+    return np.array([[len(t), t.count("a") + 1.0, 1.0] for t in textos])
+
+
+def eventos(*ids):
+    return [{"id": i, "data": "2025-01-01", "evento": "Consulta", "detalhe": f"Evento {i}"} for i in ids]
+
+
+def test_linhas_orfas_de_escrita_interrompida_sao_descartadas(tmp_path):
+    index = PatientContextIndex(str(tmp_path), encode, fingerprint="db-1")
+    index.sync(7, eventos(1, 2))
+    _, vec_path, text_path, _ = index._paths(7)
+    # Queda depois de gravar vetores e trechos, antes do meta
+    with open(vec_path, "ab") as f:
+        f.write(np.zeros(3, dtype=np.float16).tobytes())
+    with open(text_path, "a", encoding="utf-8") as f:
+        f.write('{"data": "", "evento": "órfão", "texto": ""}\n')
+    index.sync(7, eventos(3))
+    textos = [s["texto"] for s in index.all_snippets(7)]
+    assert textos == ["Evento 1", "Evento 2", "Evento 3"]
+    assert len(index.search(7, "Evento", k=10)) == 3
+
+
+def test_indice_de_outro_banco_e_refeito(tmp_path):
+    PatientContextIndex(str(tmp_path), encode, fingerprint="db-antigo").sync(7, eventos(1, 2, 3))
+    index = PatientContextIndex(str(tmp_path), encode, fingerprint="db-novo")
+    assert index.last_event_id(7) == 0
+    assert index.all_snippets(7) == []
+    index.sync(7, eventos(1))
+    assert [s["texto"] for s in index.all_snippets(7)] == ["Evento 1"]
@@ -0,0 +1,26 @@
+import numpy as np
+
+from auramed.search import PatientSearchIndex
+from auramed.storage import ClinicStore
+
+
+def encode(textos):
+    return np.array([[len(t), t.count("a") + 1.0, 1.0] for t in textos])
+
+
+def test_sincronizacao_indexa_cada_linha_uma_vez(tmp_path):
+    store = ClinicStore(str(tmp_path / "clinica.db"))
+    ana = store.add_patient({"nome": "Ana Silva", "idade": 32, "sexo": "F", "historico": "Enxaqueca (CID G43)."})
+    store.add_event(ana, {"data": "2025-01-10", "evento": "Consulta", "detalhe": "Cefaleia."})
+    index = PatientSearchIndex(encode=encode)
+    index.sync(store)
+    assert index.rows == 2
+
+    store.add_event(ana, {"data": "2025-02-10", "evento": "Retorno", "detalhe": "Melhora."})
+    carlos = store.add_patient({"nome": "Carlos Souza", "idade": 45, "sexo": "M", "historico": "Hipertensão (CID I10)."})
+    store.add_event(carlos, {"data": "2025-02-11", "evento": "Consulta", "detalhe": "PA elevada."})
+    index.sync(store)
+    index.sync(store)
+    assert index.rows == 5
+    assert index.lag(store) == 0
+    assert carlos in index.search("I10", k=5)